@@ -1,3 +1,8 @@
+import json
+import logging
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from typing import Callable, Literal, Optional, no_type_check
 
 from app.agents.tools.agent_tool import AgentTool, RunResult
@@ -5,6 +10,7 @@ from app.bedrock import (
     DEFAULT_GENERATION_CONFIG,
     ConverseApiRequest,
     ConverseApiResponse,
+    ConverseApiResponseMessageContent,
     ConverseApiToolConfig,
     ConverseApiToolResult,
     ConverseApiToolUseContent,
@@ -24,6 +30,13 @@ from app.routes.schemas.conversation import type_model_name
 from app.utils import convert_dict_keys_to_camel_case
 from pydantic import BaseModel
 
+logger = logging.getLogger(__name__)
+
+# Max number of tools invoked concurrently in a single turn.
+AGENT_TOOL_CONCURRENCY = int(os.environ.get("AGENT_TOOL_CONCURRENCY", 4))
+# Max time in seconds for a single tool. The tool is reported to the model as failed after that.
+AGENT_TOOL_TIMEOUT = float(os.environ.get("AGENT_TOOL_TIMEOUT", 60))
+
 
 class OnStopInput(BaseModel):
     thinking_conversation: list[AgentMessageModel]
@@ -43,7 +56,12 @@ class AgentRunner:
         on_thinking: Optional[Callable[[list[AgentMessageModel]], None]] = None,
         on_tool_result: Optional[Callable[[ConverseApiToolResult], None]] = None,
         on_stop: Optional[Callable[[OnStopInput], None]] = None,
+        on_stream: Optional[Callable[[str], None]] = None,
     ):
+        """
+        :param on_stream: Callback for text deltas. If given, responses are streamed with
+            `converse_stream`, so that the final answer is sent as it is generated.
+        """
         self.bot = bot
         self.tools = {tool.name: tool for tool in tools}
         self.client = get_bedrock_client()
@@ -52,6 +70,7 @@ class AgentRunner:
         self.on_thinking = on_thinking
         self.on_tool_result = on_tool_result
         self.on_stop = on_stop
+        self.on_stream = on_stream
         self.total_input_tokens = 0
         self.total_output_tokens = 0
 
@@ -129,6 +148,8 @@ class AgentRunner:
         self, messages: list[AgentMessageModel]
     ) -> ConverseApiResponse:
         args = self._compose_args(messages)
+        if self.on_stream:
+            return self._call_converse_stream_api(args)
 
         messages = args["messages"]  # type: ignore
         inference_config = args["inference_config"]
@@ -146,6 +167,75 @@ class AgentRunner:
             toolConfig=tool_config,
         )
 
+    def _call_converse_stream_api(
+        self, args: ConverseApiRequest
+    ) -> ConverseApiResponse:
+        """Call `converse_stream` and assemble the events into the same shape as `converse`.
+        Text deltas are passed to `on_stream` as they arrive.
+        NOTE: Text before using tools is also streamed, since the turn is not known to be final
+        until `toolUse` blocks appear.
+        """
+        assert self.on_stream is not None
+        response = self.client.converse_stream(
+            modelId=args["model_id"],
+            messages=args["messages"],
+            inferenceConfig=args["inference_config"],
+            additionalModelRequestFields=args["additional_model_request_fields"],
+            system=args["system"],
+            toolConfig=args["tool_config"],  # type: ignore
+        )
+
+        texts: dict[int, list[str]] = {}
+        tool_uses: dict[int, ConverseApiToolUseContent] = {}
+        tool_inputs: dict[int, list[str]] = {}
+        stop_reason = ""
+        usage = {"inputTokens": 0, "outputTokens": 0, "totalTokens": 0}
+        for event in response["stream"]:
+            if "contentBlockStart" in event:
+                index = event["contentBlockStart"]["contentBlockIndex"]
+                start = event["contentBlockStart"]["start"]
+                if "toolUse" in start:
+                    tool_uses[index] = {
+                        "toolUseId": start["toolUse"]["toolUseId"],
+                        "name": start["toolUse"]["name"],
+                        "input": {},
+                    }
+                    tool_inputs[index] = []
+            elif "contentBlockDelta" in event:
+                index = event["contentBlockDelta"]["contentBlockIndex"]
+                delta = event["contentBlockDelta"]["delta"]
+                if "text" in delta:
+                    texts.setdefault(index, []).append(delta["text"])
+                    self.on_stream(delta["text"])
+                elif "toolUse" in delta:
+                    # Input of the tool is streamed as partial JSON string
+                    tool_inputs[index].append(delta["toolUse"]["input"])
+            elif "contentBlockStop" in event:
+                index = event["contentBlockStop"]["contentBlockIndex"]
+                if index in tool_uses:
+                    tool_uses[index]["input"] = json.loads(
+                        "".join(tool_inputs[index]) or "{}"
+                    )
+            elif "messageStop" in event:
+                stop_reason = event["messageStop"]["stopReason"]
+            elif "metadata" in event:
+                usage = event["metadata"]["usage"]
+
+        content: list[ConverseApiResponseMessageContent] = [
+            (
+                {"toolUse": tool_uses[index]}
+                if index in tool_uses
+                else {"text": "".join(texts[index])}
+            )
+            for index in sorted([*texts.keys(), *tool_uses.keys()])
+        ]
+        return {
+            "ResponseMetadata": response["ResponseMetadata"],
+            "output": {"message": {"role": "assistant", "content": content}},
+            "stopReason": stop_reason,
+            "usage": usage,  # type: ignore
+        }
+
     @no_type_check
     def _compose_args(self, messages: list[AgentMessageModel]) -> ConverseApiRequest:
         arg_messages = [
@@ -226,26 +316,81 @@ class AgentRunner:
     def _invoke_tools(
         self, tool_uses: list[ConverseApiToolUseContent]
     ) -> list[ConverseApiToolResult]:
-        results = []
+        """Invoke tools concurrently.
+        Results are in the order of `tool_uses`, while `on_tool_result` is called as each tool finishes.
+        """
+        calls = []
         for tool_use in tool_uses:
             tool_name = tool_use["name"]
-            if tool_name in self.tools:
-                tool = self.tools[tool_name]
-                args = tool.args_schema(**tool_use["input"])
-                result = tool.run(args)
-                tool_result: ConverseApiToolResult = {
-                    "toolUseId": tool_use["toolUseId"],
-                    "content": {"text": result.body},
-                }
-                if not result.succeeded:
-                    tool_result["status"] = "error"
-                else:
-                    tool_result["status"] = "success"
+            if tool_name not in self.tools:
+                raise ValueError(f"Tool {tool_name} not found.")
+            tool = self.tools[tool_name]
+            calls.append((tool, tool.args_schema(**tool_use["input"])))
+        if not calls:
+            return []
 
-                if self.on_tool_result:
-                    self.on_tool_result(tool_result)
+        results: list[ConverseApiToolResult | None] = [None] * len(calls)
+        started_at: dict[int, float] = {}
 
-                results.append(tool_result)
-            else:
-                raise ValueError(f"Tool {tool_name} not found.")
-        return results
+        def run(index: int, tool: AgentTool, args: BaseModel) -> RunResult:
+            started_at[index] = time.monotonic()
+            return tool.run(args)
+
+        def complete(index: int, result: RunResult):
+            tool_result: ConverseApiToolResult = {
+                "toolUseId": tool_uses[index]["toolUseId"],
+                "content": {"text": result.body},
+                "status": "success" if result.succeeded else "error",
+            }
+            if self.on_tool_result:
+                self.on_tool_result(tool_result)
+            results[index] = tool_result
+
+        executor = ThreadPoolExecutor(
+            max_workers=min(len(calls), AGENT_TOOL_CONCURRENCY)
+        )
+        try:
+            futures = {
+                executor.submit(run, i, tool, args): i
+                for i, (tool, args) in enumerate(calls)
+            }
+            pending = set(futures)
+            while pending:
+                # Wait until a tool finishes or the earliest running tool times out
+                now = time.monotonic()
+                deadline = min(
+                    (
+                        started_at[futures[f]] + AGENT_TOOL_TIMEOUT
+                        for f in pending
+                        if futures[f] in started_at
+                    ),
+                    default=now + AGENT_TOOL_TIMEOUT,
+                )
+                done, pending = wait(
+                    pending, timeout=max(deadline - now, 0), return_when=FIRST_COMPLETED
+                )
+                for future in done:
+                    complete(futures[future], future.result())
+
+                now = time.monotonic()
+                for future in list(pending):
+                    index = futures[future]
+                    if (
+                        index in started_at
+                        and now - started_at[index] >= AGENT_TOOL_TIMEOUT
+                    ):
+                        # NOTE: The thread can not be stopped. It is left to finish in background.
+                        tool_name = tool_uses[index]["name"]
+                        logger.warning(f"Tool {tool_name} timed out")
+                        pending.remove(future)
+                        complete(
+                            index,
+                            RunResult(
+                                succeeded=False,
+                                body=f"Tool {tool_name} timed out after {AGENT_TOOL_TIMEOUT} seconds.",
+                            ),
+                        )
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        return results  # type: ignore[return-value]
@@ -1,11 +1,30 @@
 import json
+import logging
+import os
 
 from app.agents.tools.agent_tool import AgentTool
+from app.cache import LRUCache
 from app.repositories.models.custom_bot import BotModel
 from app.routes.schemas.conversation import type_model_name
 from duckduckgo_search import DDGS
 from pydantic import BaseModel, Field, root_validator
 
+logger = logging.getLogger(__name__)
+
+# Lifetime of cached search results in seconds for each time limit.
+# Results limited to the last day go stale sooner than those of the last year.
+SEARCH_CACHE_TTL = {
+    "d": 10 * 60,
+    "w": 60 * 60,
+    "m": 6 * 60 * 60,
+    "y": 24 * 60 * 60,
+}
+SEARCH_CACHE_SIZE = int(os.environ.get("SEARCH_CACHE_SIZE", 256))
+# Fields of each search result passed to the model.
+SEARCH_RESULT_FIELDS = ["title", "href", "body"]
+
+_search_cache: LRUCache[str] = LRUCache(SEARCH_CACHE_SIZE)
+
 
 class InternetSearchInput(BaseModel):
     query: str = Field(description="The query to search for on the internet.")
@@ -35,6 +54,10 @@ class InternetSearchInput(BaseModel):
         return values
 
 
+def _normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
 def internet_search(
     tool_input: InternetSearchInput, bot: BotModel | None, model: type_model_name | None
 ) -> str:
@@ -42,6 +65,12 @@ def internet_search(
     time_limit = tool_input.time_limit
     country = tool_input.country
 
+    cache_key = (_normalize_query(query), country, time_limit)
+    cached = _search_cache.get(cache_key)
+    if cached is not None:
+        logger.info(f"Search cache hit: {cache_key}")
+        return cached
+
     REGION = country
     SAFE_SEARCH = "moderate"
     MAX_RESULTS = 20
@@ -56,7 +85,20 @@ def internet_search(
             max_results=MAX_RESULTS,
             backend=BACKEND,
         )
-    return json.dumps(res)
+
+    # NOTE: Results are kept in the agent conversation and sent again on every later turn,
+    # so keep only the fields the model uses and avoid escaping non-ASCII characters.
+    result = json.dumps(
+        [{k: r[k] for k in SEARCH_RESULT_FIELDS if k in r} for r in res],
+        ensure_ascii=False,
+    )
+    if res:
+        _search_cache.set(
+            cache_key,
+            result,
+            ttl=SEARCH_CACHE_TTL.get(time_limit, SEARCH_CACHE_TTL["d"]),
+        )
+    return result
 
 
 internet_search_tool = AgentTool(
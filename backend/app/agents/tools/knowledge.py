@@ -1,11 +1,15 @@
 import json
 import logging
 import os
+import threading
+import time
+from collections import deque
 
 from app.agents.tools.agent_tool import AgentTool
 from app.bedrock import call_converse_api, get_model_id
 from app.config import DEFAULT_GENERATION_CONFIG as DEFAULT_CLAUDE_GENERATION_CONFIG
 from app.config import DEFAULT_MISTRAL_GENERATION_CONFIG
+from app.history import estimate_text_tokens
 from app.repositories.models.custom_bot import BotModel
 from app.routes.schemas.conversation import type_model_name
 from app.utils import convert_dict_keys_to_camel_case
@@ -18,7 +22,12 @@ DEFAULT_GENERATION_CONFIG = (
     if ENABLE_MISTRAL
     else DEFAULT_CLAUDE_GENERATION_CONFIG
 )
-
+# Max tokens of search results returned to the agent in retrieval-only mode.
+KNOWLEDGE_RETRIEVAL_MAX_TOKENS = int(
+    os.environ.get("KNOWLEDGE_RETRIEVAL_MAX_TOKENS", 4000)
+)
+# Number of recent answer generations averaged to estimate the latency saved by retrieval-only mode.
+ANSWER_GENERATION_LATENCY_WINDOW = 20
 
 logger = logging.getLogger(__name__)
 
@@ -102,6 +111,33 @@ def _format_search_results(search_results: list[SearchResult]):
     return context
 
 
+class LatencyStats:
+    """Thread-safe rolling average of recent latencies per model."""
+
+    def __init__(self, window: int):
+        self.window = window
+        self._latencies: dict[str, deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, model: str, latency_ms: float):
+        with self._lock:
+            self._latencies.setdefault(model, deque(maxlen=self.window)).append(
+                latency_ms
+            )
+
+    def average(self, model: str) -> tuple[float, int] | None:
+        """Returns the average and the number of samples, or None if not measured yet."""
+        with self._lock:
+            latencies = self._latencies.get(model)
+            if not latencies:
+                return None
+            return sum(latencies) / len(latencies), len(latencies)
+
+
+# Latency of answer generation by `search_knowledge`, measured on this container.
+answer_generation_latency = LatencyStats(ANSWER_GENERATION_LATENCY_WINDOW)
+
+
 class KnowledgeToolInput(BaseModel):
     query: str = Field(description="User's original question string.")
 
@@ -143,6 +179,7 @@ def search_knowledge(
         # search_results = dummy_search_results
 
         context_prompt = _format_search_results(search_results)
+        start = time.perf_counter()
         response = call_converse_api(
             {
                 "model_id": get_model_id(model),
@@ -164,6 +201,7 @@ def search_knowledge(
                 "system": [],
             }
         )
+        answer_generation_latency.add(model, (time.perf_counter() - start) * 1000)
         message_content = (
             response.get("output", {}).get("message", {}).get("content", [])
         )
@@ -193,18 +231,98 @@ def search_knowledge(
     )
 
 
+def _select_search_results(
+    search_results: list[SearchResult], model: type_model_name, max_tokens: int
+) -> tuple[list[SearchResult], int]:
+    """Deduplicate search results and keep the top ones within the token budget.
+    Returns the selected results and their estimated tokens.
+    """
+    selected: list[SearchResult] = []
+    seen = set()
+    total_tokens = 0
+    for result in sorted(search_results, key=lambda r: r.rank):
+        content = " ".join(result.content.split())
+        if content in seen:
+            continue
+        tokens = estimate_text_tokens(result.content, model)
+        # NOTE: The top result is always returned
+        if selected and total_tokens + tokens > max_tokens:
+            break
+        seen.add(content)
+        selected.append(result)
+        total_tokens += tokens
+    return selected, total_tokens
+
+
+def retrieve_knowledge(
+    tool_input: KnowledgeToolInput, bot: BotModel | None, model: type_model_name | None
+) -> str:
+    """Return search results to the agent without generating an answer with them,
+    which saves a model round trip for each knowledge lookup.
+    """
+    assert bot is not None
+    assert model is not None
+
+    query = tool_input.query
+    logger.info(f"Running knowledge retrieval with query: {query}")
+
+    start = time.perf_counter()
+    search_results = search_related_docs(bot, query=query)
+    selected, tokens = _select_search_results(
+        search_results, model, KNOWLEDGE_RETRIEVAL_MAX_TOKENS
+    )
+    elapsed = (time.perf_counter() - start) * 1000
+
+    # Prompt of the answer generation skipped by this mode, whose answer is up to `max_tokens`
+    skipped_prompt_tokens = estimate_text_tokens(
+        KNOWLEDGE_TEMPLATE.format(
+            query=query, context=_format_search_results(search_results)
+        ),
+        model,
+    )
+    skipped_max_answer_tokens = (
+        bot.generation_params.max_tokens
+        if bot.generation_params
+        else DEFAULT_GENERATION_CONFIG["max_tokens"]
+    )
+    # NOTE: Latency is only known if answer generation has run for the model on this container
+    latency = answer_generation_latency.average(model)
+    skipped_latency = (
+        f"~{latency[0]:.0f}ms (average of {latency[1]} recent runs)"
+        if latency
+        else "latency unknown (not measured on this container yet)"
+    )
+    logger.info(
+        f"Retrieved {len(selected)} of {len(search_results)} results "
+        f"({tokens} tokens) in {elapsed:.0f}ms. "
+        f"Skipped answer generation: ~{skipped_prompt_tokens} prompt tokens, "
+        f"up to {skipped_max_answer_tokens} answer tokens, {skipped_latency}"
+    )
+
+    return json.dumps(
+        {
+            "search_result": [
+                {"content": r.content, "source": r.source, "rank": r.rank}
+                for r in selected
+            ],
+        },
+        ensure_ascii=False,
+    )
+
+
 def create_knowledge_tool(bot: BotModel, model: type_model_name) -> AgentTool:
+    retrieval_only = bot.agent.knowledge_retrieval_only
     description = (
-        "Answer a user's question using information. The description is: {}".format(
-            bot.knowledge.__str_in_claude_format__()
-        )
-    )
+        "Search for information to answer a user's question. Returns related documents. The description is: {}"
+        if retrieval_only
+        else "Answer a user's question using information. The description is: {}"
+    ).format(bot.knowledge.__str_in_claude_format__())
     logger.info(f"Creating knowledge base tool with description: {description}")
     return AgentTool(
         name=f"knowledge_base_tool",
         description=description,
         args_schema=KnowledgeToolInput,
-        function=search_knowledge,
+        function=retrieve_knowledge if retrieval_only else search_knowledge,
         bot=bot,
         model=model,
     )
@@ -1,20 +1,107 @@
+import logging
 import os
+import threading
+import time
 
 import requests
-from jose import jwt
+from jose import jwk, jwt
+from jose.backends.base import Key
+from jose.exceptions import JWTError
+
+logger = logging.getLogger(__name__)
 
 REGION = os.environ.get("REGION", "ap-northeast-1")
 USER_POOL_ID = os.environ.get("USER_POOL_ID", "")
 CLIENT_ID = os.environ.get("CLIENT_ID", "")
+# Lifetime of the cached JWKS in seconds.
+JWKS_CACHE_TTL = int(os.environ.get("JWKS_CACHE_TTL", 3600))
+# Minimum interval in seconds between refreshes triggered by an unknown `kid`.
+# Prevents a flood of tokens with forged `kid` from hammering Cognito.
+JWKS_MIN_REFRESH_INTERVAL = 60
+JWKS_REQUEST_TIMEOUT = 5
+
+
+class JwksCache:
+    """Process-wide cache of the Cognito JSON Web Key Set.
+    Keys are stored as parsed key objects so that verification is CPU only.
+    The key set is refreshed when the TTL expires or when an unknown `kid` is seen,
+    and concurrent refreshes are collapsed into a single request.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        ttl: float = JWKS_CACHE_TTL,
+        min_refresh_interval: float = JWKS_MIN_REFRESH_INTERVAL,
+    ):
+        self.url = url
+        self.ttl = ttl
+        self.min_refresh_interval = min_refresh_interval
+        self._keys: dict[str, Key] = {}
+        self._fetched_at: float | None = None
+        self._lock = threading.Lock()
+
+    def _is_expired(self) -> bool:
+        return (
+            self._fetched_at is None or time.monotonic() - self._fetched_at > self.ttl
+        )
+
+    def _fetch(self) -> dict[str, Key]:
+        response = requests.get(self.url, timeout=JWKS_REQUEST_TIMEOUT)
+        response.raise_for_status()
+        return {
+            k["kid"]: jwk.construct(k, algorithm="RS256")
+            for k in response.json()["keys"]
+        }
+
+    def _refresh(self, on_kid_miss: bool) -> None:
+        observed_fetched_at = self._fetched_at
+        with self._lock:
+            if self._fetched_at != observed_fetched_at:
+                # Another thread has refreshed the keys while waiting for the lock
+                return
+            if (
+                on_kid_miss
+                and self._fetched_at is not None
+                and time.monotonic() - self._fetched_at < self.min_refresh_interval
+            ):
+                return
+
+            try:
+                keys = self._fetch()
+            except Exception as e:
+                if not self._keys:
+                    raise e
+                # Keep serving the stale keys rather than failing every request
+                logger.warning(f"Failed to refresh JWKS, using cached keys: {e}")
+                return
+
+            self._keys = keys
+            self._fetched_at = time.monotonic()
+
+    def get_key(self, kid: str) -> Key:
+        if self._is_expired():
+            self._refresh(on_kid_miss=False)
+
+        key = self._keys.get(kid)
+        if key is None:
+            # The signing keys may have been rotated
+            self._refresh(on_kid_miss=True)
+            key = self._keys.get(kid)
+        if key is None:
+            raise JWTError(f"No matching key found for kid: {kid}")
+        return key
+
+
+jwks_cache = JwksCache(
+    f"https://cognito-idp.{REGION}.amazonaws.com/{USER_POOL_ID}/.well-known/jwks.json"
+)
 
 
 def verify_token(token: str) -> dict:
     # Verify JWT token
-    url = f"https://cognito-idp.{REGION}.amazonaws.com/{USER_POOL_ID}/.well-known/jwks.json"
-    response = requests.get(url)
-    keys = response.json()["keys"]
     header = jwt.get_unverified_header(token)
-    key = [k for k in keys if k["kid"] == header["kid"]][0]
+    key = jwks_cache.get_key(header["kid"])
     # The JWT returned from the Identity Provider may contain an at_hash
     # jose jwt.decode verifies id_token with access_token by default if it contains at_hash
     # See : https://github.com/mpdavis/python-jose/blob/4b0701b46a8d00988afcc5168c2b3a1fd60d15d8/jose/jwt.py#L59
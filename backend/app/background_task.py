@@ -0,0 +1,33 @@
+import logging
+
+from app.repositories.conversation import find_conversation_by_id
+from app.repositories.models.custom_bot import BotAliasModel
+from app.usecases.bot import refresh_aliases
+from app.usecases.chat import compact_conversation
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s:%(name)s - %(message)s")
+logger = logging.getLogger(__name__)
+
+
+def handler(event, context):
+    """Run a task requested by `invoke_background_task` out of the request path.
+    Each invocation is a single task. Failed tasks are retried by Lambda asynchronous invocation.
+    """
+    task = event["task"]
+    params = event["params"]
+    logger.info(f"Running background task: {task}")
+
+    if task == "compact_conversation":
+        conversation = find_conversation_by_id(
+            params["user_id"], params["conversation_id"]
+        )
+        compact_conversation(params["user_id"], conversation)
+    elif task == "refresh_aliases":
+        refresh_aliases(
+            [
+                (alias["user_id"], BotAliasModel(**alias["alias"]))
+                for alias in params["aliases"]
+            ]
+        )
+    else:
+        raise ValueError(f"Unknown background task: {task}")
@@ -1,4 +1,3 @@
-import base64
 import json
 import logging
 import os
@@ -8,6 +7,9 @@ from pathlib import Path
 from app.config import BEDROCK_PRICING, DEFAULT_EMBEDDING_CONFIG
 from app.config import DEFAULT_GENERATION_CONFIG as DEFAULT_CLAUDE_GENERATION_CONFIG
 from app.config import DEFAULT_MISTRAL_GENERATION_CONFIG
+from app.embedding_batch import BatchEmbedder
+from app.embedding_cache import query_embedding_cache
+from app.repositories.blob import get_content_bytes
 from app.repositories.models.conversation import MessageModel
 from app.repositories.models.custom_bot import GenerationParamsModel
 from app.routes.schemas.conversation import type_model_name
@@ -162,7 +164,7 @@ def compose_args_for_converse_api(
                             "image": {
                                 "format": format,
                                 # decode base64 encoded image
-                                "source": {"bytes": base64.b64decode(c.body)},
+                                "source": {"bytes": get_content_bytes(c)},
                             }
                         }
                     )
@@ -179,7 +181,7 @@ def compose_args_for_converse_api(
                                     _convert_to_valid_file_name(c.file_name)
                                 ).stem,  # e.g. "document.txt" -> "document"
                                 # encode text attachment body
-                                "source": {"bytes": base64.b64decode(c.body)},
+                                "source": {"bytes": get_content_bytes(c)},
                             }
                         }
                     )
@@ -285,6 +287,14 @@ def calculate_query_embedding(question: str) -> list[float]:
     # Currently only supports "cohere.embed-multilingual-v3"
     assert model_id == "cohere.embed-multilingual-v3"
 
+    cached = query_embedding_cache.get(model_id, question)
+    if cached is not None:
+        logger.info(
+            f"Query embedding cache hit (memory hits: {query_embedding_cache.memory_hits}, "
+            f"shared hits: {query_embedding_cache.shared_hits}, misses: {query_embedding_cache.misses})"
+        )
+        return cached
+
     payload = json.dumps({"texts": [question], "input_type": "search_query"})
     accept = "application/json"
     content_type = "application/json"
@@ -295,12 +305,15 @@ def calculate_query_embedding(question: str) -> list[float]:
     output = json.loads(response.get("body").read())
     embedding = output.get("embeddings")[0]
 
-    return embedding
+    return query_embedding_cache.put(model_id, question, embedding)
 
 
 def calculate_document_embeddings(documents: list[str]) -> list[list[float]]:
     def _calculate_document_embeddings(documents: list[str]) -> list[list[float]]:
-        payload = json.dumps({"texts": documents, "input_type": "search_document"})
+        # NOTE: Not escaping non-ASCII characters keeps the payload small
+        payload = json.dumps(
+            {"texts": documents, "input_type": "search_document"}, ensure_ascii=False
+        ).encode("utf-8")
         accept = "application/json"
         content_type = "application/json"
 
@@ -312,16 +325,10 @@ def calculate_document_embeddings(documents: list[str]) -> list[list[float]]:
 
         return embeddings
 
-    BATCH_SIZE = 10
     model_id = DEFAULT_EMBEDDING_CONFIG["model_id"]
 
     # Currently only supports "cohere.embed-multilingual-v3"
     assert model_id == "cohere.embed-multilingual-v3"
 
-    embeddings = []
-    for i in range(0, len(documents), BATCH_SIZE):
-        # Split documents into batches to avoid exceeding the payload size limit
-        batch = documents[i : i + BATCH_SIZE]
-        embeddings += _calculate_document_embeddings(batch)
-
-    return embeddings
+    # Batches are packed within the limits of the model and sent concurrently
+    return BatchEmbedder(_calculate_document_embeddings).embed(documents)
@@ -0,0 +1,102 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Generic, Hashable, TypeVar
+
+import boto3
+
+logger = logging.getLogger(__name__)
+
+# Optional DynamoDB table shared by all containers and functions. The table must have
+# a string partition key `CacheKey` and TTL enabled on `expire`.
+SHARED_CACHE_TABLE_NAME = os.environ.get("SHARED_CACHE_TABLE_NAME", "")
+
+V = TypeVar("V")
+
+
+class LRUCache(Generic[V]):
+    """Thread-safe in-process LRU cache with optional expiration.
+    Entries live as long as the Lambda container is warm.
+    """
+
+    def __init__(self, max_size: int, ttl: float | None = None):
+        """
+        :param max_size: Max number of entries. Least recently used entries are evicted first.
+        :param ttl: Default lifetime of entries in seconds. `None` means no expiration.
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[Hashable, tuple[float | None, V]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> V | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at is None or time.monotonic() < expires_at:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def set(self, key: Hashable, value: V, ttl: float | None = None):
+        ttl = ttl if ttl is not None else self.ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: Hashable):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SharedCacheTable:
+    """DynamoDB backed cache shared across containers.
+    Failures are logged and treated as cache misses, so the cache never breaks the caller.
+    """
+
+    def __init__(self, table_name: str = SHARED_CACHE_TABLE_NAME):
+        self.table = (
+            boto3.resource("dynamodb").Table(table_name) if table_name else None
+        )
+
+    def get(self, key: str) -> dict[str, Any] | None:
+        if self.table is None:
+            return None
+        try:
+            return self.table.get_item(Key={"CacheKey": key}).get("Item")
+        except Exception as e:
+            logger.warning(f"Failed to read shared cache: {e}")
+            return None
+
+    def put(self, key: str, attributes: dict[str, Any], ttl: int):
+        if self.table is None:
+            return
+        try:
+            self.table.put_item(
+                Item={
+                    **attributes,
+                    "CacheKey": key,
+                    "expire": int(datetime.now().timestamp()) + ttl,
+                }
+            )
+        except Exception as e:
+            logger.warning(f"Failed to write shared cache: {e}")
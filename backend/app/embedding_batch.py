@@ -0,0 +1,153 @@
+import json
+import logging
+import os
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable
+
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger(__name__)
+
+# Max number of texts in a single request of Cohere embed models.
+EMBEDDING_BATCH_MAX_TEXTS = 96
+# Max size in bytes of texts in a single request.
+EMBEDDING_BATCH_MAX_BYTES = int(os.environ.get("EMBEDDING_BATCH_MAX_BYTES", 200_000))
+# Max number of concurrent requests. The actual concurrency is halved on throttling
+# and grows back gradually on success (AIMD).
+EMBEDDING_MAX_CONCURRENCY = int(os.environ.get("EMBEDDING_MAX_CONCURRENCY", 8))
+# Max number of retries of a single batch.
+EMBEDDING_MAX_RETRIES = 8
+# Errors which are retried with a smaller concurrency.
+RETRYABLE_ERROR_CODES = (
+    "ThrottlingException",
+    "ServiceUnavailableException",
+    "ModelTimeoutException",
+)
+
+
+def text_size(text: str) -> int:
+    """Size in bytes of the text in the JSON payload."""
+    return len(json.dumps(text, ensure_ascii=False).encode("utf-8")) + 2
+
+
+def pack_batches(
+    texts: list[str], max_texts: int, max_bytes: int
+) -> list[tuple[int, int]]:
+    """Split texts into consecutive batches within the limits.
+    Returns `(start, end)` index ranges. A text larger than `max_bytes` makes a batch by itself.
+    """
+    batches = []
+    start = 0
+    size = 0
+    for i, text in enumerate(texts):
+        text_bytes = text_size(text)
+        if i > start and (i - start >= max_texts or size + text_bytes > max_bytes):
+            batches.append((start, i))
+            start = i
+            size = 0
+        size += text_bytes
+    if start < len(texts):
+        batches.append((start, len(texts)))
+    return batches
+
+
+def _is_retryable(e: Exception) -> bool:
+    return (
+        isinstance(e, ClientError)
+        and e.response["Error"]["Code"] in RETRYABLE_ERROR_CODES
+    )
+
+
+class BatchEmbedder:
+    """Embed many texts with concurrent batch requests.
+    Only batches which failed with throttling are sent again, and embeddings are returned
+    in the order of the input texts.
+    """
+
+    def __init__(
+        self,
+        embed: Callable[[list[str]], list[list[float]]],
+        max_texts: int = EMBEDDING_BATCH_MAX_TEXTS,
+        max_bytes: int = EMBEDDING_BATCH_MAX_BYTES,
+        max_concurrency: int = EMBEDDING_MAX_CONCURRENCY,
+        max_retries: int = EMBEDDING_MAX_RETRIES,
+    ):
+        """
+        :param embed: Function to embed a single batch of texts.
+        """
+        self.embed_batch = embed
+        self.max_texts = max_texts
+        self.max_bytes = max_bytes
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        # Metrics of the last `embed` call
+        self.request_count = 0
+        self.throttled_count = 0
+        self.min_concurrency = float(max_concurrency)
+
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        batches = pack_batches(texts, self.max_texts, self.max_bytes)
+        results: list[list[list[float]] | None] = [None] * len(batches)
+        retries = [0] * len(batches)
+        queue = deque(range(len(batches)))
+        concurrency = float(self.max_concurrency)
+        self.request_count = 0
+        self.throttled_count = 0
+        self.min_concurrency = concurrency
+        start_time = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            running: dict[Future, int] = {}
+            while queue or running:
+                while queue and len(running) < int(concurrency):
+                    index = queue.popleft()
+                    start, end = batches[index]
+                    running[executor.submit(self.embed_batch, texts[start:end])] = index
+                    self.request_count += 1
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                throttled = False
+                for future in done:
+                    index = running.pop(future)
+                    try:
+                        embeddings = future.result()
+                    except Exception as e:
+                        if not _is_retryable(e) or retries[index] >= self.max_retries:
+                            raise e
+                        retries[index] += 1
+                        self.throttled_count += 1
+                        throttled = True
+                        # Send the failed batch first to keep the progress in order
+                        queue.appendleft(index)
+                        continue
+
+                    start, end = batches[index]
+                    if len(embeddings) != end - start:
+                        raise ValueError(
+                            f"Expected {end - start} embeddings, but got {len(embeddings)}"
+                        )
+                    results[index] = embeddings
+                    # Additive increase: about one more request per round trip
+                    concurrency = min(
+                        concurrency + 1 / concurrency, float(self.max_concurrency)
+                    )
+
+                if throttled:
+                    # Multiplicative decrease
+                    concurrency = max(concurrency / 2, 1.0)
+                    self.min_concurrency = min(self.min_concurrency, concurrency)
+                    backoff = min(0.1 * 2 ** max(retries), 10.0)
+                    logger.warning(
+                        f"Embedding throttled. concurrency: {concurrency:.1f}, backoff: {backoff:.1f}s"
+                    )
+                    time.sleep(backoff)
+
+        logger.info(
+            f"Embedded {len(texts)} texts in {len(batches)} batches "
+            f"({self.request_count} requests, {self.throttled_count} throttled, "
+            f"min concurrency: {self.min_concurrency:.1f}) "
+            f"in {time.perf_counter() - start_time:.1f}s"
+        )
+        return [embedding for batch in results for embedding in batch]  # type: ignore[union-attr]
@@ -0,0 +1,91 @@
+import hashlib
+import logging
+import os
+import re
+import unicodedata
+from array import array
+
+from app.cache import LRUCache, SharedCacheTable
+
+logger = logging.getLogger(__name__)
+
+# Max number of query embeddings kept in memory on a warm container.
+EMBEDDING_CACHE_SIZE = int(os.environ.get("EMBEDDING_CACHE_SIZE", 1024))
+EMBEDDING_CACHE_TTL = 60 * 60 * 24 * 7  # 7 days
+
+
+def normalize_query(query: str) -> str:
+    """Normalize query text so that trivially different queries share a cache entry."""
+    query = unicodedata.normalize("NFKC", query)
+    return re.sub(r"\s+", " ", query).strip()
+
+
+def encode_embedding(embedding: list[float]) -> bytes:
+    """Encode embedding as float32 bytes (4 bytes per dimension)."""
+    return array("f", embedding).tobytes()
+
+
+def decode_embedding(data: bytes) -> list[float]:
+    values = array("f")
+    values.frombytes(data)
+    return values.tolist()
+
+
+class QueryEmbeddingCache:
+    """Two tier cache of query embeddings.
+    The first tier is an in-process LRU, and the second is the optional shared DynamoDB table.
+    Embeddings are stored as float32 bytes in both tiers.
+    """
+
+    def __init__(
+        self,
+        max_size: int = EMBEDDING_CACHE_SIZE,
+        shared: SharedCacheTable | None = None,
+    ):
+        self.memory: LRUCache[bytes] = LRUCache(max_size)
+        self.shared = shared if shared is not None else SharedCacheTable()
+        self.shared_hits = 0
+
+    @property
+    def memory_hits(self) -> int:
+        return self.memory.hits
+
+    @property
+    def misses(self) -> int:
+        # Memory misses which were also missed on the shared tier
+        return self.memory.misses - self.shared_hits
+
+    @staticmethod
+    def compose_key(model_id: str, query: str) -> str:
+        normalized = normalize_query(query)
+        digest = hashlib.sha256(f"{model_id}\n{normalized}".encode("utf-8"))
+        return f"EMBEDDING#{digest.hexdigest()}"
+
+    def get(self, model_id: str, query: str) -> list[float] | None:
+        key = self.compose_key(model_id, query)
+        data = self.memory.get(key)
+        if data is None:
+            item = self.shared.get(key)
+            if item is not None:
+                data = bytes(item["Embedding"])
+                self.memory.set(key, data)
+                self.shared_hits += 1
+
+        if data is None:
+            return None
+        return decode_embedding(data)
+
+    def put(self, model_id: str, query: str, embedding: list[float]) -> list[float]:
+        """Store the embedding and return it rounded to float32 as returned on a hit,
+        so that the same query gets the identical vector regardless of the cache state.
+        """
+        key = self.compose_key(model_id, query)
+        data = encode_embedding(embedding)
+        self.memory.set(key, data)
+        self.shared.put(
+            key, {"ModelId": model_id, "Embedding": data}, ttl=EMBEDDING_CACHE_TTL
+        )
+        return decode_embedding(data)
+
+
+query_embedding_cache = QueryEmbeddingCache()
@@ -0,0 +1,191 @@
+import logging
+import math
+
+from app.repositories.blob import find_blob_size
+from app.repositories.models.conversation import (
+    ContentModel,
+    ConversationModel,
+    MessageModel,
+)
+from app.repositories.models.custom_bot import BotModel
+from app.routes.schemas.conversation import type_model_name
+
+logger = logging.getLogger(__name__)
+
+# Approximate number of ASCII characters per token of each model family.
+# NOTE: Other characters (e.g. Japanese) are counted as one token each.
+CHARS_PER_TOKEN = {"claude": 3.5, "mistral": 3.0}
+# Claude resizes large images to about 1.15 megapixels, which is about 1600 tokens.
+IMAGE_TOKENS = 1600
+# Tokens for the role and separators of each message.
+MESSAGE_OVERHEAD_TOKENS = 4
+
+SUMMARY_INSTRUCTION = """Here is the summary of the earlier part of the conversation:
+<conversation-summary>
+{}
+</conversation-summary>"""
+
+
+def get_model_family(model: type_model_name) -> str:
+    if model.startswith("mistral") or model.startswith("mixtral"):
+        return "mistral"
+    return "claude"
+
+
+def estimate_text_tokens(text: str, model: type_model_name) -> int:
+    ascii_count = len(text.encode("ascii", "ignore"))
+    return math.ceil(
+        ascii_count / CHARS_PER_TOKEN[get_model_family(model)]
+        + (len(text) - ascii_count)
+    )
+
+
+def estimate_content_tokens(content: ContentModel, model: type_model_name) -> int:
+    if content.content_type == "text":
+        return estimate_text_tokens(content.body, model)
+    elif content.content_type == "image":
+        return IMAGE_TOKENS
+
+    # Attachment
+    if content.blob_key:
+        # NOTE: Messages stored before `blob_size` was introduced need a HEAD request
+        size = (
+            content.blob_size
+            if content.blob_size is not None
+            else find_blob_size(content.blob_key)
+        )
+    else:
+        size = len(content.body) * 3 // 4
+    return math.ceil(size / CHARS_PER_TOKEN[get_model_family(model)])
+
+
+def estimate_message_tokens(message: MessageModel, model: type_model_name) -> int:
+    return MESSAGE_OVERHEAD_TOKENS + sum(
+        estimate_content_tokens(c, model) for c in message.content
+    )
+
+
+def _omit_files(message: MessageModel) -> MessageModel:
+    """Replace images and attachments with short notes. The original message is not modified."""
+    content = [
+        (
+            c
+            if c.content_type == "text"
+            else ContentModel(
+                content_type="text",
+                media_type=None,
+                body=(
+                    "[Image omitted]"
+                    if c.content_type == "image"
+                    else f"[Attached file omitted: {c.file_name}]"
+                ),
+                file_name=None,
+            )
+        )
+        for c in message.content
+    ]
+    return message.model_copy(update={"content": content})
+
+
+def window_messages(
+    messages: list[MessageModel],
+    model: type_model_name,
+    max_input_tokens: int,
+    instruction: str | None = None,
+) -> tuple[list[MessageModel], int]:
+    """Keep the most recent turns of the conversation within the input token budget.
+    The instruction and the current turn are always kept. Images and attachments of older
+    messages are omitted before text turns are dropped.
+    Returns the windowed messages and the number of estimated tokens saved.
+    """
+    head = [m for m in messages if m.role in ("system", "instruction")]
+    turns = [m for m in messages if m.role not in ("system", "instruction")]
+
+    # The current turn starts from the last user message
+    current_start = len(turns) - 1
+    while current_start > 0 and turns[current_start].role != "user":
+        current_start -= 1
+    history = turns[:current_start]
+    current = turns[current_start:]
+
+    fixed_tokens = sum(estimate_message_tokens(m, model) for m in current)
+    if instruction:
+        fixed_tokens += estimate_text_tokens(instruction, model)
+    tokens = [estimate_message_tokens(m, model) for m in history]
+    original_total = total = fixed_tokens + sum(tokens)
+    if total <= max_input_tokens:
+        return messages, 0
+
+    # Omit images and attachments from the oldest message
+    for i, message in enumerate(history):
+        if total <= max_input_tokens:
+            break
+        if all(c.content_type == "text" for c in message.content):
+            continue
+        history[i] = _omit_files(message)
+        omitted_tokens = estimate_message_tokens(history[i], model)
+        total -= tokens[i] - omitted_tokens
+        tokens[i] = omitted_tokens
+
+    # Drop the oldest turns. The conversation must start with a user message.
+    start = 0
+    while start < len(history) and (
+        total > max_input_tokens or history[start].role != "user"
+    ):
+        total -= tokens[start]
+        start += 1
+
+    saved_tokens = original_total - total
+    logger.info(
+        f"History windowing: dropped {start} of {len(history)} messages, "
+        f"estimated tokens: {original_total} -> {total} (saved {saved_tokens})"
+    )
+    if total > max_input_tokens:
+        logger.warning(
+            f"Instruction and current message exceed the budget: {max_input_tokens}"
+        )
+    return head + history[start:] + current, saved_tokens
+
+
+def window_messages_for_bot(
+    messages: list[MessageModel],
+    bot: BotModel | None,
+    model: type_model_name,
+    instruction: str | None = None,
+) -> tuple[list[MessageModel], int]:
+    """Apply `window_messages` if the bot has the history budget.
+    Returns the windowed messages and the number of estimated tokens saved.
+    """
+    if bot is None or bot.history_params is None:
+        return messages, 0
+    return window_messages(
+        messages,
+        model,
+        bot.history_params.max_input_tokens,
+        instruction=instruction,
+    )
+
+
+def apply_summary(
+    messages: list[MessageModel],
+    conversation: ConversationModel,
+    instruction: str | None = None,
+) -> tuple[list[MessageModel], str | None]:
+    """Replace the turns covered by the conversation summary with the summary in the instruction.
+    If the summary does not cover the traced messages (e.g. another branch), they are returned as is.
+    """
+    summary = conversation.summary
+    if summary is None or summary.last_message_id not in conversation.message_map:
+        return messages, instruction
+
+    covered = conversation.message_map[summary.last_message_id]
+    index = next((i for i, m in enumerate(messages) if m is covered), None)
+    if index is None:
+        return messages, instruction
+
+    head = [m for m in messages[:index] if m.role in ("system", "instruction")]
+    summary_prompt = SUMMARY_INSTRUCTION.format(summary.body)
+    logger.info(f"Summary replaced {index + 1 - len(head)} messages")
+    return head + messages[index + 1 :], (
+        f"{instruction}\n\n{summary_prompt}" if instruction else summary_prompt
+    )
@@ -8,6 +8,8 @@ from app.repositories.common import (
     RecordAccessNotAllowedError,
     RecordNotFoundError,
     ResourceConflictError,
+    get_sts_call_count,
+    reset_sts_call_count,
 )
 from app.routes.admin import router as admin_router
 from app.routes.api_publication import router as api_publication_router
@@ -132,6 +134,8 @@ async def add_log_requests(request: Request, call_next: ASGIApp):
     body = await request.body()
     logger.info(f"Request body: {body.decode('utf-8')[:100]}...")
 
+    reset_sts_call_count()
     response = await call_next(request)  # type: ignore
+    logger.info(f"STS assume role calls: {get_sts_call_count()}")
 
     return response
@@ -0,0 +1,120 @@
+import base64
+import hashlib
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+from app.cache import LRUCache
+from app.repositories.models.conversation import ContentModel
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger(__name__)
+s3_client = boto3.client("s3")
+
+LARGE_MESSAGE_BUCKET = os.environ.get("LARGE_MESSAGE_BUCKET")
+# Content types whose body is stored in the blob store instead of the message.
+BLOB_CONTENT_TYPES = ("image", "attachment")
+# Max number of decoded blobs kept in memory on a warm container.
+# NOTE: Keep it small, as a single image or attachment can be several MB.
+BLOB_CACHE_SIZE = int(os.environ.get("BLOB_CACHE_SIZE", 16))
+
+# Max number of blobs fetched concurrently, e.g. on loading a whole conversation.
+BLOB_FETCH_CONCURRENCY = int(os.environ.get("BLOB_FETCH_CONCURRENCY", 8))
+
+_blob_cache: LRUCache[bytes] = LRUCache(BLOB_CACHE_SIZE)
+
+
+def compose_blob_key(user_id: str, data: bytes) -> str:
+    """Content-addressed key. Same content of the same user shares a single object."""
+    return f"{user_id}/blobs/{hashlib.sha256(data).hexdigest()}"
+
+
+def _exists(key: str) -> bool:
+    try:
+        s3_client.head_object(Bucket=LARGE_MESSAGE_BUCKET, Key=key)
+        return True
+    except ClientError as e:
+        if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+            return False
+        raise e
+
+
+def store_blob(user_id: str, body: str) -> tuple[str, int]:
+    """Store base64 encoded body as raw bytes and return the key and the size in bytes.
+    Uploading is skipped if the same content has been stored already.
+    NOTE: Existence is always checked on S3, because blobs can be deleted by another container.
+    """
+    data = base64.b64decode(body)
+    key = compose_blob_key(user_id, data)
+    if not _exists(key):
+        logger.info(f"Storing blob: {key} ({len(data)} bytes)")
+        s3_client.put_object(Bucket=LARGE_MESSAGE_BUCKET, Key=key, Body=data)
+    _blob_cache.set(key, data)
+    return key, len(data)
+
+
+def find_blob(key: str) -> bytes:
+    data = _blob_cache.get(key)
+    if data is None:
+        response = s3_client.get_object(Bucket=LARGE_MESSAGE_BUCKET, Key=key)
+        data = response["Body"].read()
+        _blob_cache.set(key, data)
+    return data
+
+
+def find_blobs(keys: list[str]) -> dict[str, bytes]:
+    """Fetch blobs concurrently. Returns the bodies by key."""
+    unique_keys = list(dict.fromkeys(keys))
+    if len(unique_keys) <= 1:
+        return {key: find_blob(key) for key in unique_keys}
+    with ThreadPoolExecutor(
+        max_workers=min(BLOB_FETCH_CONCURRENCY, len(unique_keys))
+    ) as executor:
+        return dict(zip(unique_keys, executor.map(find_blob, unique_keys)))
+
+
+def find_blob_size(key: str) -> int:
+    """Size in bytes of the blob, without fetching the body."""
+    data = _blob_cache.get(key)
+    if data is not None:
+        return len(data)
+    response = s3_client.head_object(Bucket=LARGE_MESSAGE_BUCKET, Key=key)
+    return response["ContentLength"]
+
+
+def get_content_bytes(content: ContentModel) -> bytes:
+    """Decoded body of image or attachment content, fetched lazily from the blob store."""
+    if content.blob_key:
+        return find_blob(content.blob_key)
+    return base64.b64decode(content.body)
+
+
+def get_content_body(
+    content: ContentModel, blobs: dict[str, bytes] | None = None
+) -> str:
+    """Body of the content. Image and attachment bodies are base64 encoded.
+    :param blobs: Blobs fetched in advance with `find_blobs`.
+    """
+    if content.blob_key:
+        data = (blobs or {}).get(content.blob_key)
+        if data is None:
+            data = find_blob(content.blob_key)
+        return base64.b64encode(data).decode("utf-8")
+    return content.body
+
+
+def delete_blobs_by_user_id(user_id: str):
+    """Delete all blobs of the user.
+    NOTE: Blobs are shared across conversations of the user, so they are not deleted with a single conversation.
+    """
+    paginator = s3_client.get_paginator("list_objects_v2")
+    for page in paginator.paginate(
+        Bucket=LARGE_MESSAGE_BUCKET, Prefix=f"{user_id}/blobs/"
+    ):
+        objects = [{"Key": obj["Key"]} for obj in page.get("Contents", [])]
+        if objects:
+            s3_client.delete_objects(
+                Bucket=LARGE_MESSAGE_BUCKET, Delete={"Objects": objects}
+            )
+    _blob_cache.clear()
@@ -1,5 +1,10 @@
 import json
+import logging
 import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
 
 import boto3
 
@@ -9,6 +14,15 @@ ACCOUNT = os.environ.get("ACCOUNT", "")
 REGION = os.environ.get("REGION", "ap-northeast-1")
 TABLE_ACCESS_ROLE_ARN = os.environ.get("TABLE_ACCESS_ROLE_ARN", "")
 TRANSACTION_BATCH_SIZE = 25
+BATCH_GET_ITEM_MAX_KEYS = 100
+# Max number of retries of unprocessed keys of a single `BatchGetItem` chunk.
+BATCH_GET_ITEM_MAX_RETRIES = 5
+# Max number of row-level sessions kept on a warm container.
+ROW_LEVEL_SESSION_CACHE_SIZE = int(os.environ.get("ROW_LEVEL_SESSION_CACHE_SIZE", 128))
+# Assumed role credentials are refreshed this long before they expire.
+CREDENTIALS_REFRESH_MARGIN = timedelta(minutes=5)
+
+logger = logging.getLogger(__name__)
 
 
 class RecordNotFoundError(Exception):
@@ -32,6 +46,16 @@ def decompose_conv_id(conv_id: str):
     return conv_id.split("#")[-1]
 
 
+def compose_conv_message_prefix(user_id: str, conversation_id: str):
+    # NOTE: Messages use a prefix other than `#CONV#` so that querying conversations
+    # by `begins_with(SK, "{user_id}#CONV#")` does not read message items.
+    return f"{user_id}#CONVMSG#{conversation_id}#"
+
+
+def compose_conv_message_id(user_id: str, conversation_id: str, message_id: str):
+    return f"{compose_conv_message_prefix(user_id, conversation_id)}{message_id}"
+
+
 def compose_bot_id(user_id: str, bot_id: str):
     # Add user_id prefix for row level security to match with `LeadingKeys` condition
     return f"{user_id}#BOT#{bot_id}"
@@ -50,6 +74,92 @@ def decompose_bot_alias_id(composed_alias_id: str):
     return composed_alias_id.split("#")[-1]
 
 
+class _RowLevelSessionCache:
+    """LRU cache of STS assumed role credentials and the resources built from them.
+    Keyed by service name and session policy (which embeds the user id), so that
+    a warm container does not call `sts.assume_role` on every repository call.
+    NOTE: Credentials are shared across threads, but resources are built per thread,
+    because boto3 resources are not thread safe.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: OrderedDict[tuple[str, str], dict] = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.sts_call_count = 0
+
+    def get(self, service_name: str, policy: str):
+        key = (service_name, policy)
+        credentials = self._get_credentials(service_name, policy)
+
+        resources: OrderedDict[tuple[str, str], tuple[dict, object]] | None = getattr(
+            self._local, "resources", None
+        )
+        if resources is None:
+            resources = self._local.resources = OrderedDict()
+        entry = resources.get(key)
+        if entry is not None and entry[0] is credentials:
+            resources.move_to_end(key)
+            return entry[1]
+
+        session = boto3.Session(
+            aws_access_key_id=credentials["AccessKeyId"],
+            aws_secret_access_key=credentials["SecretAccessKey"],
+            aws_session_token=credentials["SessionToken"],
+        )
+        resource = session.resource(service_name, region_name=REGION)
+        resources[key] = (credentials, resource)
+        resources.move_to_end(key)
+        if len(resources) > self.max_size:
+            resources.popitem(last=False)
+        return resource
+
+    def _get_credentials(self, service_name: str, policy: str) -> dict:
+        key = (service_name, policy)
+        with self._lock:
+            credentials = self._entries.get(key)
+            if credentials is not None:
+                if (
+                    datetime.now(timezone.utc) + CREDENTIALS_REFRESH_MARGIN
+                    < credentials["Expiration"]
+                ):
+                    self._entries.move_to_end(key)
+                    return credentials
+                del self._entries[key]
+
+            credentials = self._assume_role(policy)
+            self._entries[key] = credentials
+            if len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            return credentials
+
+    def _assume_role(self, policy: str) -> dict:
+        sts_client = boto3.client("sts")
+        assumed_role_object = sts_client.assume_role(
+            RoleArn=TABLE_ACCESS_ROLE_ARN,
+            RoleSessionName="DynamoDBSession",
+            Policy=policy,
+        )
+        self.sts_call_count += 1
+        return assumed_role_object["Credentials"]
+
+
+_row_level_session_cache = _RowLevelSessionCache(ROW_LEVEL_SESSION_CACHE_SIZE)
+
+
+def get_sts_call_count() -> int:
+    """Number of `sts.assume_role` calls since the last reset.
+    NOTE: Lambda handles one request at a time per container, so resetting
+    at the start of each request gives the count per request.
+    """
+    return _row_level_session_cache.sts_call_count
+
+
+def reset_sts_call_count():
+    _row_level_session_cache.sts_call_count = 0
+
+
 def _get_aws_resource(service_name, user_id=None):
     """Get AWS resource with optional row-level access control for DynamoDB.
     Ref: https://docs.aws.amazon.com/IAM/latest/UserGuide/reference_policies_examples_dynamodb_items.html
@@ -96,19 +206,7 @@ def _get_aws_resource(service_name, user_id=None):
             "ForAllValues:StringLike": {"dynamodb:LeadingKeys": [f"{user_id}*"]}
         }
 
-    sts_client = boto3.client("sts")
-    assumed_role_object = sts_client.assume_role(
-        RoleArn=TABLE_ACCESS_ROLE_ARN,
-        RoleSessionName="DynamoDBSession",
-        Policy=json.dumps(policy_document),
-    )
-    credentials = assumed_role_object["Credentials"]
-    session = boto3.Session(
-        aws_access_key_id=credentials["AccessKeyId"],
-        aws_secret_access_key=credentials["SecretAccessKey"],
-        aws_session_token=credentials["SessionToken"],
-    )
-    return session.resource(service_name, region_name=REGION)
+    return _row_level_session_cache.get(service_name, json.dumps(policy_document))
 
 
 def _get_dynamodb_client(user_id=None):
@@ -126,3 +224,44 @@ def _get_table_public_client():
     Warning: No row-level access. Use for only limited use case.
     """
     return _get_aws_resource("dynamodb").Table(TABLE_NAME)
+
+
+def batch_get_items(
+    keys: list[dict],
+    user_id: str | None = None,
+    projection_expression: str | None = None,
+    consistent_read: bool = False,
+) -> list[dict]:
+    """Get items by primary keys with `BatchGetItem`.
+    Keys are requested in chunks of 100 and unprocessed keys are retried with backoff
+    up to `BATCH_GET_ITEM_MAX_RETRIES` times.
+    NOTE: The order of returned items is not guaranteed. Missing items are not returned.
+    If `user_id` is not given, no row-level access is applied.
+    """
+    dynamodb = _get_aws_resource("dynamodb", user_id=user_id)
+    items: list[dict] = []
+    for i in range(0, len(keys), BATCH_GET_ITEM_MAX_KEYS):
+        request: dict = {
+            "Keys": keys[i : i + BATCH_GET_ITEM_MAX_KEYS],
+            "ConsistentRead": consistent_read,
+        }
+        if projection_expression:
+            request["ProjectionExpression"] = projection_expression
+
+        request_items = {TABLE_NAME: request}
+        retries = 0
+        while True:
+            response = dynamodb.batch_get_item(RequestItems=request_items)
+            items.extend(response["Responses"].get(TABLE_NAME, []))
+            request_items = response.get("UnprocessedKeys") or {}
+            if not request_items:
+                break
+            if retries >= BATCH_GET_ITEM_MAX_RETRIES:
+                unprocessed = len(request_items[TABLE_NAME]["Keys"])
+                raise RuntimeError(
+                    f"{unprocessed} keys are still unprocessed after {retries} retries"
+                )
+            retries += 1
+            time.sleep(min(0.05 * 2**retries, 1.0))
+
+    return items
@@ -1,3 +1,6 @@
+import base64
+import gzip
+import hashlib
 import json
 import logging
 import os
@@ -6,11 +9,18 @@ from decimal import Decimal as decimal
 from functools import wraps
 
 import boto3
+from app.repositories.blob import (
+    BLOB_CONTENT_TYPES,
+    delete_blobs_by_user_id,
+    store_blob,
+)
 from app.repositories.common import (
     TRANSACTION_BATCH_SIZE,
     RecordNotFoundError,
     _get_table_client,
     compose_conv_id,
+    compose_conv_message_id,
+    compose_conv_message_prefix,
     decompose_conv_id,
 )
 from app.repositories.models.conversation import (
@@ -18,6 +28,7 @@ from app.repositories.models.conversation import (
     ContentModel,
     ConversationMeta,
     ConversationModel,
+    ConversationSummaryModel,
     FeedbackModel,
     MessageModel,
 )
@@ -30,14 +41,166 @@ logger.setLevel(logging.DEBUG)
 s3_client = boto3.client("s3")
 
 THRESHOLD_LARGE_MESSAGE = 300 * 1024  # 300KB
+# Format versions of message items
+MESSAGE_FORMAT_JSON = 0  # JSON string in `Message`
+MESSAGE_FORMAT_JSON_GZIP = 1  # gzip compressed JSON in binary `MessageData`
+COMPRESSION_MIN_SIZE = 1024  # 1KB
 LARGE_MESSAGE_BUCKET = os.environ.get("LARGE_MESSAGE_BUCKET")
+# Attributes of message items which hold the message itself
+MESSAGE_PAYLOAD_ATTRIBUTES = {
+    "Message",
+    "MessageData",
+    "IsLargeMessage",
+    "LargeMessagePath",
+}
+# Attributes of header items of the single blob layout, which are removed on migration
+LEGACY_HEADER_ATTRIBUTES = {"MessageMap", "IsLargeMessage", "LargeMessagePath"}
+
+
+def _digest(serialized: str) -> str:
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+
+def _decode_next_token(user_id: str, next_token: str) -> dict:
+    """Decode `next_token` of the conversation listing to `ExclusiveStartKey`."""
+    try:
+        key = json.loads(base64.b64decode(next_token, validate=True).decode("utf-8"))
+    except ValueError as e:
+        raise ValueError("Invalid next_token") from e
+    if (
+        not isinstance(key, dict)
+        or key.keys() != {"PK", "SK"}
+        or key["PK"] != user_id
+        or not isinstance(key["SK"], str)
+    ):
+        raise ValueError("Invalid next_token")
+    return key
+
+
+def _offload_content(user_id: str, content: ContentModel) -> ContentModel:
+    blob_key, blob_size = store_blob(user_id, content.body)
+    return content.model_copy(
+        update={"body": "", "blob_key": blob_key, "blob_size": blob_size}
+    )
+
+
+def _serialize_message(user_id: str, message: MessageModel) -> str:
+    """Serialize the message in a single pass with the pydantic JSON encoder,
+    moving image and attachment bodies to the blob store.
+    """
+    if any(c.content_type in BLOB_CONTENT_TYPES and c.body for c in message.content):
+        message = message.model_copy(
+            update={
+                "content": [
+                    (
+                        _offload_content(user_id, c)
+                        if c.content_type in BLOB_CONTENT_TYPES and c.body
+                        else c
+                    )
+                    for c in message.content
+                ]
+            }
+        )
+    return message.model_dump_json()
+
+
+def _encode_message_payload(serialized: str) -> tuple[str | bytes, int]:
+    """Encode the serialized message for storage. Returns payload and format version.
+    Small payloads are stored as is, because compression does not pay off.
+    """
+    data = serialized.encode("utf-8")
+    if len(data) < COMPRESSION_MIN_SIZE:
+        return serialized, MESSAGE_FORMAT_JSON
+    return gzip.compress(data, mtime=0), MESSAGE_FORMAT_JSON_GZIP
+
+
+def _decode_message_payload(payload: str | bytes, format_version: int) -> str:
+    data = payload.encode("utf-8") if isinstance(payload, str) else payload
+    if format_version == MESSAGE_FORMAT_JSON_GZIP:
+        return gzip.decompress(data).decode("utf-8")
+    if format_version == MESSAGE_FORMAT_JSON:
+        return data.decode("utf-8")
+    raise ValueError(f"Unknown message format version: {format_version}")
+
+
+def _update_item(table, item: dict, removed: set[str], **kwargs):
+    """Write the attributes of the item and remove `removed` with `update_item`.
+    Unlike `put_item`, attributes written separately (e.g. `Feedback` and `Summary`) are kept.
+    """
+    key = {"PK": item["PK"], "SK": item["SK"]}
+    values = {k: v for k, v in item.items() if k not in key}
+    removed = removed - values.keys()
+    update_expression = "SET " + ", ".join(f"#{k} = :{k}" for k in values)
+    if removed:
+        update_expression += " REMOVE " + ", ".join(f"#{k}" for k in removed)
+    return table.update_item(
+        Key=key,
+        UpdateExpression=update_expression,
+        ExpressionAttributeNames={f"#{k}": k for k in [*values, *removed]},
+        ExpressionAttributeValues={f":{k}": v for k, v in values.items()},
+        **kwargs,
+    )
 
 
 def store_conversation(
     user_id: str, conversation: ConversationModel, threshold=THRESHOLD_LARGE_MESSAGE
 ):
-    logger.info(f"Storing conversation: {conversation.model_dump_json()}")
+    """Store the conversation as a header item and one item per message.
+    Only messages which are new or changed since the conversation was loaded are written.
+    Conversations stored in the single blob layout are migrated on the first write.
+    """
+    logger.info(f"Storing conversation: {conversation.id}")
     table = _get_table_client(user_id)
+    stored_digests = conversation._stored_message_digests
+
+    with table.batch_writer() as writer:
+        for message_id, message in conversation.message_map.items():
+            serialized = _serialize_message(user_id, message)
+            if stored_digests.get(message_id) == _digest(serialized):
+                continue
+
+            item = {
+                "PK": user_id,
+                "SK": compose_conv_message_id(user_id, conversation.id, message_id),
+                "MessageId": message_id,
+            }
+            payload, format_version = _encode_message_payload(serialized)
+            item["MessageFormatVersion"] = format_version
+            # NOTE: Offload is decided on the encoded (compressed) size
+            message_size = len(payload)
+            if message_size > threshold:
+                logger.info(
+                    f"Message size {message_size} exceeds threshold {threshold}"
+                )
+                large_message_path = (
+                    f"{user_id}/{conversation.id}/messages/{message_id}"
+                )
+                s3_client.put_object(
+                    Bucket=LARGE_MESSAGE_BUCKET,
+                    Key=large_message_path,
+                    Body=payload,
+                )
+                item["IsLargeMessage"] = True
+                item["LargeMessagePath"] = large_message_path
+            elif format_version == MESSAGE_FORMAT_JSON:
+                item["Message"] = payload
+            else:
+                item["MessageData"] = payload
+
+            if message_id in stored_digests:
+                # NOTE: Existing message (e.g. parent of the new message) may have `Feedback`
+                _update_item(table, item, MESSAGE_PAYLOAD_ATTRIBUTES)
+            else:
+                writer.put_item(Item=item)
+
+        # Remove messages which no longer exist in the conversation
+        for message_id in stored_digests.keys() - conversation.message_map.keys():
+            writer.delete_item(
+                Key={
+                    "PK": user_id,
+                    "SK": compose_conv_message_id(user_id, conversation.id, message_id),
+                }
+            )
 
     item_params = {
         "PK": user_id,
@@ -49,54 +212,38 @@ def store_conversation(
         "TotalPrice": decimal(str(conversation.total_price)),
         "LastMessageId": conversation.last_message_id,
         "ShouldContinue": conversation.should_continue,
+        "Model": (
+            conversation.message_map["system"].model
+            if "system" in conversation.message_map
+            else ""
+        ),
     }
 
+    removed = set(LEGACY_HEADER_ATTRIBUTES)
     if conversation.bot_id:
         item_params["BotId"] = conversation.bot_id
-
-    message_map = {
-        k: {
-            **v.model_dump(),
-            "content": [c.model_dump() for c in v.content],
-        }
-        for k, v in conversation.message_map.items()
-    }
-    message_map_size = len(json.dumps(message_map).encode("utf-8"))
-    logger.info(f"Message map size: {message_map_size}")
-    if message_map_size > threshold:
-        logger.info(
-            f"Message map size {message_map_size} exceeds threshold {threshold}"
-        )
-        item_params["IsLargeMessage"] = True
-        large_message_path = f"{user_id}/{conversation.id}/message_map.json"
-        item_params["LargeMessagePath"] = large_message_path
-        # Store all message in S3
-        s3_client.put_object(
-            Bucket=LARGE_MESSAGE_BUCKET,
-            Key=large_message_path,
-            Body=json.dumps(message_map),
-        )
-        # Store only `system` attribute in DynamoDB
-        item_params["MessageMap"] = json.dumps(
-            {
-                k: v.model_dump()
-                for k, v in conversation.message_map.items()
-                if k == "system"
-            }
-        )
     else:
-        item_params["IsLargeMessage"] = False
-        item_params["MessageMap"] = json.dumps(
-            {k: v.model_dump() for k, v in conversation.message_map.items()}
-        )
-
-    response = table.put_item(
-        Item=item_params,
-    )
+        removed.add("BotId")
+
+    # NOTE: Header is written after messages so that `LastMessageId` always refers to a stored message.
+    # `Summary` is not written here, since `update_conversation_summary` may write it concurrently.
+    response = _update_item(table, item_params, removed, ReturnValues="ALL_OLD")
+    old_item = response.get("Attributes", {})
+    if "MessageMap" in old_item:
+        logger.info(f"Migrated conversation {conversation.id} to per-message items")
+        if old_item.get("IsLargeMessage", False):
+            s3_client.delete_object(
+                Bucket=LARGE_MESSAGE_BUCKET, Key=old_item["LargeMessagePath"]
+            )
     return response
 
 
-def find_conversation_by_user_id(user_id: str) -> list[ConversationMeta]:
+def find_conversation_page_by_user_id(
+    user_id: str, limit: int | None = None, next_token: str | None = None
+) -> tuple[list[ConversationMeta], str | None]:
+    """Find a page of conversation metadata, newest first.
+    Pass the returned `next_token` to fetch the next page. `None` means the last page.
+    """
     logger.info(f"Finding conversations for user: {user_id}")
     table = _get_table_client(user_id)
 
@@ -105,7 +252,13 @@ def find_conversation_by_user_id(user_id: str) -> list[ConversationMeta]:
         # NOTE: Need SK to fetch only conversations
         & Key("SK").begins_with(f"{user_id}#CONV#"),
         "ScanIndexForward": False,
+        # NOTE: Read only the listing attributes
+        "ProjectionExpression": "SK, CreateTime, Title, Model, BotId",
     }
+    if limit is not None:
+        query_params["Limit"] = limit
+    if next_token:
+        query_params["ExclusiveStartKey"] = _decode_next_token(user_id, next_token)
 
     response = table.query(**query_params)
     conversations = [
@@ -113,67 +266,157 @@ def find_conversation_by_user_id(user_id: str) -> list[ConversationMeta]:
             id=decompose_conv_id(item["SK"]),
             create_time=float(item["CreateTime"]),
             title=item["Title"],
-            # NOTE: all message has the same model
-            model=json.loads(item["MessageMap"]).get("system", {}).get("model", ""),
+            # NOTE: Conversations in the single blob layout do not have `Model` until the next
+            # write. Run docs/migration/backfill_conversation_model.py to set it at once.
+            model=item.get("Model", ""),
             bot_id=item["BotId"] if "BotId" in item else None,
         )
         for item in response["Items"]
     ]
 
-    query_count = 1
-    MAX_QUERY_COUNT = 5
-    while "LastEvaluatedKey" in response:
-        model = (
-            json.loads(response["Items"][0]["MessageMap"])
-            .get("system", {})
-            .get("model", "")
-        )
-        query_params["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+    next_token = None
+    if "LastEvaluatedKey" in response:
+        next_token = base64.b64encode(
+            json.dumps(response["LastEvaluatedKey"]).encode("utf-8")
+        ).decode("utf-8")
+
+    return conversations, next_token
+
+
+def find_conversation_by_user_id(user_id: str) -> list[ConversationMeta]:
+    conversations, next_token = find_conversation_page_by_user_id(user_id)
+    while next_token is not None:
         # NOTE: max page size is 1MB
         # See: https://docs.aws.amazon.com/amazondynamodb/latest/developerguide/Query.Pagination.html
-        response = table.query(
-            **query_params,
+        page, next_token = find_conversation_page_by_user_id(
+            user_id, next_token=next_token
         )
-        conversations.extend(
+        conversations.extend(page)
+
+    logger.info(f"Found conversations: {len(conversations)}")
+    return conversations
+
+
+def _to_message_model(v: dict) -> MessageModel:
+    return MessageModel(
+        role=v["role"],
+        content=(
             [
-                ConversationMeta(
-                    id=decompose_conv_id(item["SK"]),
-                    create_time=float(item["CreateTime"]),
-                    title=item["Title"],
-                    model=model,
-                    bot_id=item["BotId"] if "BotId" in item else None,
+                ContentModel(
+                    content_type=c["content_type"],
+                    body=c["body"],
+                    media_type=c["media_type"],
+                    file_name=c.get("file_name", None),
+                    blob_key=c.get("blob_key", None),
+                    blob_size=c.get("blob_size", None),
                 )
-                for item in response["Items"]
+                for c in v["content"]
             ]
-        )
-        query_count += 1
-        if query_count > MAX_QUERY_COUNT:
-            logger.warning(f"Query count exceeded {MAX_QUERY_COUNT}")
+            if type(v["content"]) == list
+            else [
+                # For backward compatibility
+                ContentModel(
+                    content_type=v["content"]["content_type"],
+                    body=v["content"]["body"],
+                    media_type=None,
+                    file_name=None,
+                )
+            ]
+        ),
+        model=v["model"],
+        children=v["children"],
+        parent=v["parent"],
+        create_time=float(v["create_time"]),
+        feedback=(
+            FeedbackModel(
+                thumbs_up=v["feedback"]["thumbs_up"],
+                category=v["feedback"]["category"],
+                comment=v["feedback"]["comment"],
+            )
+            if v.get("feedback")
+            else None
+        ),
+        used_chunks=(
+            [
+                ChunkModel(
+                    content=c["content"],
+                    content_type=(c["content_type"] if "content_type" in c else "s3"),
+                    source=c["source"],
+                    rank=c["rank"],
+                )
+                for c in v["used_chunks"]
+            ]
+            if v.get("used_chunks")
+            else None
+        ),
+        thinking_log=v.get("thinking_log"),
+    )
+
+
+def _find_message_items(table, user_id: str, conversation_id: str) -> list[dict]:
+    """Load message items of the per-message layout with a paginated query.
+    `Message` of the returned items is the decoded JSON, resolved from S3 for large messages.
+    """
+    query_params = {
+        "KeyConditionExpression": Key("PK").eq(user_id)
+        & Key("SK").begins_with(compose_conv_message_prefix(user_id, conversation_id)),
+        "ConsistentRead": True,
+    }
+    items = []
+    while True:
+        response = table.query(**query_params)
+        for item in response["Items"]:
+            if item.get("IsLargeMessage", False):
+                s3_response = s3_client.get_object(
+                    Bucket=LARGE_MESSAGE_BUCKET, Key=item["LargeMessagePath"]
+                )
+                payload = s3_response["Body"].read()
+            elif "MessageData" in item:
+                payload = bytes(item["MessageData"])
+            else:
+                payload = item["Message"]
+            item["Message"] = _decode_message_payload(
+                payload, int(item.get("MessageFormatVersion", MESSAGE_FORMAT_JSON))
+            )
+            items.append(item)
+
+        if "LastEvaluatedKey" not in response:
             break
+        query_params["ExclusiveStartKey"] = response["LastEvaluatedKey"]
 
-    logger.info(f"Found conversations: {conversations}")
-    return conversations
+    return items
 
 
 def find_conversation_by_id(user_id: str, conversation_id: str) -> ConversationModel:
     logger.info(f"Finding conversation: {conversation_id}")
     table = _get_table_client(user_id)
-    response = table.query(
-        IndexName="SKIndex",
-        KeyConditionExpression=Key("SK").eq(compose_conv_id(user_id, conversation_id)),
+    response = table.get_item(
+        Key={"PK": user_id, "SK": compose_conv_id(user_id, conversation_id)},
+        ConsistentRead=True,
     )
-    if len(response["Items"]) == 0:
+    item = response.get("Item")
+    if item is None:
         raise RecordNotFoundError(f"No conversation found with id: {conversation_id}")
 
-    # NOTE: conversation is unique
-    item = response["Items"][0]
-    if item.get("IsLargeMessage", False):
+    stored_digests = {}
+    if "MessageMap" not in item:
+        message_map = {}
+        for message_item in _find_message_items(table, user_id, conversation_id):
+            message_id = message_item["MessageId"]
+            message_map[message_id] = json.loads(message_item["Message"])
+            if "Feedback" in message_item:
+                # Written by `update_feedback`. Folded into `Message` on the next write of the message.
+                message_map[message_id]["feedback"] = message_item["Feedback"]
+            stored_digests[message_id] = _digest(message_item["Message"])
+    elif item.get("IsLargeMessage", False):
+        # Single blob layout stored in S3
         large_message_path = item["LargeMessagePath"]
         response = s3_client.get_object(
             Bucket=LARGE_MESSAGE_BUCKET, Key=large_message_path
         )
         message_map = json.loads(response["Body"].read().decode("utf-8"))
     else:
+        # Single blob layout
         message_map = json.loads(item["MessageMap"])
 
     conv = ConversationModel(
@@ -181,92 +424,71 @@ def find_conversation_by_id(user_id: str, conversation_id: str) -> ConversationM
         create_time=float(item["CreateTime"]),
         title=item["Title"],
         total_price=item.get("TotalPrice", 0),
-        message_map={
-            k: MessageModel(
-                role=v["role"],
-                content=(
-                    [
-                        ContentModel(
-                            content_type=c["content_type"],
-                            body=c["body"],
-                            media_type=c["media_type"],
-                            file_name=c.get("file_name", None),
-                        )
-                        for c in v["content"]
-                    ]
-                    if type(v["content"]) == list
-                    else [
-                        # For backward compatibility
-                        ContentModel(
-                            content_type=v["content"]["content_type"],
-                            body=v["content"]["body"],
-                            media_type=None,
-                            file_name=None,
-                        )
-                    ]
-                ),
-                model=v["model"],
-                children=v["children"],
-                parent=v["parent"],
-                create_time=float(v["create_time"]),
-                feedback=(
-                    FeedbackModel(
-                        thumbs_up=v["feedback"]["thumbs_up"],
-                        category=v["feedback"]["category"],
-                        comment=v["feedback"]["comment"],
-                    )
-                    if v.get("feedback")
-                    else None
-                ),
-                used_chunks=(
-                    [
-                        ChunkModel(
-                            content=c["content"],
-                            content_type=(
-                                c["content_type"] if "content_type" in c else "s3"
-                            ),
-                            source=c["source"],
-                            rank=c["rank"],
-                        )
-                        for c in v["used_chunks"]
-                    ]
-                    if v.get("used_chunks")
-                    else None
-                ),
-                thinking_log=v.get("thinking_log"),
-            )
-            for k, v in message_map.items()
-        },
+        message_map={k: _to_message_model(v) for k, v in message_map.items()},
         last_message_id=item["LastMessageId"],
         bot_id=item["BotId"] if "BotId" in item else None,
         should_continue=item.get("ShouldContinue", False),
+        summary=(
+            ConversationSummaryModel(**item["Summary"]) if "Summary" in item else None
+        ),
     )
+    conv._stored_message_digests = stored_digests
     logger.info(f"Found conversation: {conv}")
     return conv
 
 
+def _delete_items(table, user_id: str, query_params: dict):
+    """Delete all items matching the query, including large messages stored in S3."""
+    query_params = {
+        **query_params,
+        "ProjectionExpression": "SK, IsLargeMessage, LargeMessagePath",
+    }
+
+    def delete_batch(batch):
+        with table.batch_writer() as writer:
+            for item in batch:
+                writer.delete_item(Key={"PK": user_id, "SK": item["SK"]})
+
+    def delete_large_messages(items):
+        for item in items:
+            if item.get("IsLargeMessage", False):
+                s3_client.delete_object(
+                    Bucket=LARGE_MESSAGE_BUCKET, Key=item["LargeMessagePath"]
+                )
+
+    response = table.query(
+        **query_params,
+    )
+
+    while True:
+        items = response.get("Items", [])
+        delete_large_messages(items)
+
+        for i in range(0, len(items), TRANSACTION_BATCH_SIZE):
+            batch = items[i : i + TRANSACTION_BATCH_SIZE]
+            delete_batch(batch)
+
+        # Check if next page exists
+        if "LastEvaluatedKey" not in response:
+            break
+
+        # Load next page
+        query_params["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+        response = table.query(
+            **query_params,
+        )
+
+
 def delete_conversation_by_id(user_id: str, conversation_id: str):
     logger.info(f"Deleting conversation: {conversation_id}")
     table = _get_table_client(user_id)
 
     try:
-        # Check if the conversation has a large message map
-        response = table.get_item(
-            Key={"PK": user_id, "SK": compose_conv_id(user_id, conversation_id)},
-            ProjectionExpression="IsLargeMessage, LargeMessagePath",
-        )
-
-        item = response.get("Item")
-        if item and item.get("IsLargeMessage", False):
-            # Delete the large message map from S3
-            s3_client.delete_object(
-                Bucket=LARGE_MESSAGE_BUCKET, Key=item["LargeMessagePath"]
-            )
-
-        # Delete the conversation from DynamoDB
+        # Delete the conversation header from DynamoDB
         response = table.delete_item(
             Key={"PK": user_id, "SK": compose_conv_id(user_id, conversation_id)},
             ConditionExpression="attribute_exists(PK) AND attribute_exists(SK)",
+            ReturnValues="ALL_OLD",
         )
 
     except ClientError as e:
@@ -277,6 +499,25 @@ def delete_conversation_by_id(user_id: str, conversation_id: str):
         else:
             raise e
 
+    item = response.get("Attributes", {})
+    if item.get("IsLargeMessage", False):
+        # Delete the large message map of the single blob layout from S3
+        s3_client.delete_object(
+            Bucket=LARGE_MESSAGE_BUCKET, Key=item["LargeMessagePath"]
+        )
+
+    # Delete message items
+    _delete_items(
+        table,
+        user_id,
+        {
+            "KeyConditionExpression": Key("PK").eq(user_id)
+            & Key("SK").begins_with(
+                compose_conv_message_prefix(user_id, conversation_id)
+            ),
+        },
+    )
+
     return response
 
 
@@ -284,46 +525,17 @@ def delete_conversation_by_user_id(user_id: str):
     logger.info(f"Deleting ALL conversations for user: {user_id}")
     table = _get_table_client(user_id)
 
-    query_params = {
-        "KeyConditionExpression": Key("PK").eq(user_id)
-        # NOTE: Need SK to fetch only conversations
-        & Key("SK").begins_with(f"{user_id}#CONV#"),
-        "ProjectionExpression": "SK, IsLargeMessage, LargeMessagePath",
-    }
-
-    def delete_batch(batch):
-        with table.batch_writer() as writer:
-            for item in batch:
-                writer.delete_item(Key={"PK": user_id, "SK": item["SK"]})
-
-    def delete_large_messages(items):
-        for item in items:
-            if item.get("IsLargeMessage", False):
-                s3_client.delete_object(
-                    Bucket=LARGE_MESSAGE_BUCKET, Key=item["LargeMessagePath"]
-                )
-
     try:
-        response = table.query(
-            **query_params,
-        )
-
-        while True:
-            items = response.get("Items", [])
-            delete_large_messages(items)
-
-            for i in range(0, len(items), TRANSACTION_BATCH_SIZE):
-                batch = items[i : i + TRANSACTION_BATCH_SIZE]
-                delete_batch(batch)
-
-            # Check if next page exists
-            if "LastEvaluatedKey" not in response:
-                break
-
-            # Load next page
-            query_params["ExclusiveStartKey"] = response["LastEvaluatedKey"]
-            response = table.query(
-                **query_params,
+        delete_blobs_by_user_id(user_id)
+        for prefix in (f"{user_id}#CONV#", f"{user_id}#CONVMSG#"):
+            _delete_items(
+                table,
+                user_id,
+                {
+                    "KeyConditionExpression": Key("PK").eq(user_id)
+                    # NOTE: Need SK to fetch only conversations
+                    & Key("SK").begins_with(prefix),
+                },
             )
 
     except ClientError as e:
@@ -358,26 +570,57 @@ def change_conversation_title(user_id: str, conversation_id: str, new_title: str
     return response
 
 
+def update_conversation_summary(
+    user_id: str, conversation_id: str, summary: ConversationSummaryModel
+):
+    """Write only the summary of the conversation, without loading the conversation."""
+    logger.info(f"Updating summary for conversation: {conversation_id}")
+    table = _get_table_client(user_id)
+
+    try:
+        response = table.update_item(
+            Key={"PK": user_id, "SK": compose_conv_id(user_id, conversation_id)},
+            UpdateExpression="set Summary = :s",
+            ExpressionAttributeValues={":s": summary.model_dump()},
+            ConditionExpression="attribute_exists(PK) AND attribute_exists(SK)",
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+            raise RecordNotFoundError(
+                f"No conversation found with id: {conversation_id}"
+            )
+        raise e
+    return response
+
+
 def update_feedback(
     user_id: str, conversation_id: str, message_id: str, feedback: FeedbackModel
 ):
+    """Write only the feedback of the message, without loading the conversation."""
     logger.info(f"Updating feedback for conversation: {conversation_id}")
     table = _get_table_client(user_id)
-    conv = find_conversation_by_id(user_id, conversation_id)
-    message_map = conv.message_map
-    message_map[message_id].feedback = feedback
-
-    response = table.update_item(
-        Key={
-            "PK": user_id,
-            "SK": compose_conv_id(user_id, conversation_id),
-        },
-        UpdateExpression="set MessageMap = :m",
-        ExpressionAttributeValues={
-            ":m": json.dumps({k: v.model_dump() for k, v in message_map.items()})
-        },
-        ConditionExpression="attribute_exists(PK) AND attribute_exists(SK)",
-        ReturnValues="UPDATED_NEW",
-    )
+
+    try:
+        response = table.update_item(
+            Key={
+                "PK": user_id,
+                "SK": compose_conv_message_id(user_id, conversation_id, message_id),
+            },
+            UpdateExpression="set Feedback = :f",
+            ExpressionAttributeValues={":f": feedback.model_dump()},
+            ConditionExpression="attribute_exists(PK) AND attribute_exists(SK)",
+            ReturnValues="UPDATED_NEW",
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise e
+
+        # The conversation is stored in the single blob layout. Migrate it with the feedback.
+        conv = find_conversation_by_id(user_id, conversation_id)
+        if message_id not in conv.message_map:
+            raise RecordNotFoundError(f"Message with id {message_id} not found")
+        conv.message_map[message_id].feedback = feedback
+        response = store_conversation(user_id, conv)
+
     logger.info(f"Updated feedback response: {response}")
     return response
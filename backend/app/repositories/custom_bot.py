@@ -3,17 +3,21 @@ import base64
 import json
 import logging
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from decimal import Decimal as decimal
 from functools import partial
 
 import boto3
+from app.cache import LRUCache
 from app.config import DEFAULT_GENERATION_CONFIG as DEFAULT_CLAUDE_GENERATION_CONFIG
 from app.config import DEFAULT_MISTRAL_GENERATION_CONFIG, DEFAULT_SEARCH_CONFIG
 from app.repositories.common import (
     RecordNotFoundError,
     _get_table_client,
     _get_table_public_client,
+    batch_get_items,
     compose_bot_alias_id,
     compose_bot_id,
     decompose_bot_alias_id,
@@ -28,6 +32,7 @@ from app.repositories.models.custom_bot import (
     ConversationQuickStarterModel,
     EmbeddingParamsModel,
     GenerationParamsModel,
+    HistoryParamsModel,
     KnowledgeModel,
     SearchParamsModel,
 )
@@ -46,9 +51,20 @@ DEFAULT_GENERATION_CONFIG = (
     else DEFAULT_CLAUDE_GENERATION_CONFIG
 )
 
+# Bots are served from memory for this duration in seconds. After that, the cached bot
+# is validated with a cheap read of `Version`, which is incremented on every update.
+BOT_CACHE_TTL = float(os.environ.get("BOT_CACHE_TTL", 10))
+# Max number of bots kept in memory on a warm container.
+BOT_CACHE_SIZE = int(os.environ.get("BOT_CACHE_SIZE", 256))
+# Max number of concurrent queries to resolve public bots.
+PUBLIC_BOT_QUERY_CONCURRENCY = 16
+
 logger = logging.getLogger(__name__)
 sts_client = boto3.client("sts")
 
+# Bot id -> (bot, last validated time)
+_bot_cache: LRUCache[tuple[BotModel, float]] = LRUCache(BOT_CACHE_SIZE)
+
 
 def store_bot(user_id: str, custom_bot: BotModel):
     table = _get_table_client(user_id)
@@ -71,6 +87,7 @@ def store_bot(user_id: str, custom_bot: BotModel):
         "SyncStatus": custom_bot.sync_status,
         "SyncStatusReason": custom_bot.sync_status_reason,
         "LastExecId": custom_bot.sync_last_exec_id,
+        "Version": custom_bot.version,
         "ApiPublishmentStackName": custom_bot.published_api_stack_name,
         "ApiPublishedDatetime": custom_bot.published_api_datetime,
         "ApiPublishCodeBuildId": custom_bot.published_api_codebuild_id,
@@ -81,8 +98,11 @@ def store_bot(user_id: str, custom_bot: BotModel):
     }
     if custom_bot.bedrock_knowledge_base:
         item["BedrockKnowledgeBase"] = custom_bot.bedrock_knowledge_base.model_dump()
+    if custom_bot.history_params:
+        item["HistoryParams"] = custom_bot.history_params.model_dump()
 
     response = table.put_item(Item=item)
+    _bot_cache.delete(custom_bot.id)
     return response
 
 
@@ -102,6 +122,7 @@ def update_bot(
     display_retrieved_chunks: bool,
     conversation_quick_starters: list[ConversationQuickStarterModel],
     bedrock_knowledge_base: BedrockKnowledgeBaseModel | None = None,
+    history_params: HistoryParamsModel | None = None,
 ):
     """Update bot title, description, and instruction.
     NOTE: Use `update_bot_visibility` to update visibility.
@@ -145,6 +166,13 @@ def update_bot(
         expression_attribute_values[":bedrock_knowledge_base"] = (
             bedrock_knowledge_base.model_dump()
         )
+    if history_params:
+        update_expression += ", HistoryParams = :history_params"
+        expression_attribute_values[":history_params"] = history_params.model_dump()
+    else:
+        update_expression += " REMOVE HistoryParams"
+    update_expression += " ADD Version :one"
+    expression_attribute_values[":one"] = 1
 
     try:
         response = table.update_item(
@@ -160,6 +188,7 @@ def update_bot(
         else:
             raise e
 
+    _bot_cache.delete(bot_id)
     return response
 
 
@@ -188,6 +217,44 @@ def store_alias(user_id: str, alias: BotAliasModel):
     return response
 
 
+def update_alias_metadata(user_id: str, alias: BotAliasModel):
+    """Update alias to the latest original bot.
+    Unlike `store_alias`, pin status and last used time are not overwritten.
+    """
+    table = _get_table_client(user_id)
+    logger.info(f"Updating metadata of alias: {alias.id}")
+    try:
+        response = table.update_item(
+            Key={"PK": user_id, "SK": compose_bot_alias_id(user_id, alias.id)},
+            UpdateExpression=(
+                "SET Title = :title, "
+                "Description = :description, "
+                "SyncStatus = :sync_status, "
+                "HasKnowledge = :has_knowledge, "
+                "HasAgent = :has_agent, "
+                "ConversationQuickStarters = :conversation_quick_starters"
+            ),
+            ExpressionAttributeValues={
+                ":title": alias.title,
+                ":description": alias.description,
+                ":sync_status": alias.sync_status,
+                ":has_knowledge": alias.has_knowledge,
+                ":has_agent": alias.has_agent,
+                ":conversation_quick_starters": [
+                    starter.model_dump()
+                    for starter in alias.conversation_quick_starters
+                ],
+            },
+            ConditionExpression="attribute_exists(PK) AND attribute_exists(SK)",
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+            raise RecordNotFoundError(f"Alias with id {alias.id} not found")
+        else:
+            raise e
+    return response
+
+
 def update_bot_last_used_time(user_id: str, bot_id: str):
     """Update last used time for bot."""
     table = _get_table_client(user_id)
@@ -273,15 +340,17 @@ def update_knowledge_base_id(
     try:
         response = table.update_item(
             Key={"PK": user_id, "SK": compose_bot_id(user_id, bot_id)},
-            UpdateExpression="SET BedrockKnowledgeBase.knowledge_base_id = :kb_id, BedrockKnowledgeBase.data_source_ids = :ds_ids",
+            UpdateExpression="SET BedrockKnowledgeBase.knowledge_base_id = :kb_id, BedrockKnowledgeBase.data_source_ids = :ds_ids ADD Version :one",
             ExpressionAttributeValues={
                 ":kb_id": knowledge_base_id,
                 ":ds_ids": data_source_ids,
+                ":one": 1,
             },
             ConditionExpression="attribute_exists(PK) AND attribute_exists(SK)",
             ReturnValues="ALL_NEW",
         )
         logger.info(f"Updated knowledge base id for bot: {bot_id} successfully")
+        _bot_cache.delete(bot_id)
     except ClientError as e:
         if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
             raise RecordNotFoundError(f"Bot with id {bot_id} not found")
@@ -371,22 +440,8 @@ def find_private_bots_by_user_id(
     return bots
 
 
-def find_private_bot_by_id(user_id: str, bot_id: str) -> BotModel:
-    """Find private bot."""
-    table = _get_table_client(user_id)
-    logger.info(f"Finding bot with id: {bot_id}")
-    response = table.query(
-        IndexName="SKIndex",
-        KeyConditionExpression=Key("SK").eq(compose_bot_id(user_id, bot_id)),
-    )
-    if len(response["Items"]) == 0:
-        raise RecordNotFoundError(f"Bot with id {bot_id} not found")
-    item = response["Items"][0]
-
-    if "OriginalBotId" in item:
-        raise RecordNotFoundError(f"Bot with id {bot_id} is alias")
-
-    bot = BotModel(
+def _to_bot_model(item: dict) -> BotModel:
+    return BotModel(
         id=decompose_bot_id(item["SK"]),
         title=item["Title"],
         description=item["Description"],
@@ -395,7 +450,7 @@ def find_private_bot_by_id(user_id: str, bot_id: str) -> BotModel:
         last_used_time=float(item["LastBotUsed"]),
         is_pinned=item["IsPinned"],
         public_bot_id=None if "PublicBotId" not in item else item["PublicBotId"],
-        owner_user_id=user_id,
+        owner_user_id=item["PK"],
         embedding_params=EmbeddingParamsModel(
             # For backward compatibility
             chunk_size=(
@@ -461,12 +516,59 @@ def find_private_bot_by_id(user_id: str, bot_id: str) -> BotModel:
             if "BedrockKnowledgeBase" in item
             else None
         ),
+        history_params=(
+            HistoryParamsModel(**item["HistoryParams"])
+            if "HistoryParams" in item
+            else None
+        ),
+        version=int(item.get("Version", 0)),
     )
 
+
+def find_private_bot_by_id(
+    user_id: str, bot_id: str, consistent_read: bool = False
+) -> BotModel:
+    """Find private bot."""
+    table = _get_table_client(user_id)
+    logger.info(f"Finding bot with id: {bot_id}")
+    response = table.get_item(
+        Key={"PK": user_id, "SK": compose_bot_id(user_id, bot_id)},
+        ConsistentRead=consistent_read,
+    )
+    item = response.get("Item")
+    if item is None:
+        raise RecordNotFoundError(f"Bot with id {bot_id} not found")
+
+    if "OriginalBotId" in item:
+        raise RecordNotFoundError(f"Bot with id {bot_id} is alias")
+
+    bot = _to_bot_model(item)
+
     logger.info(f"Found bot: {bot}")
     return bot
 
 
+def find_private_bots_by_ids(
+    user_id: str, bot_ids: list[str], consistent_read: bool = False
+) -> list[BotModel]:
+    """Find private bots with a single `BatchGetItem` per 100 ids.
+    Bots are returned in the order of `bot_ids`. Missing bots are skipped.
+    """
+    logger.info(f"Finding bots with ids: {bot_ids}")
+    items = batch_get_items(
+        [{"PK": user_id, "SK": compose_bot_id(user_id, bot_id)} for bot_id in bot_ids],
+        user_id=user_id,
+        consistent_read=consistent_read,
+    )
+    bots = {
+        bot.id: bot
+        for bot in (
+            _to_bot_model(item) for item in items if "OriginalBotId" not in item
+        )
+    }
+    return [bots[bot_id] for bot_id in bot_ids if bot_id in bots]
+
+
 def find_public_bot_by_id(bot_id: str) -> BotModel:
     """Find public bot by id."""
     table = _get_table_public_client()  # Use public client
@@ -479,99 +581,100 @@ def find_public_bot_by_id(bot_id: str) -> BotModel:
         raise RecordNotFoundError(f"Public bot with id {bot_id} not found")
 
     item = response["Items"][0]
-    bot = BotModel(
-        id=decompose_bot_id(item["SK"]),
-        title=item["Title"],
-        description=item["Description"],
-        instruction=item["Instruction"],
-        create_time=float(item["CreateTime"]),
-        last_used_time=float(item["LastBotUsed"]),
-        is_pinned=item["IsPinned"],
-        public_bot_id=item["PublicBotId"],
-        owner_user_id=item["PK"],
-        embedding_params=EmbeddingParamsModel(
-            # For backward compatibility
-            chunk_size=(
-                item["EmbeddingParams"]["chunk_size"]
-                if "EmbeddingParams" in item and "chunk_size" in item["EmbeddingParams"]
-                else 1000
-            ),
-            chunk_overlap=(
-                item["EmbeddingParams"]["chunk_overlap"]
-                if "EmbeddingParams" in item
-                and "chunk_overlap" in item["EmbeddingParams"]
-                else 200
-            ),
-            enable_partition_pdf=(
-                item["EmbeddingParams"]["enable_partition_pdf"]
-                if "EmbeddingParams" in item
-                and "enable_partition_pdf" in item["EmbeddingParams"]
-                else False
-            ),
-        ),
-        generation_params=GenerationParamsModel(
-            **(
-                item["GenerationParams"]
-                if "GenerationParams" in item
-                else DEFAULT_GENERATION_CONFIG
-            )
-        ),
-        search_params=SearchParamsModel(
-            max_results=(
-                item["SearchParams"]["max_results"]
-                if "SearchParams" in item
-                else DEFAULT_SEARCH_CONFIG["max_results"]
-            )
-        ),
-        agent=(
-            AgentModel(**item["AgentData"])
-            if "AgentData" in item
-            else AgentModel(tools=[])
-        ),
-        knowledge=KnowledgeModel(
-            **{**item["Knowledge"], "s3_urls": item["Knowledge"].get("s3_urls", [])}
-        ),
-        sync_status=item["SyncStatus"],
-        sync_status_reason=item["SyncStatusReason"],
-        sync_last_exec_id=item["LastExecId"],
-        published_api_stack_name=(
-            None
-            if "ApiPublishmentStackName" not in item
-            else item["ApiPublishmentStackName"]
-        ),
-        published_api_datetime=(
-            None if "ApiPublishedDatetime" not in item else item["ApiPublishedDatetime"]
-        ),
-        published_api_codebuild_id=(
-            None
-            if "ApiPublishCodeBuildId" not in item
-            else item["ApiPublishCodeBuildId"]
-        ),
-        display_retrieved_chunks=item.get("DisplayRetrievedChunks", False),
-        conversation_quick_starters=item.get("ConversationQuickStarters", []),
-        bedrock_knowledge_base=(
-            BedrockKnowledgeBaseModel(**item["BedrockKnowledgeBase"])
-            if "BedrockKnowledgeBase" in item
-            else None
-        ),
-    )
+    bot = _to_bot_model(item)
     logger.info(f"Found public bot: {bot}")
     return bot
 
 
-def find_alias_by_id(user_id: str, alias_id: str) -> BotAliasModel:
-    """Find alias bot by id."""
-    table = _get_table_client(user_id)
-    logger.info(f"Finding alias bot with id: {alias_id}")
-    response = table.query(
-        IndexName="SKIndex",
-        KeyConditionExpression=Key("SK").eq(compose_bot_alias_id(user_id, alias_id)),
-    )
-    if len(response["Items"]) == 0:
-        raise RecordNotFoundError(f"Alias bot with id {alias_id} not found")
-    item = response["Items"][0]
+def find_public_bot_items_by_ids(
+    bot_ids: list[str], attributes: list[str]
+) -> dict[str, dict]:
+    """Find public bots by ids with concurrent queries, reading only the given attributes.
+    Returns items keyed by bot id. Bots which are no longer public are not included.
+    NOTE: `BatchGetItem` can not be used, since aliases do not hold the keys of the original bots.
+    """
+    if not bot_ids:
+        return {}
+
+    # NOTE: Share the low-level client across the workers, since it is thread-safe unlike resources
+    client = _get_table_public_client().meta.client
+    attribute_names = {f"#a{i}": name for i, name in enumerate(attributes)}
+    projection = ", ".join(["PublicBotId", *attribute_names.keys()])
+
+    def query_dynamodb(bot_id: str) -> list[dict]:
+        response = client.query(
+            TableName=TABLE_NAME,
+            IndexName="PublicBotIdIndex",
+            KeyConditionExpression=Key("PublicBotId").eq(bot_id),
+            ProjectionExpression=projection,
+            ExpressionAttributeNames=attribute_names,
+        )
+        return response["Items"]
+
+    with ThreadPoolExecutor(
+        max_workers=min(len(bot_ids), PUBLIC_BOT_QUERY_CONCURRENCY)
+    ) as executor:
+        results = executor.map(query_dynamodb, bot_ids)
+
+    return {item["PublicBotId"]: item for items in results for item in items}
+
+
+def _find_bot_version(user_id: str, bot: BotModel) -> int | None:
+    """Read only `Version` of the bot.
+    Returns None if the bot is no longer available to the user (deleted or unpublished).
+    """
+    if bot.owner_user_id == user_id:
+        item = (
+            _get_table_client(user_id)
+            .get_item(
+                Key={"PK": user_id, "SK": compose_bot_id(user_id, bot.id)},
+                ProjectionExpression="Version",
+                # NOTE: The owner may have just updated the bot
+                ConsistentRead=True,
+            )
+            .get("Item")
+        )
+    else:
+        items = _get_table_public_client().query(
+            IndexName="PublicBotIdIndex",
+            KeyConditionExpression=Key("PublicBotId").eq(bot.id),
+            ProjectionExpression="Version",
+        )["Items"]
+        item = items[0] if items else None
+    return None if item is None else int(item.get("Version", 0))
+
+
+def find_cached_bot(user_id: str, bot_id: str) -> BotModel | None:
+    """Find bot from the in-process cache.
+    Returns None if the bot is not cached, not available to the user or outdated.
+    NOTE: `is_pinned` and `last_used_time` are not versioned, so they may be stale.
+    """
+    entry = _bot_cache.get(bot_id)
+    if entry is None:
+        return None
+
+    bot, validated_at = entry
+    if bot.owner_user_id != user_id and bot.public_bot_id is None:
+        # Private bot of another user
+        return None
+    if time.monotonic() - validated_at < BOT_CACHE_TTL:
+        return bot
+
+    version = _find_bot_version(user_id, bot)
+    if version != bot.version:
+        logger.info(f"Cached bot is outdated: {bot_id}")
+        _bot_cache.delete(bot_id)
+        return None
+    _bot_cache.set(bot_id, (bot, time.monotonic()))
+    return bot
 
-    bot = BotAliasModel(
+
+def cache_bot(bot: BotModel):
+    _bot_cache.set(bot.id, (bot, time.monotonic()))
+
+
+def _to_alias_model(item: dict) -> BotAliasModel:
+    return BotAliasModel(
         id=decompose_bot_alias_id(item["SK"]),
         title=item["Title"],
         description=item["Description"],
@@ -585,36 +688,67 @@ def find_alias_by_id(user_id: str, alias_id: str) -> BotAliasModel:
         conversation_quick_starters=item.get("ConversationQuickStarters", []),
     )
 
+
+def find_alias_by_id(
+    user_id: str, alias_id: str, consistent_read: bool = False
+) -> BotAliasModel:
+    """Find alias bot by id."""
+    table = _get_table_client(user_id)
+    logger.info(f"Finding alias bot with id: {alias_id}")
+    response = table.get_item(
+        Key={"PK": user_id, "SK": compose_bot_alias_id(user_id, alias_id)},
+        ConsistentRead=consistent_read,
+    )
+    item = response.get("Item")
+    if item is None:
+        raise RecordNotFoundError(f"Alias bot with id {alias_id} not found")
+
+    bot = _to_alias_model(item)
+
     logger.info(f"Found alias: {bot}")
     return bot
 
 
+def find_aliases_by_ids(
+    user_id: str, alias_ids: list[str], consistent_read: bool = False
+) -> list[BotAliasModel]:
+    """Find alias bots with a single `BatchGetItem` per 100 ids.
+    Aliases are returned in the order of `alias_ids`. Missing aliases are skipped.
+    """
+    logger.info(f"Finding alias bots with ids: {alias_ids}")
+    items = batch_get_items(
+        [
+            {"PK": user_id, "SK": compose_bot_alias_id(user_id, alias_id)}
+            for alias_id in alias_ids
+        ],
+        user_id=user_id,
+        consistent_read=consistent_read,
+    )
+    aliases = {alias.id: alias for alias in (_to_alias_model(item) for item in items)}
+    return [aliases[alias_id] for alias_id in alias_ids if alias_id in aliases]
+
+
 def update_bot_visibility(user_id: str, bot_id: str, visible: bool):
     """Update bot visibility."""
     table = _get_table_client(user_id)
     logger.info(f"Making bot public: {bot_id}")
 
-    response = table.query(
-        IndexName="SKIndex",
-        KeyConditionExpression=Key("SK").eq(compose_bot_id(user_id, bot_id)),
-    )
-    if len(response["Items"]) == 0:
-        raise RecordNotFoundError(f"Bot with id {bot_id} not found")
-
+    # NOTE: Existence is checked by the condition of the update
     try:
         if visible:
             # To visible (open to public)
             response = table.update_item(
                 Key={"PK": user_id, "SK": compose_bot_id(user_id, bot_id)},
-                UpdateExpression="SET PublicBotId = :val",
-                ExpressionAttributeValues={":val": bot_id},
+                UpdateExpression="SET PublicBotId = :val ADD Version :one",
+                ExpressionAttributeValues={":val": bot_id, ":one": 1},
                 ConditionExpression="attribute_exists(PK) AND attribute_exists(SK)",
             )
         else:
             # To hide (close to private)
             response = table.update_item(
                 Key={"PK": user_id, "SK": compose_bot_id(user_id, bot_id)},
-                UpdateExpression="REMOVE PublicBotId",
+                UpdateExpression="REMOVE PublicBotId ADD Version :one",
+                ExpressionAttributeValues={":one": 1},
                 ReturnValues="ALL_NEW",
                 ConditionExpression="attribute_exists(PK) AND attribute_exists(SK)",
             )
@@ -624,6 +758,7 @@ def update_bot_visibility(user_id: str, bot_id: str, visible: bool):
         else:
             raise e
 
+    _bot_cache.delete(bot_id)
     return response
 
 
@@ -636,13 +771,14 @@ def update_bot_publication(
     try:
         response = table.update_item(
             Key={"PK": user_id, "SK": compose_bot_id(user_id, bot_id)},
-            UpdateExpression="SET ApiPublishmentStackName = :val, ApiPublishedDatetime = :time, ApiPublishCodeBuildId = :build_id",
+            UpdateExpression="SET ApiPublishmentStackName = :val, ApiPublishedDatetime = :time, ApiPublishCodeBuildId = :build_id ADD Version :one",
             # NOTE: Stack naming rule: ApiPublishmentStack{published_api_id}.
             # See bedrock-chat-stack.ts > `ApiPublishmentStack`
             ExpressionAttributeValues={
                 ":val": f"ApiPublishmentStack{published_api_id}",
                 ":time": current_time,
                 ":build_id": build_id,
+                ":one": 1,
             },
             ConditionExpression="attribute_exists(PK) AND attribute_exists(SK)",
         )
@@ -652,6 +788,7 @@ def update_bot_publication(
         else:
             raise e
 
+    _bot_cache.delete(bot_id)
     return response
 
 
@@ -661,7 +798,8 @@ def delete_bot_publication(user_id: str, bot_id: str):
     try:
         response = table.update_item(
             Key={"PK": user_id, "SK": compose_bot_id(user_id, bot_id)},
-            UpdateExpression="REMOVE ApiPublishmentStackName, ApiPublishedDatetime, ApiPublishCodeBuildId",
+            UpdateExpression="REMOVE ApiPublishmentStackName, ApiPublishedDatetime, ApiPublishCodeBuildId ADD Version :one",
+            ExpressionAttributeValues={":one": 1},
             ConditionExpression="attribute_exists(PK) AND attribute_exists(SK)",
         )
     except ClientError as e:
@@ -670,6 +808,7 @@ def delete_bot_publication(user_id: str, bot_id: str):
         else:
             raise e
 
+    _bot_cache.delete(bot_id)
     return response
 
 
@@ -688,6 +827,7 @@ def delete_bot_by_id(user_id: str, bot_id: str):
         else:
             raise e
 
+    _bot_cache.delete(bot_id)
     return response
 
 
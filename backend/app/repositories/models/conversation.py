@@ -11,7 +11,7 @@ if TYPE_CHECKING:
     )
 
 from app.routes.schemas.conversation import MessageInput, type_model_name
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, PrivateAttr
 
 
 class ContentModel(BaseModel):
@@ -22,6 +22,10 @@ class ContentModel(BaseModel):
         description="Body string. If content_type is image or attachment, it should be base64 encoded.",
     )
     file_name: str | None = Field(None)
+    # Key of the body in the blob store. If set, `body` is empty and fetched lazily.
+    blob_key: str | None = None
+    # Size in bytes of the body in the blob store, to estimate tokens without fetching it.
+    blob_size: int | None = None
 
     model_config = {
         "json_encoders": {
@@ -148,6 +152,12 @@ class MessageModel(BaseModel):
         )
 
 
+class ConversationSummaryModel(BaseModel):
+    body: str
+    # Id of the last message covered by the summary
+    last_message_id: str
+
+
 class ConversationModel(BaseModel):
     id: str
     create_time: float
@@ -157,6 +167,12 @@ class ConversationModel(BaseModel):
     last_message_id: str
     bot_id: str | None
     should_continue: bool
+    # Rolling summary of the older turns
+    summary: ConversationSummaryModel | None = None
+
+    # Digests of the messages as loaded from the per-message items.
+    # Used by the repository to write only new or changed messages.
+    _stored_message_digests: dict[str, str] = PrivateAttr(default_factory=dict)
 
 
 class ConversationMeta(BaseModel):
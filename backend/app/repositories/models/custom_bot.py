@@ -49,6 +49,11 @@ class SearchParamsModel(BaseModel):
     max_results: int
 
 
+class HistoryParamsModel(BaseModel):
+    # Max input tokens of the conversation history including the instruction
+    max_input_tokens: int
+
+
 class AgentToolModel(BaseModel):
     name: str
     description: str
@@ -56,6 +61,8 @@ class AgentToolModel(BaseModel):
 
 class AgentModel(BaseModel):
     tools: list[AgentToolModel]
+    # Return search results from the knowledge tool without generating an answer
+    knowledge_retrieval_only: bool = False
 
 
 class ConversationQuickStarterModel(BaseModel):
@@ -88,6 +95,9 @@ class BotModel(BaseModel):
     display_retrieved_chunks: bool
     conversation_quick_starters: list[ConversationQuickStarterModel]
     bedrock_knowledge_base: BedrockKnowledgeBaseModel | None
+    history_params: HistoryParamsModel | None = None
+    # Incremented on every update of the configuration. Used to validate cached bots.
+    version: int = 0
 
     def has_knowledge(self) -> bool:
         return (
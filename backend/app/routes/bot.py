@@ -21,6 +21,7 @@ from app.routes.schemas.bot import (
     ConversationQuickStarter,
     EmbeddingParams,
     GenerationParams,
+    HistoryParams,
     Knowledge,
     SearchParams,
 )
@@ -34,6 +35,7 @@ from app.usecases.bot import (
     modify_pin_status,
     remove_bot_by_id,
     remove_uploaded_file,
+    request_stale_alias_refresh,
 )
 from app.user import User
 from fastapi import APIRouter, Depends, Request
@@ -99,6 +101,8 @@ def get_all_bots(
         bots = fetch_all_bots_by_user_id(
             current_user.id, limit=limit, only_pinned=pinned
         )
+        # Update outdated aliases found by the listing in the background
+        request_stale_alias_refresh()
     else:
         raise ValueError(f"Invalid kind: {kind}")
 
@@ -126,7 +130,8 @@ def get_private_bot(request: Request, bot_id: str):
     """Get private bot by id."""
     current_user: User = request.state.current_user
 
-    bot = find_private_bot_by_id(current_user.id, bot_id)
+    # NOTE: Fetched right after creating or updating the bot
+    bot = find_private_bot_by_id(current_user.id, bot_id, consistent_read=True)
     output = BotOutput(
         id=bot.id,
         title=bot.title,
@@ -146,7 +151,8 @@ def get_private_bot(request: Request, bot_id: str):
             tools=[
                 AgentTool(name=tool.name, description=tool.description)
                 for tool in bot.agent.tools
-            ]
+            ],
+            knowledge_retrieval_only=bot.agent.knowledge_retrieval_only,
         ),
         knowledge=Knowledge(
             source_urls=bot.knowledge.source_urls,
@@ -180,6 +186,11 @@ def get_private_bot(request: Request, bot_id: str):
             if bot.bedrock_knowledge_base
             else None
         ),
+        history_params=(
+            HistoryParams(**bot.history_params.model_dump())
+            if bot.history_params
+            else None
+        ),
     )
     return output
 
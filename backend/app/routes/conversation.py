@@ -3,6 +3,7 @@ from app.repositories.conversation import (
     delete_conversation_by_id,
     delete_conversation_by_user_id,
     find_conversation_by_user_id,
+    find_conversation_page_by_user_id,
     update_feedback,
 )
 from app.repositories.models.conversation import FeedbackModel
@@ -11,6 +12,7 @@ from app.routes.schemas.conversation import (
     ChatOutput,
     Conversation,
     ConversationMetaOutput,
+    ConversationMetaOutputsWithNextToken,
     FeedbackInput,
     FeedbackOutput,
     NewTitleInput,
@@ -24,7 +26,7 @@ from app.usecases.chat import (
     propose_conversation_title,
 )
 from app.user import User
-from fastapi import APIRouter, Request
+from fastapi import APIRouter, Query, Request
 
 router = APIRouter(tags=["conversation"])
 
@@ -77,14 +79,28 @@ def remove_conversation(request: Request, conversation_id: str):
     delete_conversation_by_id(current_user.id, conversation_id)
 
 
-@router.get("/conversations", response_model=list[ConversationMetaOutput])
+@router.get(
+    "/conversations",
+    response_model=list[ConversationMetaOutput] | ConversationMetaOutputsWithNextToken,
+)
 def get_all_conversations(
     request: Request,
+    limit: int | None = Query(None, ge=1, le=100),
+    next_token: str | None = None,
 ):
-    """Get all conversation metadata"""
+    """Get all conversation metadata.
+    If `limit` or `next_token` is given, return a single page with the token of the next page.
+    """
     current_user: User = request.state.current_user
 
-    conversations = find_conversation_by_user_id(current_user.id)
+    paginated = limit is not None or next_token is not None
+    if not paginated:
+        conversations = find_conversation_by_user_id(current_user.id)
+    else:
+        conversations, next_token = find_conversation_page_by_user_id(
+            current_user.id, limit=limit, next_token=next_token
+        )
+
     output = [
         ConversationMetaOutput(
             id=conversation.id,
@@ -95,7 +111,11 @@ def get_all_conversations(
         )
         for conversation in conversations
     ]
-    return output
+    if not paginated:
+        return output
+    return ConversationMetaOutputsWithNextToken(
+        conversations=output, next_token=next_token
+    )
 
 
 @router.delete("/conversations")
@@ -42,6 +42,14 @@ class SearchParams(BaseSchema):
     max_results: int
 
 
+class HistoryParams(BaseSchema):
+    max_input_tokens: int = Field(
+        ...,
+        gt=0,
+        description="Max input tokens of the conversation history. Older turns are dropped to fit in.",
+    )
+
+
 class AgentTool(BaseSchema):
     name: str
     description: str
@@ -49,10 +57,15 @@ class AgentTool(BaseSchema):
 
 class Agent(BaseSchema):
     tools: list[AgentTool]
+    knowledge_retrieval_only: bool = Field(False)
 
 
 class AgentInput(BaseSchema):
     tools: list[str] = Field(..., description="List of tool names")
+    knowledge_retrieval_only: bool = Field(
+        False,
+        description="If true, the knowledge tool returns search results to the agent instead of generating an answer.",
+    )
 
 
 class Knowledge(BaseSchema):
@@ -109,6 +122,7 @@ class BotInput(BaseSchema):
     display_retrieved_chunks: bool
     conversation_quick_starters: list[ConversationQuickStarter] | None
     bedrock_knowledge_base: BedrockKnowledgeBaseInput | None = None
+    history_params: HistoryParams | None = None
 
 
 class BotModifyInput(BaseSchema):
@@ -123,6 +137,7 @@ class BotModifyInput(BaseSchema):
     display_retrieved_chunks: bool
     conversation_quick_starters: list[ConversationQuickStarter] | None
     bedrock_knowledge_base: BedrockKnowledgeBaseInput | None = None
+    history_params: HistoryParams | None = None
 
     def has_update_files(self) -> bool:
         return self.knowledge is not None and (
@@ -178,6 +193,7 @@ class BotModifyOutput(BaseSchema):
     knowledge: Knowledge
     conversation_quick_starters: list[ConversationQuickStarter]
     bedrock_knowledge_base: BedrockKnowledgeBaseOutput | None
+    history_params: HistoryParams | None = None
 
 
 class BotOutput(BaseSchema):
@@ -202,6 +218,7 @@ class BotOutput(BaseSchema):
     display_retrieved_chunks: bool
     conversation_quick_starters: list[ConversationQuickStarter]
     bedrock_knowledge_base: BedrockKnowledgeBaseOutput | None
+    history_params: HistoryParams | None = None
 
 
 class BotMetaOutput(BaseSchema):
@@ -217,6 +217,11 @@ class ConversationMetaOutput(BaseSchema):
     bot_id: str | None
 
 
+class ConversationMetaOutputsWithNextToken(BaseSchema):
+    conversations: list[ConversationMetaOutput]
+    next_token: str | None
+
+
 class Conversation(BaseSchema):
     id: str
     title: str
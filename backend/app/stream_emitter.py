@@ -0,0 +1,141 @@
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+# Max time in milliseconds a streamed token is buffered before being sent.
+STREAMING_FLUSH_INTERVAL_MS = int(os.environ.get("STREAMING_FLUSH_INTERVAL_MS", 50))
+# Buffered characters which trigger sending regardless of the interval.
+# NOTE: Keep the frame well below the 32KB limit of API Gateway WebSocket, even if escaped as `\uXXXX`.
+STREAMING_FLUSH_SIZE = int(os.environ.get("STREAMING_FLUSH_SIZE", 1024))
+# Max number of frames waiting to be sent. Producers block when the queue is full.
+STREAMING_SEND_QUEUE_SIZE = int(os.environ.get("STREAMING_SEND_QUEUE_SIZE", 256))
+
+
+class CoalescingEmitter:
+    """Coalesce streamed tokens into fewer frames.
+    The first token is sent immediately to keep time-to-first-token, and following tokens
+    are buffered until the interval elapses, the buffer exceeds the size, or `flush` is called.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[str], None],
+        interval_ms: int = STREAMING_FLUSH_INTERVAL_MS,
+        max_size: int = STREAMING_FLUSH_SIZE,
+    ):
+        """
+        :param send: Callback to send the coalesced text.
+        :param interval_ms: Max time to buffer tokens. `0` disables coalescing.
+        :param max_size: Number of buffered characters to send without waiting for the interval.
+        """
+        self.send = send
+        self.interval = interval_ms / 1000
+        self.max_size = max_size
+        self._buffer: list[str] = []
+        self._buffer_size = 0
+        self._last_sent_at: float | None = None
+        self.token_count = 0
+        self.frame_count = 0
+
+    def emit(self, token: str) -> None:
+        self.token_count += 1
+        self._buffer.append(token)
+        self._buffer_size += len(token)
+        if (
+            self._last_sent_at is None
+            or self._buffer_size >= self.max_size
+            or time.monotonic() - self._last_sent_at >= self.interval
+        ):
+            self.flush()
+
+    def flush(self) -> None:
+        """Send buffered tokens. Must be called at the end of the stream."""
+        if not self._buffer:
+            return
+        text = "".join(self._buffer)
+        self._buffer = []
+        self._buffer_size = 0
+        self.send(text)
+        self._last_sent_at = time.monotonic()
+        self.frame_count += 1
+
+
+class BackgroundSender:
+    """Send WebSocket frames from a background thread, so that slow `post_to_connection`
+    calls do not stall consuming the Bedrock stream.
+    Exposes `post_to_connection` to be used in place of the API Gateway management client.
+    Frames are sent in order. Call `close` to send all queued frames and stop the thread.
+    """
+
+    def __init__(self, gatewayapi, max_queue_size: int = STREAMING_SEND_QUEUE_SIZE):
+        self.gatewayapi = gatewayapi
+        self._queue: queue.Queue[tuple[str, bytes] | None] = queue.Queue(
+            maxsize=max_queue_size
+        )
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._closed = False
+        # Metrics
+        self.sent_count = 0
+        self.max_queue_depth = 0
+        self.total_wait_time = 0.0  # Time producers were blocked by the full queue
+        self.total_send_latency = 0.0
+        self.max_send_latency = 0.0
+        self.error: Exception | None = None
+        self._thread.start()
+
+    def post_to_connection(self, ConnectionId: str, Data: bytes) -> None:
+        if self._closed:
+            raise RuntimeError("Sender is already closed")
+        start = time.monotonic()
+        self._queue.put((ConnectionId, Data))
+        self.total_wait_time += time.monotonic() - start
+        self.max_queue_depth = max(self.max_queue_depth, self._queue.qsize())
+
+    def _run(self) -> None:
+        while True:
+            frame = self._queue.get()
+            try:
+                if frame is None:
+                    return
+                if self.error is not None:
+                    # e.g. The client has disconnected. Drop the rest of frames.
+                    continue
+                connection_id, data = frame
+                start = time.monotonic()
+                self.gatewayapi.post_to_connection(
+                    ConnectionId=connection_id, Data=data
+                )
+                latency = time.monotonic() - start
+                self.sent_count += 1
+                self.total_send_latency += latency
+                self.max_send_latency = max(self.max_send_latency, latency)
+            except Exception as e:
+                logger.error(f"Failed to send frame: {e}")
+                self.error = e
+            finally:
+                self._queue.task_done()
+
+    def flush(self) -> None:
+        """Wait until all queued frames are sent."""
+        self._queue.join()
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+        average_latency = (
+            self.total_send_latency / self.sent_count if self.sent_count else 0.0
+        )
+        logger.info(
+            f"Sent {self.sent_count} frames. "
+            f"max queue depth: {self.max_queue_depth}, "
+            f"producer wait: {self.total_wait_time * 1000:.1f}ms, "
+            f"send latency avg: {average_latency * 1000:.1f}ms, max: {self.max_send_latency * 1000:.1f}ms"
+        )
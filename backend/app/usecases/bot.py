@@ -1,7 +1,9 @@
 import logging
 import os
+import threading
 
 from app.agents.utils import get_available_tools, get_tool_by_name
+from app.cache import LRUCache
 from app.config import DEFAULT_EMBEDDING_CONFIG
 from app.config import DEFAULT_GENERATION_CONFIG as DEFAULT_CLAUDE_GENERATION_CONFIG
 from app.config import DEFAULT_MISTRAL_GENERATION_CONFIG, DEFAULT_SEARCH_CONFIG
@@ -12,14 +14,18 @@ from app.repositories.common import (
     decompose_bot_id,
 )
 from app.repositories.custom_bot import (
+    cache_bot,
     delete_alias_by_id,
     delete_bot_by_id,
     find_alias_by_id,
+    find_cached_bot,
     find_private_bot_by_id,
     find_public_bot_by_id,
+    find_public_bot_items_by_ids,
     store_alias,
     store_bot,
     update_alias_last_used_time,
+    update_alias_metadata,
     update_alias_pin_status,
     update_bot,
     update_bot_last_used_time,
@@ -34,6 +40,7 @@ from app.repositories.models.custom_bot import (
     ConversationQuickStarterModel,
     EmbeddingParamsModel,
     GenerationParamsModel,
+    HistoryParamsModel,
     KnowledgeModel,
     SearchParamsModel,
 )
@@ -49,6 +56,7 @@ from app.routes.schemas.bot import (
     ConversationQuickStarter,
     EmbeddingParams,
     GenerationParams,
+    HistoryParams,
     Knowledge,
     SearchParams,
     type_sync_status,
@@ -62,6 +70,7 @@ from app.utils import (
     delete_files_with_prefix_from_s3,
     generate_presigned_url,
     get_current_time,
+    invoke_background_task,
     move_file_in_s3,
 )
 from boto3.dynamodb.conditions import Attr, Key
@@ -69,6 +78,30 @@ from botocore.exceptions import ClientError
 
 logger = logging.getLogger(__name__)
 
+# Attributes of original bots needed to list aliases.
+ORIGINAL_BOT_ATTRIBUTES = [
+    "Title",
+    "Description",
+    "CreateTime",
+    "LastBotUsed",
+    "SyncStatus",
+    "Knowledge",
+    "AgentData",
+    "ConversationQuickStarters",
+    "BedrockKnowledgeBase",
+]
+
+# Aliases to be updated to the latest original bots, keyed by user id and alias id.
+# Coalesced, so that listing bots repeatedly updates each alias once.
+_stale_aliases: dict[tuple[str, str], BotAliasModel] = {}
+_stale_aliases_lock = threading.Lock()
+# Alias updates requested recently, which are not requested again until they expire.
+# Coalesces repeated listings while the background task is writing the update.
+ALIAS_REFRESH_REQUEST_TTL = 60  # seconds
+_requested_alias_refreshes: LRUCache[str] = LRUCache(
+    1000, ttl=ALIAS_REFRESH_REQUEST_TTL
+)
+
 DOCUMENT_BUCKET = os.environ.get("DOCUMENT_BUCKET", "bedrock-documents")
 ENABLE_MISTRAL = os.environ.get("ENABLE_MISTRAL", "") == "true"
 
@@ -164,7 +197,8 @@ def create_new_bot(user_id: str, bot_input: BotInput) -> BotOutput:
                 for t in [
                     get_tool_by_name(tool_name) for tool_name in bot_input.agent.tools
                 ]
-            ]
+            ],
+            knowledge_retrieval_only=bot_input.agent.knowledge_retrieval_only,
         )
         if bot_input.agent
         else AgentModel(tools=[])
@@ -221,6 +255,11 @@ def create_new_bot(user_id: str, bot_input: BotInput) -> BotOutput:
                 if bot_input.bedrock_knowledge_base
                 else None
             ),
+            history_params=(
+                HistoryParamsModel(**bot_input.history_params.model_dump())
+                if bot_input.history_params
+                else None
+            ),
         ),
     )
     return BotOutput(
@@ -244,7 +283,8 @@ def create_new_bot(user_id: str, bot_input: BotInput) -> BotOutput:
             tools=[
                 AgentTool(name=tool.name, description=tool.description)
                 for tool in agent.tools
-            ]
+            ],
+            knowledge_retrieval_only=agent.knowledge_retrieval_only,
         ),
         knowledge=Knowledge(
             source_urls=source_urls,
@@ -274,6 +314,11 @@ def create_new_bot(user_id: str, bot_input: BotInput) -> BotOutput:
             if bot_input.bedrock_knowledge_base
             else None
         ),
+        history_params=(
+            HistoryParams(**bot_input.history_params.model_dump())
+            if bot_input.history_params
+            else None
+        ),
     )
 
 
@@ -347,7 +392,8 @@ def modify_owned_bot(
                     get_tool_by_name(tool_name)
                     for tool_name in modify_input.agent.tools
                 ]
-            ]
+            ],
+            knowledge_retrieval_only=modify_input.agent.knowledge_retrieval_only,
         )
         if modify_input.agent
         else AgentModel(tools=[])
@@ -356,7 +402,7 @@ def modify_owned_bot(
     # if knowledge and embedding_params are not updated, skip embeding process.
     # 'sync_status = "QUEUED"' will execute embeding process and update dynamodb record.
     # 'sync_status= "SUCCEEDED"' will update only dynamodb record.
-    bot = find_private_bot_by_id(user_id, bot_id)
+    bot = find_private_bot_by_id(user_id, bot_id, consistent_read=True)
     sync_status = "QUEUED" if modify_input.is_embedding_required(bot) else "SUCCEEDED"
 
     update_bot(
@@ -400,6 +446,11 @@ def modify_owned_bot(
             if modify_input.bedrock_knowledge_base
             else None
         ),
+        history_params=(
+            HistoryParamsModel(**modify_input.history_params.model_dump())
+            if modify_input.history_params
+            else None
+        ),
     )
 
     return BotModifyOutput(
@@ -418,7 +469,8 @@ def modify_owned_bot(
             tools=[
                 AgentTool(name=tool.name, description=tool.description)
                 for tool in agent.tools
-            ]
+            ],
+            knowledge_retrieval_only=agent.knowledge_retrieval_only,
         ),
         knowledge=Knowledge(
             source_urls=source_urls,
@@ -444,6 +496,11 @@ def modify_owned_bot(
             if modify_input.bedrock_knowledge_base
             else None
         ),
+        history_params=(
+            HistoryParams(**modify_input.history_params.model_dump())
+            if modify_input.history_params
+            else None
+        ),
     )
 
 
@@ -452,25 +509,109 @@ def fetch_bot(user_id: str, bot_id: str) -> tuple[bool, BotModel]:
     The first element of the returned tuple is whether the bot is owned or not.
     `True` means the bot is owned by the user.
     `False` means the bot is shared by another user.
+    Bots are cached in memory, so that shared bots used by many users are not rebuilt for each message.
     """
+    bot = find_cached_bot(user_id, bot_id)
+    if bot is not None:
+        return bot.owner_user_id == user_id, bot
+
     try:
-        return True, find_private_bot_by_id(user_id, bot_id)
+        # NOTE: Read the latest version, which may have been just written by the owner
+        bot = find_private_bot_by_id(user_id, bot_id, consistent_read=True)
+        cache_bot(bot)
+        return True, bot
     except RecordNotFoundError:
         pass  #
 
     try:
-        return False, find_public_bot_by_id(bot_id)
+        bot = find_public_bot_by_id(bot_id)
+        cache_bot(bot)
+        return False, bot
     except RecordNotFoundError:
         raise RecordNotFoundError(
             f"Bot with ID {bot_id} not found in both private (for user {user_id}) and public items."
         )
 
 
+def _has_knowledge(item: dict) -> bool:
+    knowledge = item.get("Knowledge", {})
+    return any(
+        len(knowledge.get(key, [])) > 0
+        for key in ["source_urls", "sitemap_urls", "filenames", "s3_urls"]
+    )
+
+
+def _queue_alias_refresh(user_id: str, alias: BotAliasModel):
+    with _stale_aliases_lock:
+        _stale_aliases[(user_id, alias.id)] = alias
+
+
+def _drain_stale_aliases() -> list[tuple[str, BotAliasModel]]:
+    with _stale_aliases_lock:
+        stale_aliases = [
+            (user_id, alias) for (user_id, _), alias in _stale_aliases.items()
+        ]
+        _stale_aliases.clear()
+    return stale_aliases
+
+
+def request_stale_alias_refresh():
+    """Start `refresh_aliases` in the background for aliases queued by `fetch_all_bots_by_user_id`.
+    All aliases are sent in a single invocation, and the same update is not requested again
+    while it is pending. Runs in the process if the background task function is not configured
+    (e.g. local development).
+    """
+    stale_aliases = []
+    for user_id, alias in _drain_stale_aliases():
+        update = alias.model_dump_json()
+        if _requested_alias_refreshes.get((user_id, alias.id)) == update:
+            continue
+        _requested_alias_refreshes.set((user_id, alias.id), update)
+        stale_aliases.append((user_id, alias))
+    if not stale_aliases:
+        return
+
+    try:
+        invoked = invoke_background_task(
+            "refresh_aliases",
+            {
+                "aliases": [
+                    {"user_id": user_id, "alias": alias.model_dump()}
+                    for user_id, alias in stale_aliases
+                ]
+            },
+        )
+    except Exception as e:
+        logger.warning(f"Failed to request alias refresh: {e}")
+        for user_id, alias in stale_aliases:
+            _requested_alias_refreshes.delete((user_id, alias.id))
+        return
+    if not invoked:
+        refresh_aliases(stale_aliases)
+
+
+def refresh_stale_aliases():
+    """Update aliases queued by `fetch_all_bots_by_user_id` in the process."""
+    refresh_aliases(_drain_stale_aliases())
+
+
+def refresh_aliases(aliases: list[tuple[str, BotAliasModel]]):
+    """Update aliases of the users to the latest original bots."""
+    for user_id, alias in aliases:
+        try:
+            update_alias_metadata(user_id, alias)
+        except RecordNotFoundError:
+            logger.info(f"Alias {alias.id} has been removed")
+        except Exception as e:
+            logger.warning(f"Failed to refresh alias {alias.id}: {e}")
+
+
 def fetch_all_bots_by_user_id(
     user_id: str, limit: int | None = None, only_pinned: bool = False
 ) -> list[BotMeta]:
     """Find all private & shared bots of a user.
     The order is descending by `last_used_time`.
+    Outdated aliases are queued to be updated by `request_stale_alias_refresh`.
     """
     if not only_pinned and not limit:
         raise ValueError("Must specify either `limit` or `only_pinned`")
@@ -495,77 +636,90 @@ def fetch_all_bots_by_user_id(
 
     response = table.query(**query_params)
 
+    # Resolve original bots of aliases at once
+    originals = find_public_bot_items_by_ids(
+        list(
+            {
+                item["OriginalBotId"]
+                for item in response["Items"]
+                if "OriginalBotId" in item
+            }
+        ),
+        ORIGINAL_BOT_ATTRIBUTES,
+    )
+
     bots = []
     for item in response["Items"]:
         if "OriginalBotId" in item:
-            # Fetch original bots of alias bots
-            is_original_available = True
-            try:
-                bot = find_public_bot_by_id(item["OriginalBotId"])
-                logger.info(f"Found original bot: {bot.id}")
-                meta = BotMeta(
-                    id=bot.id,
-                    title=bot.title,
-                    create_time=float(bot.create_time),
-                    last_used_time=float(bot.last_used_time),
-                    is_pinned=item["IsPinned"],
-                    owned=False,
-                    available=True,
-                    description=bot.description,
-                    is_public=True,
-                    sync_status=bot.sync_status,
-                    has_bedrock_knowledge_base=bot.has_bedrock_knowledge_base(),
-                )
-            except RecordNotFoundError:
+            original = originals.get(item["OriginalBotId"])
+            if original is None:
                 # Original bot is removed
-                is_original_available = False
                 logger.info(f"Original bot {item['OriginalBotId']} has been removed")
-                meta = BotMeta(
+                bots.append(
+                    BotMeta(
+                        id=item["OriginalBotId"],
+                        title=item["Title"],
+                        create_time=float(item["CreateTime"]),
+                        last_used_time=float(item["LastBotUsed"]),
+                        is_pinned=item["IsPinned"],
+                        owned=False,
+                        # NOTE: Original bot is removed
+                        available=False,
+                        description="This item is no longer available",
+                        is_public=False,
+                        sync_status="ORIGINAL_NOT_FOUND",
+                        has_bedrock_knowledge_base=False,
+                    )
+                )
+                continue
+
+            bots.append(
+                BotMeta(
                     id=item["OriginalBotId"],
-                    title=item["Title"],
-                    create_time=float(item["CreateTime"]),
-                    last_used_time=float(item["LastBotUsed"]),
+                    title=original["Title"],
+                    create_time=float(original["CreateTime"]),
+                    last_used_time=float(original["LastBotUsed"]),
                     is_pinned=item["IsPinned"],
                     owned=False,
-                    # NOTE: Original bot is removed
-                    available=False,
-                    description="This item is no longer available",
-                    is_public=False,
-                    sync_status="ORIGINAL_NOT_FOUND",
-                    has_bedrock_knowledge_base=False,
+                    available=True,
+                    description=original["Description"],
+                    is_public=True,
+                    sync_status=original["SyncStatus"],
+                    has_bedrock_knowledge_base="BedrockKnowledgeBase" in original,
                 )
+            )
 
-            if is_original_available and (
-                bot.title != item["Title"]
-                or bot.description != item["Description"]
-                or bot.sync_status != item["SyncStatus"]
-                or bot.has_knowledge() != item["HasKnowledge"]
-                or bot.conversation_quick_starters
-                != [
-                    ConversationQuickStarter(**starter)
-                    for starter in item.get("ConversationQuickStarters", [])
-                ]
+            has_knowledge = _has_knowledge(original)
+            has_agent = len(original.get("AgentData", {}).get("tools", [])) > 0
+            if (
+                original["Title"] != item["Title"]
+                or original["Description"] != item["Description"]
+                or original["SyncStatus"] != item["SyncStatus"]
+                or has_knowledge != item["HasKnowledge"]
+                or has_agent != item.get("HasAgent")
+                or original.get("ConversationQuickStarters", [])
+                != item.get("ConversationQuickStarters", [])
             ):
-                # Update alias to the latest original bot
-                store_alias(
+                # Update alias to the latest original bot later
+                _queue_alias_refresh(
                     user_id,
                     BotAliasModel(
                         id=decompose_bot_alias_id(item["SK"]),
-                        # Update title and description
-                        title=bot.title,
-                        description=bot.description,
+                        title=original["Title"],
+                        description=original["Description"],
                         original_bot_id=item["OriginalBotId"],
                         create_time=float(item["CreateTime"]),
                         last_used_time=float(item["LastBotUsed"]),
                         is_pinned=item["IsPinned"],
-                        sync_status=bot.sync_status,
-                        has_knowledge=bot.has_knowledge(),
-                        has_agent=bot.is_agent_enabled(),
-                        conversation_quick_starters=bot.conversation_quick_starters,
+                        sync_status=original["SyncStatus"],
+                        has_knowledge=has_knowledge,
+                        has_agent=has_agent,
+                        conversation_quick_starters=[
+                            ConversationQuickStarterModel(**starter)
+                            for starter in original.get("ConversationQuickStarters", [])
+                        ],
                     ),
                 )
-
-            bots.append(meta)
         else:
             # Private bots
             bots.append(
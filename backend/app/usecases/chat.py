@@ -1,6 +1,7 @@
 import logging
-from copy import deepcopy
-from typing import Literal
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Literal
 
 from app.agents.agent import AgentRunner
 from app.agents.tools.knowledge import create_knowledge_tool
@@ -10,17 +11,25 @@ from app.bedrock import (
     call_converse_api,
     compose_args_for_converse_api,
 )
+from app.history import (
+    apply_summary,
+    estimate_message_tokens,
+    window_messages_for_bot,
+)
 from app.prompt import build_rag_prompt
+from app.repositories.blob import find_blobs, get_content_body
 from app.repositories.conversation import (
     RecordNotFoundError,
     find_conversation_by_id,
     store_conversation,
+    update_conversation_summary,
 )
 from app.repositories.custom_bot import find_alias_by_id, store_alias
 from app.repositories.models.conversation import (
     ChunkModel,
     ContentModel,
     ConversationModel,
+    ConversationSummaryModel,
     MessageModel,
 )
 from app.repositories.models.custom_bot import (
@@ -38,9 +47,15 @@ from app.routes.schemas.conversation import (
     FeedbackOutput,
     MessageOutput,
     RelatedDocumentsOutput,
+    type_model_name,
 )
 from app.usecases.bot import fetch_bot, modify_bot_last_used_time
-from app.utils import get_current_time, is_running_on_lambda
+from app.utils import (
+    StageTimer,
+    get_current_time,
+    invoke_background_task,
+    is_running_on_lambda,
+)
 from app.vector_search import (
     SearchResult,
     filter_used_results,
@@ -52,17 +67,77 @@ from ulid import ULID
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
 
+# Estimated tokens of the unsummarized messages to start the compaction. `0` disables it.
+CONVERSATION_SUMMARY_THRESHOLD_TOKENS = int(
+    os.environ.get("CONVERSATION_SUMMARY_THRESHOLD_TOKENS", 0)
+)
+# Number of the most recent messages which are not summarized.
+CONVERSATION_SUMMARY_KEEP_MESSAGES = 6
+CONVERSATION_SUMMARY_MODEL: type_model_name = "claude-v3-haiku"
+
+# Runs independent steps of the chat pipeline concurrently.
+# NOTE: Lambda handles one request at a time per container, so a few workers are enough.
+_pipeline_executor = ThreadPoolExecutor(max_workers=4)
+
+
+def _fetch_bot_and_search(
+    user_id: str,
+    chat_input: ChatInput,
+    search_knowledge: bool,
+    timer: StageTimer,
+    on_fetching_knowledge: Callable[[], None] | None = None,
+) -> tuple[bool, BotModel, list[SearchResult]]:
+    """Fetch bot, then search related documents if the bot uses RAG without agent."""
+    assert chat_input.bot_id is not None
+    with timer.measure("fetch_bot"):
+        owned, bot = fetch_bot(user_id, chat_input.bot_id)
+
+    search_results: list[SearchResult] = []
+    if search_knowledge and bot.has_knowledge() and not bot.is_agent_enabled():
+        # NOTE: Currently embedding not support multi-modal. For now, use the last content.
+        query = chat_input.message.content[-1].body
+        if on_fetching_knowledge:
+            on_fetching_knowledge()
+        with timer.measure("search_knowledge"):
+            search_results = search_related_docs(bot=bot, query=query)
+        logger.info(f"Search results from vector store: {search_results}")
+    return owned, bot, search_results
+
 
 def prepare_conversation(
     user_id: str,
     chat_input: ChatInput,
-) -> tuple[str, ConversationModel, BotModel | None]:
+    search_knowledge: bool = False,
+    timer: StageTimer | None = None,
+    on_fetching_knowledge: Callable[[], None] | None = None,
+) -> tuple[str, ConversationModel, BotModel | None, list[SearchResult]]:
+    """Prepare the conversation with the user input appended.
+    Fetching the bot and searching related documents (if `search_knowledge` is set) run
+    concurrently with loading the conversation, since they do not depend on it.
+    `on_fetching_knowledge` is called from the worker thread right before the search starts.
+    """
     current_time = get_current_time()
+    timer = timer or StageTimer()
     bot = None
+    search_results: list[SearchResult] = []
+
+    bot_future = (
+        _pipeline_executor.submit(
+            _fetch_bot_and_search,
+            user_id,
+            chat_input,
+            search_knowledge,
+            timer,
+            on_fetching_knowledge,
+        )
+        if chat_input.bot_id
+        else None
+    )
 
     try:
         # Fetch existing conversation
-        conversation = find_conversation_by_id(user_id, chat_input.conversation_id)
+        with timer.measure("load_conversation"):
+            conversation = find_conversation_by_id(user_id, chat_input.conversation_id)
         logger.info(f"Found conversation: {conversation}")
         parent_id = chat_input.message.parent_message_id
         if chat_input.message.parent_message_id == "system" and chat_input.bot_id:
@@ -70,9 +145,9 @@ def prepare_conversation(
             parent_id = "instruction"
         elif chat_input.message.parent_message_id is None:
             parent_id = conversation.last_message_id
-        if chat_input.bot_id:
+        if bot_future:
             logger.info("Bot id is provided. Fetching bot.")
-            owned, bot = fetch_bot(user_id, chat_input.bot_id)
+            owned, bot, search_results = bot_future.result()
     except RecordNotFoundError:
         # The case for new conversation. Note that editing first user message is not considered as new conversation.
         logger.info(
@@ -101,11 +176,11 @@ def prepare_conversation(
             )
         }
         parent_id = "system"
-        if chat_input.bot_id:
+        if chat_input.bot_id and bot_future:
             logger.info("Bot id is provided. Fetching bot.")
             parent_id = "instruction"
             # Fetch bot and append instruction
-            owned, bot = fetch_bot(user_id, chat_input.bot_id)
+            owned, bot, search_results = bot_future.result()
             initial_message_map["instruction"] = MessageModel(
                 role="instruction",
                 content=[
@@ -203,7 +278,7 @@ def prepare_conversation(
         conversation.message_map[message_id] = new_message
         conversation.message_map[parent_id].children.append(message_id)  # type: ignore
 
-    return (message_id, conversation, bot)
+    return (message_id, conversation, bot, search_results)
 
 
 def trace_to_root(
@@ -230,23 +305,37 @@ def insert_knowledge(
     search_results: list[SearchResult],
     display_citation: bool = True,
 ) -> ConversationModel:
-    """Insert knowledge to the conversation."""
+    """Insert knowledge to the conversation.
+    Returned conversation overlays the instruction on the original message map and shares
+    all other messages with it, so it is only for composing the prompt and must not be stored.
+    """
     if len(search_results) == 0:
         return conversation
 
     inserted_prompt = build_rag_prompt(conversation, search_results, display_citation)
     logger.info(f"Inserted prompt: {inserted_prompt}")
 
-    conversation_with_context = deepcopy(conversation)
-    conversation_with_context.message_map["instruction"].content[
-        0
-    ].body = inserted_prompt
-
-    return conversation_with_context
+    # NOTE: Avoid copying whole conversation, since messages may contain large images and attachments.
+    instruction = conversation.message_map["instruction"]
+    instruction_with_context = instruction.model_copy(
+        update={
+            "content": [
+                instruction.content[0].model_copy(update={"body": inserted_prompt}),
+                *instruction.content[1:],
+            ]
+        }
+    )
+    # Shallow copy shares the other messages with the original conversation
+    message_map = dict(conversation.message_map, instruction=instruction_with_context)
+    return conversation.model_copy(update={"message_map": message_map})
 
 
 def chat(user_id: str, chat_input: ChatInput) -> ChatOutput:
-    user_msg_id, conversation, bot = prepare_conversation(user_id, chat_input)
+    timer = StageTimer()
+    # NOTE: `is_running_on_lambda`is a workaround for local testing due to no postgres mock.
+    user_msg_id, conversation, bot, search_results = prepare_conversation(
+        user_id, chat_input, search_knowledge=is_running_on_lambda(), timer=timer
+    )
     used_chunks = None
     price = 0.0
     thinking_log = None
@@ -273,8 +362,13 @@ def chat(user_id: str, chat_input: ChatInput) -> ChatOutput:
             node_id=conversation.message_map[user_msg_id].parent,
             message_map=message_map,
         )
-        messages.append(chat_input.message)  # type: ignore
-        result = runner.run(messages)
+        messages.append(MessageModel.from_message_input(chat_input.message))
+        messages, saved_tokens = window_messages_for_bot(
+            messages, bot, chat_input.message.model, instruction=bot.instruction
+        )
+        with timer.measure("run_agent"):
+            result = runner.run(messages)
+        logger.info(f"Input tokens saved by history windowing: {saved_tokens}")
         reply_txt = result.last_response["output"]["message"]["content"][0].get(
             "text", ""
         )
@@ -285,16 +379,7 @@ def chat(user_id: str, chat_input: ChatInput) -> ChatOutput:
         conversation.should_continue = False
     else:
         message_map = conversation.message_map
-        search_results = []
-        if bot and is_running_on_lambda():
-            # NOTE: `is_running_on_lambda`is a workaround for local testing due to no postgres mock.
-            # Fetch most related documents from vector store
-            # NOTE: Currently embedding not support multi-modal. For now, use the last content.
-            query: str = conversation.message_map[user_msg_id].content[-1].body  # type: ignore[assignment]
-
-            search_results = search_related_docs(bot=bot, query=query)
-            logger.info(f"Search results from vector store: {search_results}")
-
+        if bot and search_results:
             # Insert contexts to instruction
             conversation_with_context = insert_knowledge(
                 conversation,
@@ -311,19 +396,26 @@ def chat(user_id: str, chat_input: ChatInput) -> ChatOutput:
         if not chat_input.continue_generate:
             messages.append(MessageModel.from_message_input(chat_input.message))
 
+        instruction: str | None = (
+            message_map["instruction"].content[0].body
+            if "instruction" in message_map
+            else None  # type: ignore[union-attr]
+        )
+        messages, instruction = apply_summary(messages, conversation, instruction)
+        messages, saved_tokens = window_messages_for_bot(
+            messages, bot, chat_input.message.model, instruction=instruction
+        )
+
         # Create payload to invoke Bedrock
         args = compose_args_for_converse_api(
             messages=messages,
             model=chat_input.message.model,
-            instruction=(
-                message_map["instruction"].content[0].body
-                if "instruction" in message_map
-                else None  # type: ignore[union-attr]
-            ),
+            instruction=instruction,
             generation_params=(bot.generation_params if bot else None),
         )
 
-        converse_response = call_converse_api(args)
+        with timer.measure("call_bedrock"):
+            converse_response = call_converse_api(args)
         reply_txt = converse_response["output"]["message"]["content"][0].get("text", "")
         reply_txt = reply_txt.rstrip()
 
@@ -344,6 +436,9 @@ def chat(user_id: str, chat_input: ChatInput) -> ChatOutput:
 
         input_tokens = converse_response["usage"]["inputTokens"]
         output_tokens = converse_response["usage"]["outputTokens"]
+        logger.info(
+            f"Input tokens: {input_tokens} (saved by history windowing: {saved_tokens})"
+        )
 
         price = calculate_price(chat_input.message.model, input_tokens, output_tokens)
         # Published API does not support continued generation
@@ -382,12 +477,16 @@ def chat(user_id: str, chat_input: ChatInput) -> ChatOutput:
     conversation.total_price += price
 
     # Store updated conversation
-    store_conversation(user_id, conversation)
+    with timer.measure("store_conversation"):
+        store_conversation(user_id, conversation)
+    # Summarize older turns out of the response path, only when over the threshold
+    request_conversation_compaction(user_id, conversation)
     # Update bot last used time
     if chat_input.bot_id:
         logger.info("Bot id is provided. Updating bot last used time.")
         # Update bot last used time
         modify_bot_last_used_time(user_id, chat_input.bot_id)
+    timer.log("Chat")
 
     output = ChatOutput(
         conversation_id=conversation.id,
@@ -497,8 +596,176 @@ def propose_conversation_title(
     return reply_txt
 
 
+def _format_turns_for_summary(messages: list[MessageModel]) -> str:
+    lines = []
+    for message in messages:
+        role = "User" if message.role == "user" else "Assistant"
+        body = "\n".join(
+            (
+                c.body
+                if c.content_type == "text"
+                else (
+                    "[Image]"
+                    if c.content_type == "image"
+                    else f"[Attached file: {c.file_name}]"
+                )
+            )
+            for c in message.content
+        )
+        lines.append(f"{role}: {body}")
+    return "\n\n".join(lines)
+
+
+def _find_aged_out_messages(
+    conversation: ConversationModel,
+) -> tuple[ConversationSummaryModel | None, list[str]]:
+    """Find the turns to be summarized, without any I/O.
+    Returns the summary to be updated (`None` to start a new one) and the ids of the aged out
+    messages, which is empty if the unsummarized turns are within the threshold.
+    """
+    message_map = conversation.message_map
+
+    # Message ids from the root to the leaf
+    path_ids = []
+    node_id: str | None = conversation.last_message_id
+    while node_id and node_id in message_map:
+        if message_map[node_id].role not in ("system", "instruction"):
+            path_ids.append(node_id)
+        node_id = message_map[node_id].parent
+    path_ids.reverse()
+
+    summary = conversation.summary
+    if summary is not None and summary.last_message_id in path_ids:
+        unsummarized_ids = path_ids[path_ids.index(summary.last_message_id) + 1 :]
+    else:
+        # Not summarized yet, or the summary is for another branch
+        summary = None
+        unsummarized_ids = path_ids
+
+    tokens = sum(
+        estimate_message_tokens(message_map[i], message_map[i].model)
+        for i in unsummarized_ids
+    )
+    if tokens <= CONVERSATION_SUMMARY_THRESHOLD_TOKENS:
+        return summary, []
+
+    # Aged out turns end with an assistant message, so that the rest starts with a user message
+    end = max(len(unsummarized_ids) - CONVERSATION_SUMMARY_KEEP_MESSAGES, 0)
+    while end > 0 and message_map[unsummarized_ids[end - 1]].role != "assistant":
+        end -= 1
+    return summary, unsummarized_ids[:end]
+
+
+def request_conversation_compaction(
+    user_id: str, conversation: ConversationModel
+) -> bool:
+    """Start `compact_conversation` in the background if the stored conversation is over the threshold.
+    The threshold is checked on the given conversation, so nothing is loaded unless it is exceeded.
+    Runs in the process if the background task function is not configured (e.g. local development).
+    Returns whether the compaction is requested.
+    """
+    if CONVERSATION_SUMMARY_THRESHOLD_TOKENS <= 0:
+        return False
+    _, aged_out_ids = _find_aged_out_messages(conversation)
+    if not aged_out_ids:
+        return False
+
+    try:
+        invoked = invoke_background_task(
+            "compact_conversation",
+            {"user_id": user_id, "conversation_id": conversation.id},
+        )
+    except Exception as e:
+        logger.error(f"Failed to request compaction of {conversation.id}: {e}")
+        return False
+    if not invoked:
+        compact_conversation(user_id, conversation)
+    return True
+
+
+def compact_conversation(
+    user_id: str, conversation: ConversationModel
+) -> ConversationSummaryModel | None:
+    """Summarize the older turns of the conversation into the rolling summary.
+    Only the turns aged out since the last compaction are summarized and merged into it.
+    Call with the stored conversation after the reply is generated, usually through
+    `request_conversation_compaction`. Failures are logged and ignored, since the summary is optional.
+    """
+    if CONVERSATION_SUMMARY_THRESHOLD_TOKENS <= 0:
+        return None
+
+    conversation_id = conversation.id
+    try:
+        summary, aged_out_ids = _find_aged_out_messages(conversation)
+        if not aged_out_ids:
+            return None
+        message_map = conversation.message_map
+
+        prompt = f"""Update the summary of the conversation with the new turns below.
+<summary>
+{summary.body if summary else ""}
+</summary>
+<new-turns>
+{_format_turns_for_summary([message_map[i] for i in aged_out_ids])}
+</new-turns>
+<rules>
+- Keep facts, decisions, user preferences and open questions needed to continue the conversation.
+- Be concise. Omit greetings and small talk.
+- Write in the same language as the conversation.
+- Return the summary only. DO NOT include any strings other than the summary.
+</rules>
+"""
+        args = compose_args_for_converse_api(
+            messages=[
+                MessageModel(
+                    role="user",
+                    content=[
+                        ContentModel(
+                            content_type="text",
+                            body=prompt,
+                            media_type=None,
+                            file_name=None,
+                        )
+                    ],
+                    model=CONVERSATION_SUMMARY_MODEL,
+                    children=[],
+                    parent=None,
+                    create_time=get_current_time(),
+                    feedback=None,
+                    used_chunks=None,
+                    thinking_log=None,
+                )
+            ],
+            model=CONVERSATION_SUMMARY_MODEL,
+        )
+        response = call_converse_api(args)
+        new_summary = ConversationSummaryModel(
+            body=response["output"]["message"]["content"][0]["text"].strip(),
+            last_message_id=aged_out_ids[-1],
+        )
+        update_conversation_summary(user_id, conversation_id, new_summary)
+        logger.info(
+            f"Summarized {len(aged_out_ids)} messages of conversation {conversation_id} "
+            f"(input tokens: {response['usage']['inputTokens']}, "
+            f"output tokens: {response['usage']['outputTokens']})"
+        )
+        return new_summary
+    except Exception as e:
+        logger.error(f"Failed to compact conversation {conversation_id}: {e}")
+        return None
+
+
 def fetch_conversation(user_id: str, conversation_id: str) -> Conversation:
     conversation = find_conversation_by_id(user_id, conversation_id)
+    # NOTE: Fetch image and attachment bodies concurrently instead of one by one.
+    blobs = find_blobs(
+        [
+            c.blob_key
+            for message in conversation.message_map.values()
+            for c in message.content
+            if c.blob_key
+        ]
+    )
 
     message_map = {
         message_id: MessageOutput(
@@ -506,7 +773,7 @@ def fetch_conversation(user_id: str, conversation_id: str) -> Conversation:
             content=[
                 Content(
                     content_type=c.content_type,
-                    body=c.body,
+                    body=get_content_body(c, blobs),
                     media_type=c.media_type,
                     file_name=c.file_name,
                 )
@@ -2,8 +2,11 @@ import json
 import logging
 import os
 import re
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Any, List, Literal
+from typing import Any, Callable, List, Literal
 
 import boto3
 import pg8000
@@ -19,6 +22,16 @@ PUBLISH_API_CODEBUILD_PROJECT_NAME = os.environ.get(
     "PUBLISH_API_CODEBUILD_PROJECT_NAME", ""
 )
 DB_SECRETS_ARN = os.environ.get("DB_SECRETS_ARN", "")
+# Lambda function which runs `app.background_task.handler`. Empty on local development.
+BACKGROUND_TASK_FUNCTION_NAME = os.environ.get("BACKGROUND_TASK_FUNCTION_NAME", "")
+DB_SECRETS_CACHE_TTL = 300  # seconds
+# Max number of idle PostgreSQL connections kept open on a warm container.
+# Keep this small so that Aurora connection counts stay bounded.
+PG_POOL_MAX_IDLE = int(os.environ.get("PG_POOL_MAX_IDLE", 2))
+# Connections idle longer than this are health checked before reuse.
+PG_POOL_HEALTH_CHECK_INTERVAL = 30  # seconds
+# Connections idle longer than this are closed instead of reused.
+PG_POOL_MAX_IDLE_TIME = 600  # seconds
 
 
 def snake_to_camel(snake_str):
@@ -40,6 +53,32 @@ def is_running_on_lambda():
     return "AWS_EXECUTION_ENV" in os.environ
 
 
+class StageTimer:
+    """Measure elapsed time of each stage of a request.
+    Thread-safe, so that stages running concurrently can be measured to see the overlap.
+    """
+
+    def __init__(self):
+        self.timings: dict[str, float] = {}
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def measure(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            with self._lock:
+                self.timings[stage] = elapsed
+
+    def log(self, name: str):
+        elapsed = (time.perf_counter() - self._start) * 1000
+        stages = ", ".join(f"{k}: {v:.0f}ms" for k, v in self.timings.items())
+        logger.info(f"{name} stage timings: {stages} (elapsed: {elapsed:.0f}ms)")
+
+
 def get_bedrock_client(region=BEDROCK_REGION):
     client = boto3.client("bedrock-runtime", region)
     return client
@@ -50,6 +89,22 @@ def get_bedrock_agent_client(region=REGION):
     return client
 
 
+def invoke_background_task(task: str, params: dict) -> bool:
+    """Invoke the background task function asynchronously, without waiting for the result.
+    Returns `False` if the function is not configured, so that the caller can run the task by itself.
+    """
+    if not BACKGROUND_TASK_FUNCTION_NAME:
+        return False
+    logger.info(f"Invoking background task: {task}")
+    client = boto3.client("lambda", REGION)
+    client.invoke(
+        FunctionName=BACKGROUND_TASK_FUNCTION_NAME,
+        InvocationType="Event",
+        Payload=json.dumps({"task": task, "params": params}).encode("utf-8"),
+    )
+    return True
+
+
 def get_current_time():
     # Get current time as milliseconds epoch time
     return int(datetime.now().timestamp() * 1000)
@@ -174,6 +229,111 @@ def start_codebuild_project(environment_variables: dict) -> str:
     return response["build"]["id"]
 
 
+class _PooledConnection:
+    def __init__(self, conn: pg8000.Connection):
+        self.conn = conn
+        self.last_used = time.monotonic()
+        # Prepared statements are bound to the connection
+        self.statements: dict[str, pg8000.legacy.PreparedStatement] = {}
+
+    def prepare(self, query: str) -> pg8000.legacy.PreparedStatement:
+        if query not in self.statements:
+            self.statements[query] = self.conn.prepare(query)
+        return self.statements[query]
+
+    def is_healthy(self) -> bool:
+        idle_time = time.monotonic() - self.last_used
+        if idle_time > PG_POOL_MAX_IDLE_TIME:
+            return False
+        if idle_time < PG_POOL_HEALTH_CHECK_INTERVAL:
+            return True
+        try:
+            with self.conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+                cursor.fetchall()
+            return True
+        except Exception as e:
+            logger.info(f"Discarding stale connection: {e}")
+            return False
+
+    def close(self):
+        try:
+            self.conn.close()
+        except Exception:
+            # The socket may already be closed by the server
+            pass
+
+
+class PostgresConnectionPool:
+    """Connection pool which survives across warm Lambda invocations.
+    Idle connections are health checked before reuse and at most `max_idle`
+    connections are kept open.
+    """
+
+    def __init__(self, max_idle: int = PG_POOL_MAX_IDLE):
+        self.max_idle = max_idle
+        self._idle: list[_PooledConnection] = []
+        self._lock = threading.Lock()
+
+    def _connect(self) -> _PooledConnection:
+        secrets: Any = parameters.get_secret(  # type: ignore
+            DB_SECRETS_ARN, max_age=DB_SECRETS_CACHE_TTL
+        )
+        db_info = json.loads(secrets)
+
+        conn = pg8000.connect(
+            database=db_info["dbname"],
+            host=db_info["host"],
+            port=db_info["port"],
+            user=db_info["username"],
+            password=db_info["password"],
+        )
+        # Pooled connections must not be left idle in transaction
+        conn.autocommit = True
+        return _PooledConnection(conn)
+
+    def acquire(self) -> _PooledConnection:
+        while True:
+            with self._lock:
+                pooled = self._idle.pop() if self._idle else None
+            if pooled is None:
+                return self._connect()
+            if pooled.is_healthy():
+                return pooled
+            pooled.close()
+
+    def release(self, pooled: _PooledConnection):
+        pooled.last_used = time.monotonic()
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(pooled)
+                return
+        pooled.close()
+
+    def run(self, func: Callable[[_PooledConnection], Any]) -> Any:
+        """Run `func` with a pooled connection.
+        If the connection turns out to be broken, retry once with a new connection.
+        """
+        for attempt in range(2):
+            pooled = self.acquire()
+            try:
+                result = func(pooled)
+            except pg8000.exceptions.InterfaceError as e:
+                pooled.close()
+                if attempt > 0:
+                    raise e
+                logger.warning(f"Connection lost, reconnecting: {e}")
+                continue
+            except Exception as e:
+                pooled.close()
+                raise e
+            self.release(pooled)
+            return result
+
+
+pg_connection_pool = PostgresConnectionPool()
+
+
 def query_postgres(
     query: str,
     params: tuple | None = None,
@@ -190,31 +350,44 @@ def query_postgres(
         example: ((1, 'Alice'), (2, 'Bob')) if include_columns is False
                  (('id', 'name'), (1, 'Alice'), (2, 'Bob')) if include_columns is True
     """
-    secrets: Any = parameters.get_secret(DB_SECRETS_ARN)  # type: ignore
-    db_info = json.loads(secrets)
-
-    conn = pg8000.connect(
-        database=db_info["dbname"],
-        host=db_info["host"],
-        port=db_info["port"],
-        user=db_info["username"],
-        password=db_info["password"],
-    )
-
     args = params if params else ()
-    try:
-        with conn.cursor() as cursor:
+
+    def _execute(pooled: _PooledConnection):
+        with pooled.conn.cursor() as cursor:
             cursor.execute(query, args=args)
             res = cursor.fetchall()
             columns = tuple([desc[0] for desc in cursor.description])
+        return columns, res
+
+    try:
+        columns, res = pg_connection_pool.run(_execute)
     except Exception as e:
         logger.error(f"Error executing query: {e}")
         raise e
-    finally:
-        conn.close()
 
     logger.debug(f"{len(res)} records found.")
 
     if include_columns:
         return columns, res
     return res
+
+
+def query_postgres_prepared(query: str, params: dict[str, Any]) -> tuple:
+    """Query the PostgreSQL using a prepared statement and return the results.
+    The statement is prepared once per pooled connection, so use this for fixed queries.
+    Args:
+        query (str): The SQL query to execute. Parameters are in `:name` style.
+        params (dict): The parameters for the query.
+    """
+
+    def _execute(pooled: _PooledConnection):
+        return pooled.prepare(query).run(**params)
+
+    try:
+        res = pg_connection_pool.run(_execute)
+    except Exception as e:
+        logger.error(f"Error executing prepared query: {e}")
+        raise e
+
+    logger.debug(f"{len(res)} records found.")
+    return res
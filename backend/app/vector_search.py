@@ -1,18 +1,39 @@
+import hashlib
 import json
 import logging
+import os
 import re
 from typing import Any, Literal
 
 from app.bedrock import calculate_query_embedding
+from app.cache import LRUCache, SharedCacheTable
+from app.embedding_cache import normalize_query
 from app.repositories.custom_bot import find_public_bot_by_id
 from app.repositories.models.custom_bot import BotModel
-from app.utils import generate_presigned_url, get_bedrock_agent_client, query_postgres
+from app.utils import (
+    generate_presigned_url,
+    get_bedrock_agent_client,
+    query_postgres_prepared,
+)
 from botocore.exceptions import ClientError
 from pydantic import BaseModel
 
 logger = logging.getLogger(__name__)
 agent_client = get_bedrock_agent_client()
 
+# Max number of search results kept in memory on a warm container.
+RETRIEVAL_CACHE_SIZE = int(os.environ.get("RETRIEVAL_CACHE_SIZE", 256))
+RETRIEVAL_CACHE_TTL = int(os.environ.get("RETRIEVAL_CACHE_TTL", 600))  # seconds
+
+# NOTE: This query is executed as a prepared statement, so keep it fixed.
+PGVECTOR_SEARCH_QUERY = """
+SELECT id, botid, content, source, embedding
+FROM items
+WHERE botid = :bot_id
+ORDER BY embedding <-> :embedding
+LIMIT :limit
+"""
+
 
 class SearchResult(BaseModel):
     bot_id: str
@@ -78,15 +99,14 @@ def _pgvector_search(bot_id: str, limit: int, query: str) -> list[SearchResult]:
     query_embedding = calculate_query_embedding(query)
     logger.info(f"query_embedding: {query_embedding}")
 
-    search_query = """
-SELECT id, botid, content, source, embedding 
-FROM items 
-WHERE botid = %s 
-ORDER BY embedding <-> %s 
-LIMIT %s
-"""
-
-    results = query_postgres(search_query, (bot_id, json.dumps(query_embedding), limit))
+    results = query_postgres_prepared(
+        PGVECTOR_SEARCH_QUERY,
+        {
+            "bot_id": bot_id,
+            "embedding": json.dumps(query_embedding),
+            "limit": limit,
+        },
+    )
     # NOTE: results should be:
     # [
     #     ('123', 'bot_1', 'content_1', 'source_1', [0.123, 0.456, 0.789]),
@@ -143,9 +163,95 @@ def _bedrock_knowledge_base_search(bot: BotModel, query: str) -> list[SearchResu
         raise e
 
 
-def search_related_docs(bot: BotModel, query: str) -> list[SearchResult]:
+def get_knowledge_version(bot: BotModel) -> str:
+    """Version of the bot knowledge.
+    `Version` of the bot is incremented on every sync status update of both embedding and
+    knowledge base sync, so a completed sync always results in a new version.
+    NOTE: Last execution id is not available for knowledge base sync.
+    """
+    return f"{bot.sync_status}#{bot.version}"
+
+
+class RetrievalCache:
+    """Cache of search results keyed by bot id, knowledge version, query and search params.
+    The first tier is an in-process LRU, and the second is the optional shared DynamoDB table
+    so that the related documents API and the following chat can share one search.
+    """
+
+    def __init__(
+        self,
+        max_size: int = RETRIEVAL_CACHE_SIZE,
+        ttl: int = RETRIEVAL_CACHE_TTL,
+        shared: SharedCacheTable | None = None,
+    ):
+        self.ttl = ttl
+        self.memory: LRUCache[list[SearchResult]] = LRUCache(max_size, ttl=ttl)
+        self.shared = shared if shared is not None else SharedCacheTable()
+
+    @staticmethod
+    def compose_key(bot: BotModel, query: str) -> str:
+        if bot.bedrock_knowledge_base is not None:
+            search_params = bot.bedrock_knowledge_base.search_params.model_dump_json()
+        else:
+            search_params = bot.search_params.model_dump_json()
+        digest = hashlib.sha256(
+            "\n".join(
+                [
+                    bot.id,
+                    get_knowledge_version(bot),
+                    search_params,
+                    normalize_query(query),
+                ]
+            ).encode("utf-8")
+        )
+        return f"RETRIEVAL#{digest.hexdigest()}"
+
+    def get(self, bot: BotModel, query: str) -> list[SearchResult] | None:
+        key = self.compose_key(bot, query)
+        results = self.memory.get(key)
+        if results is None:
+            item = self.shared.get(key)
+            if item is not None:
+                results = [SearchResult(**r) for r in json.loads(item["Results"])]
+                self.memory.set(key, results)
+        return list(results) if results is not None else None
+
+    def put(self, bot: BotModel, query: str, results: list[SearchResult]):
+        key = self.compose_key(bot, query)
+        self.memory.set(key, list(results))
+        self.shared.put(
+            key,
+            {
+                "BotId": bot.id,
+                "Results": json.dumps([r.model_dump() for r in results]),
+            },
+            ttl=self.ttl,
+        )
+
+
+retrieval_cache = RetrievalCache()
+
+
+def _search_related_docs(bot: BotModel, query: str) -> list[SearchResult]:
     if bot.has_bedrock_knowledge_base():
         logger.info("Searching related documents using Bedrock Knowledge Base.")
         return _bedrock_knowledge_base_search(bot, query)
     logger.info("Searching related documents using pgvector.")
     return _pgvector_search(bot.id, bot.search_params.max_results, query)
+
+
+def search_related_docs(bot: BotModel, query: str) -> list[SearchResult]:
+    # Knowledge is being updated, so do not cache the results
+    cacheable = bot.sync_status == "SUCCEEDED"
+    if cacheable:
+        cached = retrieval_cache.get(bot, query)
+        if cached is not None:
+            logger.info(
+                f"Retrieval cache hit (hits: {retrieval_cache.memory.hits}, misses: {retrieval_cache.memory.misses})"
+            )
+            return cached
+
+    results = _search_related_docs(bot, query)
+    if cacheable:
+        retrieval_cache.put(bot, query, results)
+    return results
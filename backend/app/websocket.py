@@ -12,6 +12,8 @@ from app.agents.tools.knowledge import create_knowledge_tool
 from app.agents.utils import get_tool_by_name
 from app.auth import verify_token
 from app.bedrock import ConverseApiToolResult, compose_args_for_converse_api
+from app.history import apply_summary, window_messages_for_bot
+from app.repositories.common import get_sts_call_count, reset_sts_call_count
 from app.repositories.conversation import RecordNotFoundError, store_conversation
 from app.repositories.models.conversation import (
     AgentToolUseContentModel,
@@ -23,11 +25,17 @@ from app.repositories.models.conversation import (
 from app.repositories.models.custom_bot import BotModel
 from app.routes.schemas.conversation import ChatInput
 from app.stream import ConverseApiStreamHandler, OnStopInput
+from app.stream_emitter import BackgroundSender, CoalescingEmitter
 from app.usecases.bot import modify_bot_last_used_time
-from app.usecases.chat import insert_knowledge, prepare_conversation, trace_to_root
-from app.utils import get_current_time
-from app.vector_search import filter_used_results, get_source_link, search_related_docs
-from boto3.dynamodb.conditions import Attr, Key
+from app.usecases.chat import (
+    insert_knowledge,
+    prepare_conversation,
+    request_conversation_compaction,
+    trace_to_root,
+)
+from app.utils import StageTimer, get_current_time
+from app.vector_search import filter_used_results, get_source_link
+from boto3.dynamodb.conditions import Key
 from ulid import ULID
 
 WEBSOCKET_SESSION_TABLE_NAME = os.environ["WEBSOCKET_SESSION_TABLE_NAME"]
@@ -106,12 +114,15 @@ def on_stop(
     conversation.total_price += arg.price
 
     conversation.should_continue = arg.stop_reason == "max_tokens"
-    # Store conversation before finish streaming so that front-end can avoid 404 issue
+    # Store conversation before finish streaming, because front-end fetches it right after.
+    # NOTE: `find_conversation_by_id` reads with strong consistency, so the write is visible.
     store_conversation(user_id, conversation)
     last_data_to_send = json.dumps(
         dict(status="STREAMING_END", completion="", stop_reason=arg.stop_reason)
     ).encode("utf-8")
     gatewayapi.post_to_connection(ConnectionId=connection_id, Data=last_data_to_send)
+    # Summarize older turns after the reply is sent, only when over the threshold
+    request_conversation_compaction(user_id, conversation)
 
 
 def on_agent_thinking(
@@ -189,6 +200,8 @@ def on_agent_stop(
         dict(status="STREAMING_END", completion="", stop_reason=arg.stop_reason)
     ).encode("utf-8")
     gatewayapi.post_to_connection(ConnectionId=connection_id, Data=last_data_to_send)
+    # Summarize older turns after the reply is sent, only when over the threshold
+    request_conversation_compaction(user_id, conversation)
 
 
 def process_chat_input(
@@ -197,8 +210,26 @@ def process_chat_input(
     """Process chat input and send the message to the client."""
     logger.info(f"Received chat input: {chat_input}")
 
+    def on_fetching_knowledge() -> None:
+        gatewayapi.post_to_connection(
+            ConnectionId=connection_id,
+            Data=json.dumps(
+                dict(
+                    status="FETCHING_KNOWLEDGE",
+                )
+            ).encode("utf-8"),
+        )
+
+    timer = StageTimer()
     try:
-        user_msg_id, conversation, bot = prepare_conversation(user_id, chat_input)
+        user_msg_id, conversation, bot, search_results = prepare_conversation(
+            user_id,
+            chat_input,
+            search_knowledge=True,
+            timer=timer,
+            on_fetching_knowledge=on_fetching_knowledge,
+        )
+        timer.log("Prepare conversation")
     except RecordNotFoundError:
         if chat_input.bot_id:
             gatewayapi.post_to_connection(
@@ -223,15 +254,20 @@ def process_chat_input(
             knowledge_tool = create_knowledge_tool(bot, chat_input.message.model)
             tools.append(knowledge_tool)
 
-        runner = AgentRunner(
-            bot=bot,
-            tools=tools,
-            model=chat_input.message.model,
-            on_thinking=lambda log: on_agent_thinking(log, gatewayapi, connection_id),
-            on_tool_result=lambda result: on_agent_tool_result(
-                result, gatewayapi, connection_id
-            ),
-            on_stop=lambda arg: on_agent_stop(
+        # Coalesce tokens to reduce `post_to_connection` calls
+        agent_emitter = CoalescingEmitter(
+            send=lambda text: on_stream(text, gatewayapi, connection_id)
+        )
+
+        def on_agent_stream_thinking(log: list[AgentMessageModel]) -> None:
+            # Send text streamed before using tools prior to `AGENT_THINKING`
+            agent_emitter.flush()
+            on_agent_thinking(log, gatewayapi, connection_id)
+
+        def on_agent_stream_stop(arg: AgentOnStopInput) -> None:
+            # Send the rest of the answer before `STREAMING_END`
+            agent_emitter.flush()
+            on_agent_stop(
                 arg,
                 gatewayapi,
                 connection_id,
@@ -239,36 +275,36 @@ def process_chat_input(
                 conversation,
                 chat_input,
                 user_msg_id,
+            )
+
+        runner = AgentRunner(
+            bot=bot,
+            tools=tools,
+            model=chat_input.message.model,
+            on_thinking=on_agent_stream_thinking,
+            on_tool_result=lambda result: on_agent_tool_result(
+                result, gatewayapi, connection_id
             ),
+            on_stop=on_agent_stream_stop,
+            on_stream=agent_emitter.emit,
         )
         message_map = conversation.message_map
         messages = trace_to_root(
             node_id=conversation.message_map[user_msg_id].parent,
             message_map=message_map,
         )
-        messages.append(chat_input.message)  # type: ignore
+        messages.append(MessageModel.from_message_input(chat_input.message))
+        messages, saved_tokens = window_messages_for_bot(
+            messages, bot, chat_input.message.model, instruction=bot.instruction
+        )
         _ = runner.run(messages)
+        logger.info(f"Input tokens saved by history windowing: {saved_tokens}")
 
         return {"statusCode": 200, "body": "Message sent."}
 
     message_map = conversation.message_map
-    search_results = []
     if bot and bot.has_knowledge():
-        gatewayapi.post_to_connection(
-            ConnectionId=connection_id,
-            Data=json.dumps(
-                dict(
-                    status="FETCHING_KNOWLEDGE",
-                )
-            ).encode("utf-8"),
-        )
-
-        # Fetch most related documents from vector store
-        # NOTE: Currently embedding not support multi-modal. For now, use the last text content.
-        query: str = conversation.message_map[user_msg_id].content[-1].body  # type: ignore[assignment]
-        search_results = search_related_docs(bot=bot, query=query)
-        logger.info(f"Search results from vector store: {search_results}")
-
+        # NOTE: Related documents have been searched along with loading the conversation.
         # Insert contexts to instruction
         conversation_with_context = insert_knowledge(
             conversation, search_results, display_citation=bot.display_retrieved_chunks
@@ -280,24 +316,38 @@ def process_chat_input(
         message_map=message_map,
     )
     if not chat_input.continue_generate:
-        messages.append(chat_input.message)  # type: ignore
+        messages.append(MessageModel.from_message_input(chat_input.message))
+
+    instruction: str | None = (
+        message_map["instruction"].content[0].body  # type: ignore[union-attr]
+        if "instruction" in message_map
+        else None
+    )
+    messages, instruction = apply_summary(messages, conversation, instruction)
+    messages, saved_tokens = window_messages_for_bot(
+        messages, bot, chat_input.message.model, instruction=instruction
+    )
 
     args = compose_args_for_converse_api(
         messages,
         chat_input.message.model,
-        instruction=(
-            message_map["instruction"].content[0].body  # type: ignore[union-attr]
-            if "instruction" in message_map
-            else None
-        ),
+        instruction=instruction,
         stream=True,
         generation_params=(bot.generation_params if bot else None),
     )
 
-    stream_handler = ConverseApiStreamHandler(
-        model=chat_input.message.model,
-        on_stream=lambda token: on_stream(token, gatewayapi, connection_id),
-        on_stop=lambda arg: on_stop(
+    # Coalesce tokens to reduce `post_to_connection` calls
+    emitter = CoalescingEmitter(
+        send=lambda text: on_stream(text, gatewayapi, connection_id)
+    )
+
+    def on_stream_stop(arg: OnStopInput) -> None:
+        # Send the rest of the completion before `STREAMING_END`
+        emitter.flush()
+        logger.info(
+            f"Input tokens: {arg.input_token_count} (saved by history windowing: {saved_tokens})"
+        )
+        on_stop(
             arg,
             gatewayapi,
             connection_id,
@@ -307,7 +357,12 @@ def process_chat_input(
             user_msg_id,
             bot,
             search_results,
-        ),
+        )
+
+    stream_handler = ConverseApiStreamHandler(
+        model=chat_input.message.model,
+        on_stream=emitter.emit,
+        on_stop=on_stream_stop,
     )
     try:
         for _ in stream_handler.run(args):
@@ -319,17 +374,22 @@ def process_chat_input(
             "statusCode": 500,
             "body": f"Failed to run stream handler: {e}",
         }
+    logger.info(
+        f"Streamed {emitter.token_count} tokens in {emitter.frame_count} frames"
+    )
 
     # Update bot last used time
     if chat_input.bot_id:
         logger.info("Bot id is provided. Updating bot last used time.")
         modify_bot_last_used_time(user_id, chat_input.bot_id)
 
+    logger.info(f"STS assume role calls: {get_sts_call_count()}")
     return {"statusCode": 200, "body": "Message sent."}
 
 
 def handler(event, context):
     logger.info(f"Received event: {event}")
+    reset_sts_call_count()
     route_key = event["requestContext"]["routeKey"]
 
     if route_key == "$connect":
@@ -351,8 +411,10 @@ def handler(event, context):
     try:
         # API Gateway (websocket) has hard limit of 32KB per message, so if the message is larger than that,
         # need to concatenate chunks and send as a single full message.
-        # To do that, we store the chunks in DynamoDB and when the message is complete, send it to SNS.
-        # The life cycle of the message is as follows:
+        # If the message fits in a single frame, client sends `SINGLE` message including the token and the payload,
+        # and this handler processes it immediately without storing it in DynamoDB.
+        # Otherwise, we store the chunks in DynamoDB and when the message is complete, send it to Bedrock.
+        # The life cycle of the chunked message is as follows:
         # 1. Client sends `START` message to the WebSocket API.
         # 2. This handler receives the `Session started` message.
         # 3. Client sends message parts to the WebSocket API.
@@ -380,51 +442,72 @@ def handler(event, context):
                 }
             )
             return {"statusCode": 200, "body": "Session started."}
-        elif step == "END":
-            # Retrieve user id
-            response = table.query(
-                KeyConditionExpression=Key("ConnectionId").eq(connection_id),
-                FilterExpression=Attr("UserId").exists(),
-            )
-            user_id = response["Items"][0]["UserId"]
-
-            # Concatenate the message parts
-            message_parts = []
-            last_evaluated_key = None
-
-            while True:
-                if last_evaluated_key:
-                    response = table.query(
-                        KeyConditionExpression=Key("ConnectionId").eq(connection_id)
-                        # Zero is reserved for user id, so start from 1
-                        & Key("MessagePartId").gte(1),
-                        ExclusiveStartKey=last_evaluated_key,
-                    )
-                else:
-                    response = table.query(
-                        KeyConditionExpression=Key("ConnectionId").eq(connection_id)
-                        & Key("MessagePartId").gte(1),
-                    )
+        elif step == "SINGLE" or step == "END":
+            if step == "SINGLE":
+                token = body["token"]
+                try:
+                    # Verify JWT token
+                    decoded = verify_token(token)
+                except Exception as e:
+                    logger.error(f"Invalid token: {e}")
+                    return {"statusCode": 403, "body": "Invalid token."}
+                user_id = decoded["sub"]
+
+                chat_input = ChatInput(**body["payload"])
+            else:
+                # Retrieve user id stored on `START`
+                response = table.get_item(
+                    Key={"ConnectionId": connection_id, "MessagePartId": decimal(0)},
+                    ConsistentRead=True,
+                )
+                user_id = response["Item"]["UserId"]
+
+                # Concatenate the message parts
+                message_parts = []
+                last_evaluated_key = None
+
+                while True:
+                    if last_evaluated_key:
+                        response = table.query(
+                            KeyConditionExpression=Key("ConnectionId").eq(connection_id)
+                            # Zero is reserved for user id, so start from 1
+                            & Key("MessagePartId").gte(1),
+                            ExclusiveStartKey=last_evaluated_key,
+                        )
+                    else:
+                        response = table.query(
+                            KeyConditionExpression=Key("ConnectionId").eq(connection_id)
+                            & Key("MessagePartId").gte(1),
+                        )
 
-                message_parts.extend(response["Items"])
+                    message_parts.extend(response["Items"])
 
-                if "LastEvaluatedKey" in response:
-                    last_evaluated_key = response["LastEvaluatedKey"]
-                else:
-                    break
+                    if "LastEvaluatedKey" in response:
+                        last_evaluated_key = response["LastEvaluatedKey"]
+                    else:
+                        break
 
-            logger.info(f"Number of message chunks: {len(message_parts)}")
-            message_parts.sort(key=lambda x: x["MessagePartId"])
-            full_message = "".join(item["MessagePart"] for item in message_parts)
+                logger.info(f"Number of message chunks: {len(message_parts)}")
+                message_parts.sort(key=lambda x: x["MessagePartId"])
+                full_message = "".join(item["MessagePart"] for item in message_parts)
 
-            # Process the concatenated full message
-            chat_input = ChatInput(**json.loads(full_message))
-            return process_chat_input(
-                user_id=user_id,
-                chat_input=chat_input,
-                gatewayapi=gatewayapi,
-                connection_id=connection_id,
-            )
+                # Process the concatenated full message
+                chat_input = ChatInput(**json.loads(full_message))
+
+            # Send frames in background not to block consuming the Bedrock stream
+            sender = BackgroundSender(gatewayapi)
+            try:
+                response = process_chat_input(
+                    user_id=user_id,
+                    chat_input=chat_input,
+                    gatewayapi=sender,
+                    connection_id=connection_id,
+                )
+            finally:
+                # Send all frames including `STREAMING_END` before returning
+                sender.close()
+
+            return response
         else:
             # Store the message part of full message
             # Zero is reserved for user id, so start from 1
@@ -32,11 +32,12 @@ def update_sync_status(
     table = _get_table_client(user_id)
     table.update_item(
         Key={"PK": user_id, "SK": compose_bot_id(user_id, bot_id)},
-        UpdateExpression="SET SyncStatus = :sync_status, SyncStatusReason = :sync_status_reason, LastExecId = :last_exec_id",
+        UpdateExpression="SET SyncStatus = :sync_status, SyncStatusReason = :sync_status_reason, LastExecId = :last_exec_id ADD Version :one",
         ExpressionAttributeValues={
             ":sync_status": sync_status,
             ":sync_status_reason": sync_status_reason,
             ":last_exec_id": last_exec_id,
+            ":one": 1,
         },
     )
 
@@ -2,11 +2,13 @@ import sys
 
 sys.path.append(".")
 
+import time
 import unittest
 from pprint import pprint
+from unittest.mock import MagicMock, patch
 
 from app.agents.agent import AgentMessageModel, AgentRunner, OnStopInput
-from app.agents.tools.agent_tool import RunResult
+from app.agents.tools.agent_tool import AgentTool, RunResult
 from app.agents.tools.internet_search import internet_search_tool
 from app.bedrock import ConverseApiToolResult, ConverseApiToolUseContent
 from app.config import DEFAULT_EMBEDDING_CONFIG
@@ -24,6 +26,7 @@ from app.repositories.models.custom_bot import (
     SearchParamsModel,
 )
 from app.routes.schemas.conversation import type_model_name
+from pydantic import BaseModel
 
 
 def on_thinking(agent_log: list[AgentMessageModel]):
@@ -147,5 +150,188 @@ class TestAgentRunner(unittest.TestCase):
         pprint(res)
 
 
+class SleepInput(BaseModel):
+    seconds: float
+
+
+def sleep(arg: SleepInput, bot, model) -> str:
+    time.sleep(arg.seconds)
+    return f"slept {arg.seconds}"
+
+
+class TestInvokeTools(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tool_results: list[ConverseApiToolResult] = []
+        self.runner = AgentRunner(
+            bot=None,  # type: ignore
+            tools=[AgentTool("sleep", "Sleep", SleepInput, sleep)],
+            model="claude-v3-haiku",
+            on_tool_result=self.tool_results.append,
+        )
+
+    def _tool_use(self, tool_use_id: str, seconds: float) -> ConverseApiToolUseContent:
+        return {
+            "toolUseId": tool_use_id,
+            "name": "sleep",
+            "input": {"seconds": seconds},
+        }
+
+    def test_invoke_concurrently(self):
+        start = time.perf_counter()
+        results = self.runner._invoke_tools(
+            [self._tool_use("slow", 0.3), self._tool_use("fast", 0.1)]
+        )
+        elapsed = time.perf_counter() - start
+
+        self.assertLess(elapsed, 0.35)
+        # Results are in the original order
+        self.assertEqual([r["toolUseId"] for r in results], ["slow", "fast"])
+        self.assertEqual(results[0]["content"], {"text": "slept 0.3"})
+        # Callbacks are called as each tool finishes
+        self.assertEqual([r["toolUseId"] for r in self.tool_results], ["fast", "slow"])
+
+    def test_timeout(self):
+        with patch("app.agents.agent.AGENT_TOOL_TIMEOUT", 0.2):
+            results = self.runner._invoke_tools(
+                [self._tool_use("hang", 1), self._tool_use("fast", 0)]
+            )
+        self.assertEqual(results[0]["status"], "error")  # type: ignore
+        self.assertIn("timed out", results[0]["content"]["text"])  # type: ignore
+        self.assertEqual(results[1]["status"], "success")  # type: ignore
+
+    def test_tool_not_found(self):
+        with self.assertRaises(ValueError):
+            self.runner._invoke_tools(
+                [{"toolUseId": "1", "name": "unknown", "input": {}}]
+            )
+
+
+class TestStreamAgentRunner(unittest.TestCase):
+    def setUp(self) -> None:
+        self.streamed: list[str] = []
+        self.stopped: list[OnStopInput] = []
+        bot = MagicMock(instruction="", generation_params=None)
+        self.runner = AgentRunner(
+            bot=bot,
+            tools=[AgentTool("sleep", "Sleep", SleepInput, sleep)],
+            model="claude-v3-haiku",
+            on_stop=self.stopped.append,
+            on_stream=self.streamed.append,
+        )
+        self.runner.client = MagicMock()
+        self.runner.client.converse_stream.side_effect = [
+            self._response(
+                [
+                    {
+                        "contentBlockDelta": {
+                            "contentBlockIndex": 0,
+                            "delta": {"text": "Let me"},
+                        }
+                    },
+                    {
+                        "contentBlockDelta": {
+                            "contentBlockIndex": 0,
+                            "delta": {"text": " wait."},
+                        }
+                    },
+                    {"contentBlockStop": {"contentBlockIndex": 0}},
+                    {
+                        "contentBlockStart": {
+                            "contentBlockIndex": 1,
+                            "start": {
+                                "toolUse": {"toolUseId": "tool1", "name": "sleep"}
+                            },
+                        }
+                    },
+                    {
+                        "contentBlockDelta": {
+                            "contentBlockIndex": 1,
+                            "delta": {"toolUse": {"input": '{"seconds"'}},
+                        }
+                    },
+                    {
+                        "contentBlockDelta": {
+                            "contentBlockIndex": 1,
+                            "delta": {"toolUse": {"input": ": 0}"}},
+                        }
+                    },
+                    {"contentBlockStop": {"contentBlockIndex": 1}},
+                    {"messageStop": {"stopReason": "tool_use"}},
+                    {
+                        "metadata": {
+                            "usage": {
+                                "inputTokens": 10,
+                                "outputTokens": 5,
+                                "totalTokens": 15,
+                            }
+                        }
+                    },
+                ]
+            ),
+            self._response(
+                [
+                    {
+                        "contentBlockDelta": {
+                            "contentBlockIndex": 0,
+                            "delta": {"text": "Done"},
+                        }
+                    },
+                    {
+                        "contentBlockDelta": {
+                            "contentBlockIndex": 0,
+                            "delta": {"text": "!"},
+                        }
+                    },
+                    {"contentBlockStop": {"contentBlockIndex": 0}},
+                    {"messageStop": {"stopReason": "end_turn"}},
+                    {
+                        "metadata": {
+                            "usage": {
+                                "inputTokens": 20,
+                                "outputTokens": 2,
+                                "totalTokens": 22,
+                            }
+                        }
+                    },
+                ]
+            ),
+        ]
+
+    def _response(self, events: list[dict]) -> dict:
+        return {"ResponseMetadata": {}, "stream": iter(events)}
+
+    def test_run(self):
+        message = MessageModel(
+            role="user",
+            content=[
+                ContentModel(
+                    content_type="text", media_type=None, body="Wait", file_name=None
+                )
+            ],
+            model="claude-v3-haiku",
+            children=[],
+            parent=None,
+            create_time=0,
+            feedback=None,
+            used_chunks=None,
+            thinking_log=None,
+        )
+        result = self.runner.run(messages=[message])
+
+        self.assertEqual(self.streamed, ["Let me", " wait.", "Done", "!"])
+        self.assertEqual(
+            result.last_response["output"]["message"]["content"], [{"text": "Done!"}]
+        )
+        self.assertEqual(result.stop_reason, "end_turn")
+        self.assertEqual(self.stopped, [result])
+
+        # Tool use is assembled from the streamed input
+        tool_use = result.thinking_conversation[1].content[0].body
+        self.assertEqual(tool_use.tool_use_id, "tool1")  # type: ignore
+        self.assertEqual(tool_use.input, {"seconds": 0})  # type: ignore
+        tool_result = result.thinking_conversation[2].content[0].body
+        self.assertEqual(tool_result.status, "success")  # type: ignore
+
+
 if __name__ == "__main__":
     unittest.main()
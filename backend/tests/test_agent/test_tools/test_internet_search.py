@@ -1,9 +1,15 @@
 import sys
 
 sys.path.append(".")
+import json
 import unittest
+from unittest.mock import MagicMock, patch
 
-from app.agents.tools.internet_search import InternetSearchInput, internet_search_tool
+from app.agents.tools.internet_search import (
+    InternetSearchInput,
+    _search_cache,
+    internet_search_tool,
+)
 
 
 class TestInternetSearchTool(unittest.TestCase):
@@ -20,5 +26,50 @@ class TestInternetSearchTool(unittest.TestCase):
         print(response)
 
 
+class TestInternetSearchCache(unittest.TestCase):
+    def setUp(self) -> None:
+        _search_cache.clear()
+        self.ddgs = MagicMock()
+        self.ddgs.__enter__.return_value.text.return_value = [
+            {
+                "title": "焼肉",
+                "href": "https://example.com",
+                "body": "Body",
+                "extra": "x",
+            }
+        ]
+        patcher = patch("app.agents.tools.internet_search.DDGS", return_value=self.ddgs)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_cache_by_normalized_query(self):
+        first = internet_search_tool.run(
+            InternetSearchInput(
+                query="Tokyo  Yakiniku", time_limit="d", country="jp-jp"
+            )
+        )
+        second = internet_search_tool.run(
+            InternetSearchInput(query="tokyo yakiniku", time_limit="d", country="jp-jp")
+        )
+        self.assertEqual(first, second)
+        self.assertEqual(self.ddgs.__enter__.return_value.text.call_count, 1)
+
+        # Different time limit is searched again
+        internet_search_tool.run(
+            InternetSearchInput(query="tokyo yakiniku", time_limit="w", country="jp-jp")
+        )
+        self.assertEqual(self.ddgs.__enter__.return_value.text.call_count, 2)
+
+    def test_trim_results(self):
+        response = internet_search_tool.run(
+            InternetSearchInput(query="yakiniku", time_limit="d", country="jp-jp")
+        )
+        self.assertIn("焼肉", response.body)
+        self.assertEqual(
+            json.loads(response.body),
+            [{"title": "焼肉", "href": "https://example.com", "body": "Body"}],
+        )
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -1,9 +1,16 @@
 import sys
 
 sys.path.append(".")
+import json
 import unittest
+from unittest.mock import patch
 
-from app.agents.tools.knowledge import KnowledgeToolInput, create_knowledge_tool
+from app.agents.tools.knowledge import (
+    KnowledgeToolInput,
+    LatencyStats,
+    create_knowledge_tool,
+    dummy_search_results,
+)
 from app.config import DEFAULT_EMBEDDING_CONFIG
 from app.repositories.models.custom_bot import (
     AgentModel,
@@ -13,6 +20,7 @@ from app.repositories.models.custom_bot import (
     KnowledgeModel,
     SearchParamsModel,
 )
+from tests.test_usecases.utils.bot_factory import create_test_private_bot
 
 
 class TestKnowledgeTool(unittest.TestCase):
@@ -73,5 +81,48 @@ class TestKnowledgeTool(unittest.TestCase):
         print(response)
 
 
+class TestKnowledgeRetrievalOnly(unittest.TestCase):
+    def setUp(self) -> None:
+        self.bot = create_test_private_bot("dummy", False, "user1")
+        self.bot.agent.knowledge_retrieval_only = True
+        # Duplicated chunk, e.g. the same document uploaded twice
+        duplicated = dummy_search_results[0].model_copy(update={"rank": 5})
+        patcher = patch(
+            "app.agents.tools.knowledge.search_related_docs",
+            return_value=[*dummy_search_results, duplicated],
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_return_search_results(self):
+        tool = create_knowledge_tool(self.bot, model="claude-v3-haiku")
+        with patch("app.agents.tools.knowledge.call_converse_api") as converse:
+            response = tool.run(KnowledgeToolInput(query="Japanese dishes"))
+            converse.assert_not_called()
+
+        self.assertTrue(response.succeeded)
+        results = json.loads(response.body)["search_result"]
+        self.assertEqual([r["rank"] for r in results], [0, 1, 2, 3, 4])
+
+    def test_token_cap(self):
+        tool = create_knowledge_tool(self.bot, model="claude-v3-haiku")
+        with patch("app.agents.tools.knowledge.KNOWLEDGE_RETRIEVAL_MAX_TOKENS", 120):
+            response = tool.run(KnowledgeToolInput(query="Japanese dishes"))
+        results = json.loads(response.body)["search_result"]
+        self.assertEqual([r["rank"] for r in results], [0, 1])
+
+
+class TestLatencyStats(unittest.TestCase):
+    def test_rolling_average(self):
+        stats = LatencyStats(window=3)
+        self.assertIsNone(stats.average("claude-v3-haiku"))
+        for latency in [100.0, 200.0, 300.0, 400.0]:
+            stats.add("claude-v3-haiku", latency)
+        stats.add("claude-v3-sonnet", 1000.0)
+        # Only the most recent samples of the model are averaged
+        self.assertEqual(stats.average("claude-v3-haiku"), (300.0, 3))
+        self.assertEqual(stats.average("claude-v3-sonnet"), (1000.0, 1))
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,78 @@
+import sys
+import unittest
+from unittest.mock import MagicMock, patch
+
+sys.path.append(".")
+
+import rsa
+from app.auth import JwksCache
+from jose import jwk, jwt
+from jose.exceptions import JWTError
+
+
+def _create_signing_key(kid: str):
+    _, private_key = rsa.newkeys(2048)
+    pem = private_key.save_pkcs1().decode("utf-8")
+    signing_key = jwk.construct(pem, algorithm="RS256")
+    public_jwk = {
+        **signing_key.public_key().to_dict(),
+        "kid": kid,
+        "alg": "RS256",
+        "use": "sig",
+    }
+    return pem, public_jwk
+
+
+def _jwks_response(jwks: list[dict]):
+    response = MagicMock()
+    response.json.return_value = {"keys": jwks}
+    return response
+
+
+class TestJwksCache(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.pem_1, cls.jwk_1 = _create_signing_key("kid-1")
+        cls.pem_2, cls.jwk_2 = _create_signing_key("kid-2")
+
+    def test_keys_are_fetched_once(self):
+        cache = JwksCache("https://example.com/jwks.json")
+        token = jwt.encode({"sub": "user"}, self.pem_1, "RS256", {"kid": "kid-1"})
+        with patch(
+            "app.auth.requests.get", return_value=_jwks_response([self.jwk_1])
+        ) as mock_get:
+            for _ in range(3):
+                key = cache.get_key("kid-1")
+                decoded = jwt.decode(token, key, algorithms=["RS256"])
+                self.assertEqual(decoded["sub"], "user")
+            self.assertEqual(mock_get.call_count, 1)
+
+    def test_refresh_on_unknown_kid(self):
+        cache = JwksCache("https://example.com/jwks.json", min_refresh_interval=0)
+        with patch(
+            "app.auth.requests.get",
+            side_effect=[
+                _jwks_response([self.jwk_1]),
+                _jwks_response([self.jwk_1, self.jwk_2]),
+            ],
+        ) as mock_get:
+            cache.get_key("kid-1")
+            # Key rotation: `kid-2` is only available after refresh
+            cache.get_key("kid-2")
+            self.assertEqual(mock_get.call_count, 2)
+
+    def test_unknown_kid_refresh_is_rate_limited(self):
+        cache = JwksCache("https://example.com/jwks.json", min_refresh_interval=60)
+        with patch(
+            "app.auth.requests.get", return_value=_jwks_response([self.jwk_1])
+        ) as mock_get:
+            cache.get_key("kid-1")
+            for _ in range(5):
+                with self.assertRaises(JWTError):
+                    cache.get_key("unknown")
+            # The keys were just fetched, so unknown kids must not trigger refreshes
+            self.assertEqual(mock_get.call_count, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,128 @@
+import sys
+import threading
+import unittest
+from unittest.mock import patch
+
+sys.path.append(".")
+
+from app.embedding_batch import BatchEmbedder, pack_batches, text_size
+from botocore.exceptions import ClientError
+
+
+def _throttling_error() -> ClientError:
+    return ClientError(
+        {"Error": {"Code": "ThrottlingException", "Message": "Too many requests"}},
+        "InvokeModel",
+    )
+
+
+class MockEmbed:
+    def __init__(self, throttle: set[str] | None = None):
+        # Batches starting with these texts are throttled once
+        self.throttle = throttle or set()
+        self.calls: list[list[str]] = []
+        self.running = 0
+        self.max_running = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, texts: list[str]) -> list[list[float]]:
+        with self.lock:
+            self.calls.append(texts)
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        try:
+            if texts[0] in self.throttle:
+                self.throttle.discard(texts[0])
+                raise _throttling_error()
+            return [[float(t)] for t in texts]
+        finally:
+            with self.lock:
+                self.running -= 1
+
+
+class TestPackBatches(unittest.TestCase):
+    def test_max_texts(self):
+        texts = [str(i) for i in range(10)]
+        self.assertEqual(
+            pack_batches(texts, max_texts=4, max_bytes=1000),
+            [(0, 4), (4, 8), (8, 10)],
+        )
+
+    def test_max_bytes(self):
+        texts = ["a" * 10, "b" * 10, "c" * 10]
+        max_bytes = text_size(texts[0]) * 2
+        self.assertEqual(
+            pack_batches(texts, max_texts=96, max_bytes=max_bytes), [(0, 2), (2, 3)]
+        )
+        # Non-ASCII characters are counted in UTF-8 bytes
+        self.assertEqual(text_size("あ"), text_size("abc"))
+
+    def test_large_text(self):
+        texts = ["a", "b" * 100, "c"]
+        self.assertEqual(
+            pack_batches(texts, max_texts=96, max_bytes=50),
+            [(0, 1), (1, 2), (2, 3)],
+        )
+
+    def test_empty(self):
+        self.assertEqual(pack_batches([], max_texts=96, max_bytes=1000), [])
+
+
+@patch("app.embedding_batch.time.sleep", lambda _: None)
+class TestBatchEmbedder(unittest.TestCase):
+    def setUp(self) -> None:
+        self.texts = [str(i) for i in range(100)]
+
+    def test_keep_order(self):
+        embed = MockEmbed()
+        embedder = BatchEmbedder(embed, max_texts=7, max_concurrency=4)
+        embeddings = embedder.embed(self.texts)
+        self.assertEqual(embeddings, [[float(t)] for t in self.texts])
+        self.assertEqual(len(embed.calls), 15)
+        self.assertLessEqual(embed.max_running, 4)
+
+    def test_retry_only_throttled_batches(self):
+        embed = MockEmbed(throttle={"10", "50"})
+        embedder = BatchEmbedder(embed, max_texts=10, max_concurrency=4)
+        embeddings = embedder.embed(self.texts)
+        self.assertEqual(embeddings, [[float(t)] for t in self.texts])
+        # 10 batches and 2 retries
+        self.assertEqual(len(embed.calls), 12)
+        self.assertEqual(embedder.throttled_count, 2)
+        first_texts = [call[0] for call in embed.calls]
+        self.assertEqual(first_texts.count("10"), 2)
+        self.assertEqual(first_texts.count("50"), 2)
+        self.assertEqual(first_texts.count("0"), 1)
+        # Concurrency is reduced on throttling
+        self.assertLess(embedder.min_concurrency, 4)
+
+    def test_give_up_after_max_retries(self):
+        def embed(texts: list[str]) -> list[list[float]]:
+            raise _throttling_error()
+
+        embedder = BatchEmbedder(embed, max_concurrency=2, max_retries=3)
+        with self.assertRaises(ClientError):
+            embedder.embed(self.texts[:10])
+        self.assertEqual(embedder.request_count, 4)
+        self.assertEqual(embedder.min_concurrency, 1)
+
+    def test_raise_other_errors(self):
+        def embed(texts: list[str]) -> list[list[float]]:
+            raise ClientError(
+                {"Error": {"Code": "ValidationException", "Message": ""}},
+                "InvokeModel",
+            )
+
+        embedder = BatchEmbedder(embed)
+        with self.assertRaises(ClientError):
+            embedder.embed(self.texts)
+        self.assertEqual(embedder.throttled_count, 0)
+
+    def test_embedding_count_mismatch(self):
+        embedder = BatchEmbedder(lambda texts: [[0.0]])
+        with self.assertRaises(ValueError):
+            embedder.embed(self.texts[:2])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+import sys
+import unittest
+from unittest.mock import MagicMock
+
+sys.path.append(".")
+
+from app.cache import LRUCache
+from app.embedding_cache import (
+    QueryEmbeddingCache,
+    decode_embedding,
+    encode_embedding,
+    normalize_query,
+)
+
+MODEL_ID = "cohere.embed-multilingual-v3"
+
+
+class TestLRUCache(unittest.TestCase):
+    def test_eviction(self):
+        cache: LRUCache[int] = LRUCache(max_size=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("c"), 3)
+        self.assertEqual(cache.hits, 3)
+        self.assertEqual(cache.misses, 1)
+
+    def test_expiration(self):
+        cache: LRUCache[int] = LRUCache(max_size=2, ttl=60)
+        cache.set("a", 1, ttl=0)
+        cache.set("b", 2)
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.get("b"), 2)
+
+
+class TestQueryEmbeddingCache(unittest.TestCase):
+    def test_encode_decode(self):
+        embedding = [0.5, -0.25, 0.125]
+        data = encode_embedding(embedding)
+        # float32
+        self.assertEqual(len(data), 4 * len(embedding))
+        self.assertEqual(decode_embedding(data), embedding)
+
+    def test_normalize_query(self):
+        self.assertEqual(normalize_query("  What is\tBedrock?\n"), "What is Bedrock?")
+        # Full-width characters are normalized
+        self.assertEqual(normalize_query("ＡＷＳ"), "AWS")
+
+    def test_memory_tier(self):
+        cache = QueryEmbeddingCache(max_size=10)
+        self.assertIsNone(cache.get(MODEL_ID, "hello"))
+        cache.put(MODEL_ID, "hello", [0.5, 0.25])
+        self.assertEqual(cache.get(MODEL_ID, " hello "), [0.5, 0.25])
+        # Different model must not share the entry
+        self.assertIsNone(cache.get("other-model", "hello"))
+        self.assertEqual(cache.memory_hits, 1)
+        self.assertEqual(cache.misses, 2)
+
+    def test_miss_and_hit_return_same_vector(self):
+        cache = QueryEmbeddingCache(max_size=10)
+        # Not representable in float32
+        embedding = [0.1, -0.2, 0.3]
+        stored = cache.put(MODEL_ID, "hello", embedding)
+        self.assertNotEqual(stored, embedding)
+        self.assertEqual(cache.get(MODEL_ID, "hello"), stored)
+
+    def test_shared_tier(self):
+        cache = QueryEmbeddingCache(max_size=10)
+        cache.shared.table = MagicMock()
+        cache.shared.table.get_item.return_value = {
+            "Item": {"Embedding": encode_embedding([0.5, 0.25])}
+        }
+        self.assertEqual(cache.get(MODEL_ID, "hello"), [0.5, 0.25])
+        # Promoted to the memory tier
+        self.assertEqual(cache.get(MODEL_ID, "hello"), [0.5, 0.25])
+        self.assertEqual(cache.shared.table.get_item.call_count, 1)
+        self.assertEqual(cache.shared_hits, 1)
+        self.assertEqual(cache.memory_hits, 1)
+        self.assertEqual(cache.misses, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,208 @@
+import base64
+import sys
+import unittest
+from unittest.mock import MagicMock, patch
+
+sys.path.append(".")
+
+from app.history import (
+    IMAGE_TOKENS,
+    apply_summary,
+    estimate_content_tokens,
+    estimate_message_tokens,
+    estimate_text_tokens,
+    window_messages,
+    window_messages_for_bot,
+)
+from app.repositories.models.conversation import (
+    ContentModel,
+    ConversationModel,
+    ConversationSummaryModel,
+    MessageModel,
+)
+
+MODEL = "claude-v3-haiku"
+
+
+def _message(role: str, text: str, image: bool = False) -> MessageModel:
+    content = [
+        ContentModel(content_type="text", media_type=None, body=text, file_name=None)
+    ]
+    if image:
+        content.insert(
+            0,
+            ContentModel(
+                content_type="image",
+                media_type="image/png",
+                body=base64.b64encode(b"image").decode("utf-8"),
+                file_name=None,
+            ),
+        )
+    return MessageModel(
+        role=role,
+        content=content,
+        model=MODEL,
+        children=[],
+        parent=None,
+        create_time=1627984879.9,
+        feedback=None,
+        used_chunks=None,
+        thinking_log=None,
+    )
+
+
+class TestEstimateTokens(unittest.TestCase):
+    def test_estimate_text_tokens(self):
+        self.assertEqual(estimate_text_tokens("a" * 35, MODEL), 10)
+        self.assertEqual(estimate_text_tokens("a" * 30, "mistral-large"), 10)
+        # Non-ASCII characters are counted as a token each
+        self.assertEqual(estimate_text_tokens("こんにちは", MODEL), 5)
+
+    @patch("app.history.find_blob_size", return_value=350)
+    def test_estimate_attachment_tokens(self, find_blob_size):
+        attachment = ContentModel(
+            content_type="attachment",
+            media_type=None,
+            body="",
+            file_name="doc.txt",
+            blob_key="user/blobs/digest",
+            blob_size=3500,
+        )
+        # Size stored with the message is used without reading the blob store
+        self.assertEqual(estimate_content_tokens(attachment, MODEL), 1000)
+        find_blob_size.assert_not_called()
+
+        # Stored before the size was recorded
+        attachment.blob_size = None
+        self.assertEqual(estimate_content_tokens(attachment, MODEL), 100)
+        find_blob_size.assert_called_once_with("user/blobs/digest")
+
+    def test_estimate_image_tokens(self):
+        message = _message("user", "", image=True)
+        self.assertGreaterEqual(estimate_message_tokens(message, MODEL), IMAGE_TOKENS)
+
+
+class TestWindowMessages(unittest.TestCase):
+    def setUp(self) -> None:
+        self.system = _message("system", "")
+        self.turns = []
+        for i in range(5):
+            self.turns.append(_message("user", f"question {i} " * 50, image=i == 0))
+            self.turns.append(_message("assistant", f"answer {i} " * 50))
+        self.current = _message("user", "current question")
+        self.messages = [self.system, *self.turns, self.current]
+        self.turn_tokens = estimate_message_tokens(self.turns[1], MODEL)
+
+    def test_within_budget(self):
+        windowed, saved = window_messages(self.messages, MODEL, 100000)
+        self.assertEqual(windowed, self.messages)
+        self.assertEqual(saved, 0)
+
+    def test_omit_files_first(self):
+        original = sum(estimate_message_tokens(m, MODEL) for m in self.messages)
+        # Fits in the budget by omitting the image
+        windowed, saved = window_messages(
+            self.messages, MODEL, original - IMAGE_TOKENS + 100
+        )
+        self.assertEqual(len(windowed), len(self.messages))
+        self.assertGreater(saved, 0)
+        self.assertEqual(
+            [c.content_type for c in windowed[1].content], ["text", "text"]
+        )
+        # Original message is not modified
+        self.assertEqual(self.turns[0].content[0].content_type, "image")
+
+    def test_drop_oldest_turns(self):
+        windowed, saved = window_messages(
+            self.messages, MODEL, self.turn_tokens * 5, instruction="Be concise."
+        )
+        # System message and the current message are pinned
+        self.assertIs(windowed[0], self.system)
+        self.assertIs(windowed[-1], self.current)
+        # Starts with a user message and keeps the most recent turns
+        self.assertEqual(windowed[1].role, "user")
+        self.assertEqual(windowed[1:-1], self.turns[-len(windowed) + 2 :])
+        self.assertLess(len(windowed), len(self.messages))
+        total = sum(estimate_message_tokens(m, MODEL) for m in windowed)
+        self.assertLessEqual(total, self.turn_tokens * 5)
+        original = sum(estimate_message_tokens(m, MODEL) for m in self.messages)
+        self.assertEqual(saved, original - total)
+
+    def test_window_messages_for_bot(self):
+        bot = MagicMock()
+        bot.history_params.max_input_tokens = self.turn_tokens * 5
+        windowed, saved = window_messages_for_bot(self.messages, bot, MODEL)
+        self.assertEqual(
+            (windowed, saved),
+            window_messages(self.messages, MODEL, self.turn_tokens * 5),
+        )
+        self.assertGreater(saved, 0)
+
+        # Bots without the history budget are not windowed
+        bot.history_params = None
+        self.assertEqual(
+            window_messages_for_bot(self.messages, bot, MODEL), (self.messages, 0)
+        )
+        self.assertEqual(
+            window_messages_for_bot(self.messages, None, MODEL), (self.messages, 0)
+        )
+
+    def test_pinned_exceed_budget(self):
+        windowed, _ = window_messages(self.messages, MODEL, 1)
+        self.assertEqual(windowed, [self.system, self.current])
+
+    def test_continue_generate(self):
+        # The last assistant message is continued, so the turn including it is pinned
+        messages = [self.system, *self.turns]
+        windowed, _ = window_messages(messages, MODEL, 1)
+        self.assertEqual(windowed, [self.system, *self.turns[-2:]])
+
+
+class TestApplySummary(unittest.TestCase):
+    def setUp(self) -> None:
+        self.message_map = {"system": _message("system", "")}
+        for i in range(4):
+            self.message_map[f"{i}-user"] = _message("user", f"question {i}")
+            self.message_map[f"{i}-assistant"] = _message("assistant", f"answer {i}")
+        self.messages = list(self.message_map.values())
+
+    def _conversation(self, summary: ConversationSummaryModel | None):
+        return ConversationModel(
+            id="conversation1",
+            create_time=1627984879.9,
+            title="Test Conversation",
+            total_price=0,
+            message_map=self.message_map,
+            last_message_id="3-assistant",
+            bot_id=None,
+            should_continue=False,
+            summary=summary,
+        )
+
+    def test_replace_covered_turns(self):
+        conversation = self._conversation(
+            ConversationSummaryModel(body="Summary", last_message_id="1-assistant")
+        )
+        messages, instruction = apply_summary(
+            self.messages, conversation, "Be concise."
+        )
+        self.assertEqual(messages, [self.message_map["system"], *self.messages[5:]])
+        self.assertTrue(instruction.startswith("Be concise."))  # type: ignore
+        self.assertIn("Summary", instruction)  # type: ignore
+
+    def test_no_summary(self):
+        messages, instruction = apply_summary(self.messages, self._conversation(None))
+        self.assertEqual(messages, self.messages)
+        self.assertIsNone(instruction)
+
+    def test_summary_of_another_branch(self):
+        conversation = self._conversation(
+            ConversationSummaryModel(body="Summary", last_message_id="3-assistant")
+        )
+        messages, instruction = apply_summary(self.messages[:5], conversation)
+        self.assertEqual(messages, self.messages[:5])
+        self.assertIsNone(instruction)
+
+
+if __name__ == "__main__":
+    unittest.main()
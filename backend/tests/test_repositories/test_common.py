@@ -0,0 +1,147 @@
+import sys
+import threading
+import unittest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock, patch
+
+sys.path.append(".")
+
+from app.repositories.common import (
+    BATCH_GET_ITEM_MAX_RETRIES,
+    TABLE_NAME,
+    _RowLevelSessionCache,
+    batch_get_items,
+)
+
+
+def _assume_role_response(expires_in: timedelta):
+    return {
+        "Credentials": {
+            "AccessKeyId": "key",
+            "SecretAccessKey": "secret",
+            "SessionToken": "token",
+            "Expiration": datetime.now(timezone.utc) + expires_in,
+        }
+    }
+
+
+class TestRowLevelSessionCache(unittest.TestCase):
+    def setUp(self) -> None:
+        self.sts_client = MagicMock()
+        patcher_client = patch(
+            "app.repositories.common.boto3.client", return_value=self.sts_client
+        )
+        # New resource for each session
+        patcher_session = patch(
+            "app.repositories.common.boto3.Session",
+            side_effect=lambda **_: MagicMock(),
+        )
+        patcher_client.start()
+        patcher_session.start()
+        self.addCleanup(patcher_client.stop)
+        self.addCleanup(patcher_session.stop)
+
+    def test_session_is_reused(self):
+        self.sts_client.assume_role.return_value = _assume_role_response(
+            timedelta(hours=1)
+        )
+        cache = _RowLevelSessionCache(max_size=10)
+        for _ in range(5):
+            cache.get("dynamodb", "policy-user-1")
+        self.assertEqual(cache.sts_call_count, 1)
+
+        cache.get("dynamodb", "policy-user-2")
+        self.assertEqual(cache.sts_call_count, 2)
+
+    def test_refresh_before_expiration(self):
+        # Credentials expiring within the refresh margin must not be reused
+        self.sts_client.assume_role.return_value = _assume_role_response(
+            timedelta(minutes=1)
+        )
+        cache = _RowLevelSessionCache(max_size=10)
+        cache.get("dynamodb", "policy-user-1")
+        cache.get("dynamodb", "policy-user-1")
+        self.assertEqual(cache.sts_call_count, 2)
+
+    def test_least_recently_used_is_evicted(self):
+        self.sts_client.assume_role.return_value = _assume_role_response(
+            timedelta(hours=1)
+        )
+        cache = _RowLevelSessionCache(max_size=2)
+        cache.get("dynamodb", "policy-user-1")
+        cache.get("dynamodb", "policy-user-2")
+        cache.get("dynamodb", "policy-user-1")
+        cache.get("dynamodb", "policy-user-3")
+        self.assertEqual(cache.sts_call_count, 3)
+
+        # `policy-user-2` was evicted, `policy-user-1` was kept
+        cache.get("dynamodb", "policy-user-1")
+        self.assertEqual(cache.sts_call_count, 3)
+        cache.get("dynamodb", "policy-user-2")
+        self.assertEqual(cache.sts_call_count, 4)
+
+    def test_resource_per_thread(self):
+        self.sts_client.assume_role.return_value = _assume_role_response(
+            timedelta(hours=1)
+        )
+        cache = _RowLevelSessionCache(max_size=10)
+        resource = cache.get("dynamodb", "policy-user-1")
+        self.assertIs(cache.get("dynamodb", "policy-user-1"), resource)
+
+        resources = []
+        thread = threading.Thread(
+            target=lambda: resources.append(cache.get("dynamodb", "policy-user-1"))
+        )
+        thread.start()
+        thread.join()
+        # Credentials are shared, but the resource is not
+        self.assertIsNot(resources[0], resource)
+        self.assertEqual(cache.sts_call_count, 1)
+
+
+@patch("app.repositories.common.time.sleep", lambda _: None)
+class TestBatchGetItems(unittest.TestCase):
+    def setUp(self) -> None:
+        self.dynamodb = MagicMock()
+        patcher = patch(
+            "app.repositories.common._get_aws_resource", return_value=self.dynamodb
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _response(self, items: list[dict], unprocessed: list[dict]) -> dict:
+        return {
+            "Responses": {TABLE_NAME: items},
+            "UnprocessedKeys": (
+                {TABLE_NAME: {"Keys": unprocessed}} if unprocessed else {}
+            ),
+        }
+
+    def test_chunk_and_retry_unprocessed_keys(self):
+        keys = [{"PK": "user", "SK": f"user#BOT#{i}"} for i in range(150)]
+        self.dynamodb.batch_get_item.side_effect = [
+            self._response(keys[:90], keys[90:100]),
+            self._response(keys[90:100], []),
+            self._response(keys[100:], []),
+        ]
+        items = batch_get_items(keys, user_id="user")
+        self.assertEqual(len(items), 150)
+        # Only unprocessed keys are requested again
+        calls = self.dynamodb.batch_get_item.call_args_list
+        self.assertEqual(len(calls[0].kwargs["RequestItems"][TABLE_NAME]["Keys"]), 100)
+        self.assertEqual(
+            calls[1].kwargs["RequestItems"], {TABLE_NAME: {"Keys": keys[90:100]}}
+        )
+
+    def test_give_up_after_max_retries(self):
+        keys = [{"PK": "user", "SK": "user#BOT#1"}]
+        self.dynamodb.batch_get_item.return_value = self._response([], keys)
+        with self.assertRaises(RuntimeError):
+            batch_get_items(keys, user_id="user")
+        self.assertEqual(
+            self.dynamodb.batch_get_item.call_count, BATCH_GET_ITEM_MAX_RETRIES + 1
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,9 +1,25 @@
+import base64
+import json
 import sys
 import unittest
 
 sys.path.append(".")
 
 from app.config import DEFAULT_EMBEDDING_CONFIG
+from app.repositories.blob import (
+    LARGE_MESSAGE_BUCKET,
+    _blob_cache,
+    find_blobs,
+    get_content_body,
+    s3_client,
+    store_blob,
+)
+from app.repositories.common import (
+    _get_table_client,
+    compose_conv_id,
+    compose_conv_message_id,
+    compose_conv_message_prefix,
+)
 from app.repositories.conversation import (
     ContentModel,
     ConversationModel,
@@ -14,7 +30,9 @@ from app.repositories.conversation import (
     delete_conversation_by_user_id,
     find_conversation_by_id,
     find_conversation_by_user_id,
+    find_conversation_page_by_user_id,
     store_conversation,
+    update_conversation_summary,
     update_feedback,
 )
 from app.repositories.custom_bot import (
@@ -27,6 +45,7 @@ from app.repositories.models.conversation import (
     AgentMessageModel,
     AgentToolUseContentModel,
     ChunkModel,
+    ConversationSummaryModel,
     FeedbackModel,
 )
 from app.repositories.models.custom_bot import (
@@ -206,8 +225,9 @@ class TestConversationRepository(unittest.TestCase):
         self.assertEqual(content[0].content_type, "text")
         self.assertEqual(content[0].body, "Hello")
         self.assertEqual(content[1].content_type, "image")
+        # Image body is stored in the blob store
         self.assertEqual(
-            content[1].body,
+            get_content_body(content[1]),
             "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAQAAAC1HAwCAAAAC0lEQVR42mNk+A8AAQUBAScY42YAAAAASUVORK5CYII=",
         )
         self.assertEqual(content[1].media_type, "image/png")
@@ -354,6 +374,347 @@ class TestConversationRepository(unittest.TestCase):
         self.assertEqual(len(conversations), 0)
 
 
+class TestConversationMessageItems(unittest.TestCase):
+    def _create_message(self, parent: str | None, body: str) -> MessageModel:
+        return MessageModel(
+            role="user",
+            content=[
+                ContentModel(
+                    content_type="text", body=body, media_type=None, file_name=None
+                )
+            ],
+            model="claude-instant-v1",
+            children=[],
+            parent=parent,
+            create_time=1627984879.9,
+            feedback=None,
+            used_chunks=None,
+            thinking_log=None,
+        )
+
+    def _count_message_items(self, conversation_id: str) -> int:
+        table = _get_table_client("user")
+        response = table.query(
+            KeyConditionExpression=Key("PK").eq("user")
+            & Key("SK").begins_with(
+                compose_conv_message_prefix("user", conversation_id)
+            ),
+        )
+        return len(response["Items"])
+
+    def test_append_message(self):
+        conversation = ConversationModel(
+            id="3",
+            create_time=1627984879.9,
+            title="Test Conversation",
+            total_price=100,
+            message_map={"system": self._create_message(None, "")},
+            last_message_id="system",
+            bot_id=None,
+            should_continue=False,
+        )
+        store_conversation("user", conversation)
+        self.assertEqual(self._count_message_items("3"), 1)
+
+        found = find_conversation_by_id("user", "3")
+        found.message_map["system"].children.append("a")
+        found.message_map["a"] = self._create_message("system", "Hello")
+        found.last_message_id = "a"
+        store_conversation("user", found)
+        self.assertEqual(self._count_message_items("3"), 2)
+
+        found = find_conversation_by_id("user", "3")
+        self.assertEqual(found.last_message_id, "a")
+        self.assertEqual(found.message_map["system"].children, ["a"])
+        self.assertEqual(found.message_map["a"].content[0].body, "Hello")
+
+        conversations = find_conversation_by_user_id("user")
+        self.assertEqual(len(conversations), 1)
+        self.assertEqual(conversations[0].model, "claude-instant-v1")
+
+        delete_conversation_by_id("user", "3")
+        self.assertEqual(self._count_message_items("3"), 0)
+
+    def test_find_conversation_page(self):
+        for conversation_id in ["6", "7", "8"]:
+            store_conversation(
+                "user",
+                ConversationModel(
+                    id=conversation_id,
+                    create_time=1627984879.9,
+                    title=f"Conversation {conversation_id}",
+                    total_price=0,
+                    message_map={"system": self._create_message(None, "")},
+                    last_message_id="system",
+                    bot_id=None,
+                    should_continue=False,
+                ),
+            )
+
+        conversations, next_token = find_conversation_page_by_user_id("user", limit=2)
+        self.assertEqual([c.id for c in conversations], ["8", "7"])
+        self.assertEqual(conversations[0].model, "claude-instant-v1")
+        self.assertIsNotNone(next_token)
+
+        conversations, next_token = find_conversation_page_by_user_id(
+            "user", limit=2, next_token=next_token
+        )
+        self.assertEqual([c.id for c in conversations], ["6"])
+        self.assertIsNone(next_token)
+
+        # Malformed token or the key of another user
+        another_user_key = base64.b64encode(
+            json.dumps({"PK": "other", "SK": "other#CONV#6"}).encode("utf-8")
+        ).decode("utf-8")
+        for invalid_token in ["not base64!", "bm90IGpzb24=", another_user_key]:
+            with self.assertRaises(ValueError):
+                find_conversation_page_by_user_id("user", next_token=invalid_token)
+
+    def test_store_compressed_message(self):
+        body = "This is a long message which is compressed. " * 1000
+        conversation = ConversationModel(
+            id="11",
+            create_time=1627984879.9,
+            title="Test Conversation",
+            total_price=0,
+            message_map={"system": self._create_message(None, body)},
+            last_message_id="system",
+            bot_id=None,
+            should_continue=False,
+        )
+        store_conversation("user", conversation)
+
+        table = _get_table_client("user")
+        item = table.get_item(
+            Key={"PK": "user", "SK": compose_conv_message_id("user", "11", "system")}
+        )["Item"]
+        self.assertEqual(item["MessageFormatVersion"], 1)
+        self.assertNotIn("Message", item)
+        self.assertLess(len(bytes(item["MessageData"])), len(body) // 4)
+
+        found = find_conversation_by_id("user", "11")
+        self.assertEqual(found.message_map["system"].content[0].body, body)
+
+    def test_update_feedback(self):
+        conversation = ConversationModel(
+            id="5",
+            create_time=1627984879.9,
+            title="Test Conversation",
+            total_price=100,
+            message_map={"system": self._create_message(None, "")},
+            last_message_id="system",
+            bot_id=None,
+            should_continue=False,
+        )
+        store_conversation("user", conversation)
+        update_feedback(
+            user_id="user",
+            conversation_id="5",
+            message_id="system",
+            feedback=FeedbackModel(thumbs_up=False, category="Bad", comment="Wrong"),
+        )
+
+        # Only the feedback attribute is written
+        table = _get_table_client("user")
+        item = table.get_item(
+            Key={"PK": "user", "SK": compose_conv_message_id("user", "5", "system")}
+        )["Item"]
+        self.assertEqual(item["Feedback"]["category"], "Bad")
+        self.assertIsNone(json.loads(item["Message"])["feedback"])
+
+        found = find_conversation_by_id("user", "5")
+        feedback = found.message_map["system"].feedback
+        self.assertIsNotNone(feedback)
+        self.assertEqual(feedback.thumbs_up, False)  # type: ignore
+        self.assertEqual(feedback.comment, "Wrong")  # type: ignore
+
+        with self.assertRaises(RecordNotFoundError):
+            update_feedback(
+                user_id="user",
+                conversation_id="5",
+                message_id="not-exist",
+                feedback=FeedbackModel(thumbs_up=True, category="", comment=""),
+            )
+
+    def test_feedback_is_kept_on_rewrite(self):
+        conversation = ConversationModel(
+            id="12",
+            create_time=1627984879.9,
+            title="Test Conversation",
+            total_price=0,
+            message_map={"system": self._create_message(None, "")},
+            last_message_id="system",
+            bot_id=None,
+            should_continue=False,
+        )
+        store_conversation("user", conversation)
+        found = find_conversation_by_id("user", "12")
+
+        # Feedback is given while the conversation is being continued
+        update_feedback(
+            user_id="user",
+            conversation_id="12",
+            message_id="system",
+            feedback=FeedbackModel(thumbs_up=True, category="Good", comment=""),
+        )
+        found.message_map["system"].children.append("a")
+        found.message_map["a"] = self._create_message("system", "Hello")
+        found.last_message_id = "a"
+        store_conversation("user", found)
+
+        found = find_conversation_by_id("user", "12")
+        self.assertEqual(found.message_map["system"].children, ["a"])
+        feedback = found.message_map["system"].feedback
+        self.assertIsNotNone(feedback)
+        self.assertEqual(feedback.category, "Good")  # type: ignore
+
+    def test_store_blob_deleted_by_another_container(self):
+        body = base64.b64encode(b"image").decode("utf-8")
+        key, size = store_blob("user", body)
+        self.assertEqual(size, len(b"image"))
+        # Deleted by another container, e.g. deleting all conversations of the user
+        s3_client.delete_object(Bucket=LARGE_MESSAGE_BUCKET, Key=key)
+
+        self.assertEqual(store_blob("user", body), (key, size))
+        s3_client.head_object(Bucket=LARGE_MESSAGE_BUCKET, Key=key)
+
+    def test_find_blobs(self):
+        bodies = [f"image{i}".encode("utf-8") for i in range(10)]
+        keys = [
+            store_blob("user", base64.b64encode(body).decode("utf-8"))[0]
+            for body in bodies
+        ]
+        _blob_cache.clear()
+
+        blobs = find_blobs(keys + keys[:3])
+        self.assertEqual(blobs, dict(zip(keys, bodies)))
+        self.assertEqual(find_blobs([]), {})
+
+    def test_store_image_in_blob_store(self):
+        image_body = "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAQAAAC1HAwCAAAAC0lEQVR42mNk+A8AAQUBAScY42YAAAAASUVORK5CYII="
+        message = self._create_message(None, "")
+        message.content.append(
+            ContentModel(
+                content_type="image",
+                body=image_body,
+                media_type="image/png",
+                file_name=None,
+            )
+        )
+        for conversation_id in ["9", "10"]:
+            store_conversation(
+                "user",
+                ConversationModel(
+                    id=conversation_id,
+                    create_time=1627984879.9,
+                    title="Test Conversation",
+                    total_price=0,
+                    message_map={"system": message},
+                    last_message_id="system",
+                    bot_id=None,
+                    should_continue=False,
+                ),
+            )
+
+        table = _get_table_client("user")
+        item = table.get_item(
+            Key={"PK": "user", "SK": compose_conv_message_id("user", "9", "system")}
+        )["Item"]
+        stored_content = json.loads(item["Message"])["content"][1]
+        # Only the reference is stored in the message
+        self.assertEqual(stored_content["body"], "")
+        self.assertIsNotNone(stored_content["blob_key"])
+        self.assertEqual(stored_content["blob_size"], len(base64.b64decode(image_body)))
+
+        content = find_conversation_by_id("user", "9").message_map["system"].content[1]
+        other = find_conversation_by_id("user", "10").message_map["system"].content[1]
+        # Same content shares the same blob
+        self.assertEqual(content.blob_key, other.blob_key)
+        self.assertEqual(content.body, "")
+        self.assertEqual(get_content_body(content), image_body)
+
+    def test_migrate_single_blob_conversation(self):
+        message_map = {
+            "system": self._create_message(None, ""),
+        }
+        message_map["system"].children.append("a")
+        message_map["a"] = self._create_message("system", "Hello")
+        table = _get_table_client("user")
+        # Store with the legacy single blob layout
+        table.put_item(
+            Item={
+                "PK": "user",
+                "SK": compose_conv_id("user", "4"),
+                "Title": "Legacy Conversation",
+                "CreateTime": 1627984879,
+                "TotalPrice": 0,
+                "LastMessageId": "a",
+                "ShouldContinue": False,
+                "IsLargeMessage": False,
+                "MessageMap": json.dumps(
+                    {k: v.model_dump() for k, v in message_map.items()}
+                ),
+            }
+        )
+        # Listing does not read nor write the legacy message map
+        conversations = find_conversation_by_user_id("user")
+        self.assertEqual(conversations[0].model, "")
+        item = table.get_item(Key={"PK": "user", "SK": compose_conv_id("user", "4")})[
+            "Item"
+        ]
+        self.assertNotIn("Model", item)
+
+        found = find_conversation_by_id("user", "4")
+        self.assertEqual(found.message_map["a"].content[0].body, "Hello")
+
+        # Migrated on the first write
+        store_conversation("user", found)
+        self.assertEqual(self._count_message_items("4"), 2)
+        item = table.get_item(Key={"PK": "user", "SK": compose_conv_id("user", "4")})[
+            "Item"
+        ]
+        self.assertNotIn("MessageMap", item)
+        conversations = find_conversation_by_user_id("user")
+        self.assertEqual(conversations[0].model, "claude-instant-v1")
+
+        found = find_conversation_by_id("user", "4")
+        self.assertEqual(found.title, "Legacy Conversation")
+        self.assertEqual(found.message_map["a"].content[0].body, "Hello")
+
+    def test_update_conversation_summary(self):
+        conversation = ConversationModel(
+            id="6",
+            create_time=1627984879.9,
+            title="Test Conversation",
+            total_price=100,
+            message_map={"system": self._create_message(None, "")},
+            last_message_id="system",
+            bot_id=None,
+            should_continue=False,
+        )
+        store_conversation("user", conversation)
+        loaded = find_conversation_by_id("user", "6")
+        summary = ConversationSummaryModel(body="Summary", last_message_id="system")
+        update_conversation_summary("user", "6", summary)
+
+        # Storing the conversation loaded before the summary is written does not delete it
+        store_conversation("user", loaded)
+
+        found = find_conversation_by_id("user", "6")
+        self.assertEqual(found.summary, summary)
+
+        # Summary is kept on store
+        found.title = "Updated"
+        store_conversation("user", found)
+        self.assertEqual(find_conversation_by_id("user", "6").summary, summary)
+
+        with self.assertRaises(RecordNotFoundError):
+            update_conversation_summary("user", "not-exist", summary)
+
+    def tearDown(self) -> None:
+        delete_conversation_by_user_id("user")
+
+
 class TestConversationBotRepository(unittest.TestCase):
     def setUp(self) -> None:
         conversation1 = ConversationModel(
@@ -1,15 +1,20 @@
 import sys
 import unittest
+from unittest.mock import patch
 
 sys.path.insert(0, ".")
 
 from app.config import DEFAULT_EMBEDDING_CONFIG
 from app.repositories.custom_bot import (
+    cache_bot,
     delete_alias_by_id,
     delete_bot_by_id,
     delete_bot_publication,
+    find_aliases_by_ids,
     find_all_published_bots,
+    find_cached_bot,
     find_private_bot_by_id,
+    find_private_bots_by_ids,
     find_private_bots_by_user_id,
     find_public_bots_by_ids,
     store_alias,
@@ -39,7 +44,7 @@ from app.repositories.models.custom_bot_kb import (
 from app.repositories.models.custom_bot_kb import (
     SearchParamsModel as SearchParamsModelKB,
 )
-from app.usecases.bot import fetch_all_bots_by_user_id
+from app.usecases.bot import fetch_all_bots_by_user_id, refresh_stale_aliases
 from tests.test_repositories.utils.bot_factory import (
     create_test_private_bot,
     create_test_public_bot,
@@ -397,6 +402,22 @@ class TestFindAllBots(unittest.IsolatedAsyncioTestCase):
         expected_bot_ids = {"1", "2", "3", "4"}
         self.assertTrue(fetched_bot_ids.issubset(expected_bot_ids))
 
+    def test_find_private_bots_by_ids(self):
+        bots = find_private_bots_by_ids(
+            "user1", ["3", "1", "not-exist", "alias1"], consistent_read=True
+        )
+        # Missing bots and aliases are skipped, and the order is kept
+        self.assertEqual([bot.id for bot in bots], ["3", "1"])
+
+        bots = find_private_bots_by_ids("user1", ["public1"])
+        # Bots of other users are not found
+        self.assertEqual(len(bots), 0)
+
+    def test_find_aliases_by_ids(self):
+        aliases = find_aliases_by_ids("user1", ["alias2", "1", "alias1"])
+        self.assertEqual([alias.id for alias in aliases], ["alias2", "alias1"])
+        self.assertEqual(aliases[1].original_bot_id, "public1")
+
     async def test_find_public_bots_by_ids(self):
         bots = await find_public_bots_by_ids(["public1", "public2", "1", "2"])
         # 2 public bots and 2 private bots
@@ -485,6 +506,7 @@ class TestUpdateBotVisibility(unittest.TestCase):
         self.assertEqual(bots[2].id, "public1")
         self.assertEqual(bots[2].title, "Updated Title")
         self.assertEqual(bots[2].available, True)
+        refresh_stale_aliases()
 
         # Make private
         update_bot_visibility("user2", "public1", False)
@@ -498,5 +520,50 @@ class TestUpdateBotVisibility(unittest.TestCase):
         self.assertEqual(bots[2].available, False)
 
 
+class TestBotCache(unittest.TestCase):
+    def setUp(self) -> None:
+        self.private_bot = create_test_private_bot(
+            "private1", is_pinned=False, owner_user_id="user1"
+        )
+        self.public_bot = create_test_public_bot(
+            "public1", is_pinned=False, owner_user_id="user2"
+        )
+        store_bot("user1", self.private_bot)
+        store_bot("user2", self.public_bot)
+        update_bot_visibility("user2", "public1", True)
+
+    def tearDown(self) -> None:
+        delete_bot_by_id("user1", "private1")
+        delete_bot_by_id("user2", "public1")
+
+    def test_find_cached_bot(self):
+        self.assertIsNone(find_cached_bot("user1", "private1"))
+        bot = find_private_bot_by_id("user1", "private1")
+        cache_bot(bot)
+        self.assertIs(find_cached_bot("user1", "private1"), bot)
+        # Private bot is not served to other users
+        self.assertIsNone(find_cached_bot("user2", "private1"))
+
+    def test_validate_version_after_ttl(self):
+        bot = find_private_bot_by_id("user2", "public1")
+        self.assertEqual(bot.version, 1)
+        cache_bot(bot)
+        with patch("app.repositories.custom_bot.BOT_CACHE_TTL", 0):
+            # Version is not changed
+            self.assertIs(find_cached_bot("user3", "public1"), bot)
+
+            # Updated in another container
+            update_bot_publication("user2", "public1", "api1", "build1")
+            cache_bot(bot)
+            self.assertIsNone(find_cached_bot("user3", "public1"))
+            # Outdated bot is removed
+            self.assertIsNone(find_cached_bot("user2", "public1"))
+
+    def test_invalidate_on_update(self):
+        cache_bot(find_private_bot_by_id("user2", "public1"))
+        update_bot_visibility("user2", "public1", False)
+        self.assertIsNone(find_cached_bot("user2", "public1"))
+
+
 if __name__ == "__main__":
     unittest.main()
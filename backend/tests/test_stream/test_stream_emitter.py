@@ -0,0 +1,115 @@
+import sys
+import threading
+import unittest
+from unittest.mock import patch
+
+sys.path.append(".")
+
+from app.stream_emitter import BackgroundSender, CoalescingEmitter
+
+
+class TestCoalescingEmitter(unittest.TestCase):
+    def setUp(self) -> None:
+        self.sent: list[str] = []
+        self.now = 0.0
+        patcher = patch("app.stream_emitter.time.monotonic", lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_first_token_is_sent_immediately(self):
+        emitter = CoalescingEmitter(self.sent.append, interval_ms=50, max_size=100)
+        emitter.emit("Hello")
+        self.assertEqual(self.sent, ["Hello"])
+
+    def test_coalesce_within_interval(self):
+        emitter = CoalescingEmitter(self.sent.append, interval_ms=50, max_size=100)
+        emitter.emit("a")
+        self.now = 0.01
+        emitter.emit("b")
+        self.now = 0.02
+        emitter.emit("c")
+        self.assertEqual(self.sent, ["a"])
+
+        # Interval elapsed
+        self.now = 0.06
+        emitter.emit("d")
+        self.assertEqual(self.sent, ["a", "bcd"])
+        self.assertEqual(emitter.token_count, 4)
+        self.assertEqual(emitter.frame_count, 2)
+
+    def test_flush_on_size(self):
+        emitter = CoalescingEmitter(self.sent.append, interval_ms=50, max_size=3)
+        for token in ["a", "b", "c", "d"]:
+            emitter.emit(token)
+        self.assertEqual(self.sent, ["a", "bcd"])
+
+    def test_flush_on_stream_end(self):
+        emitter = CoalescingEmitter(self.sent.append, interval_ms=50, max_size=100)
+        emitter.emit("a")
+        emitter.emit("b")
+        emitter.flush()
+        # Nothing to send
+        emitter.flush()
+        self.assertEqual(self.sent, ["a", "b"])
+
+    def test_disabled(self):
+        emitter = CoalescingEmitter(self.sent.append, interval_ms=0, max_size=100)
+        for token in ["a", "b", "c"]:
+            emitter.emit(token)
+        self.assertEqual(self.sent, ["a", "b", "c"])
+
+
+class MockGatewayApi:
+    def __init__(self, fail_at: int | None = None):
+        self.sent: list[bytes] = []
+        self.fail_at = fail_at
+        self.release = threading.Event()
+        self.release.set()
+
+    def post_to_connection(self, ConnectionId: str, Data: bytes):
+        self.release.wait()
+        if self.fail_at is not None and len(self.sent) == self.fail_at:
+            raise Exception("GoneException")
+        self.sent.append(Data)
+
+
+class TestBackgroundSender(unittest.TestCase):
+    def test_send_in_order(self):
+        gatewayapi = MockGatewayApi()
+        sender = BackgroundSender(gatewayapi, max_queue_size=2)
+        for i in range(10):
+            sender.post_to_connection(ConnectionId="c", Data=str(i).encode())
+        sender.close()
+        self.assertEqual(gatewayapi.sent, [str(i).encode() for i in range(10)])
+        self.assertEqual(sender.sent_count, 10)
+        self.assertLessEqual(sender.max_queue_depth, 2)
+
+    def test_flush(self):
+        gatewayapi = MockGatewayApi()
+        gatewayapi.release.clear()
+        sender = BackgroundSender(gatewayapi)
+        sender.post_to_connection(ConnectionId="c", Data=b"a")
+        sender.post_to_connection(ConnectionId="c", Data=b"b")
+        # Producer is not blocked by slow sending
+        self.assertEqual(gatewayapi.sent, [])
+
+        gatewayapi.release.set()
+        sender.flush()
+        self.assertEqual(gatewayapi.sent, [b"a", b"b"])
+        sender.close()
+
+    def test_drop_frames_after_error(self):
+        gatewayapi = MockGatewayApi(fail_at=1)
+        sender = BackgroundSender(gatewayapi)
+        for data in [b"a", b"b", b"c"]:
+            sender.post_to_connection(ConnectionId="c", Data=data)
+        sender.close()
+        self.assertEqual(gatewayapi.sent, [b"a"])
+        self.assertIsNotNone(sender.error)
+
+        with self.assertRaises(RuntimeError):
+            sender.post_to_connection(ConnectionId="c", Data=b"d")
+
+
+if __name__ == "__main__":
+    unittest.main()
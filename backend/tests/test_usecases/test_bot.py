@@ -2,6 +2,7 @@ import sys
 
 sys.path.insert(0, ".")
 import unittest
+from unittest.mock import patch
 
 from pydantic import BaseModel
 
@@ -11,9 +12,11 @@ from tests.test_usecases.utils.bot_factory import (
     create_test_public_bot,
 )
 
+from app.background_task import handler as background_task_handler
 from app.repositories.custom_bot import (
     delete_alias_by_id,
     delete_bot_by_id,
+    find_alias_by_id,
     store_alias,
     store_bot,
     update_alias_last_used_time,
@@ -22,7 +25,12 @@ from app.repositories.custom_bot import (
     update_bot_visibility,
 )
 
-from app.usecases.bot import fetch_all_bots_by_user_id, issue_presigned_url
+from app.usecases.bot import (
+    fetch_all_bots_by_user_id,
+    issue_presigned_url,
+    refresh_stale_aliases,
+    request_stale_alias_refresh,
+)
 
 
 class TestIssuePresignedUrl(unittest.TestCase):
@@ -141,6 +149,43 @@ class TestFindAllBots(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(bots[4].id, self.third_bot_id)
         self.assertEqual(bots[5].id, self.first_bot_id)
 
+    def test_refresh_stale_aliases(self):
+        bots = fetch_all_bots_by_user_id(self.first_user_id, limit=6)
+        shared = [bot for bot in bots if not bot.owned]
+        self.assertEqual(len(shared), 2)
+        # Listed with the latest original bots
+        self.assertTrue(all(bot.title == "Test Public Bot" for bot in shared))
+
+        # Aliases are updated in background
+        alias = find_alias_by_id(self.first_user_id, self.first_bot_alias_id)
+        self.assertEqual(alias.title, "Test Alias")
+        refresh_stale_aliases()
+        alias = find_alias_by_id(self.first_user_id, self.first_bot_alias_id)
+        self.assertEqual(alias.title, "Test Public Bot")
+        self.assertEqual(alias.is_pinned, True)
+
+    @patch("app.usecases.bot.invoke_background_task", return_value=True)
+    def test_request_stale_alias_refresh(self, invoke_background_task):
+        fetch_all_bots_by_user_id(self.first_user_id, limit=6)
+        request_stale_alias_refresh()
+        invoke_background_task.assert_called_once()
+        task, params = invoke_background_task.call_args.args
+        self.assertEqual(task, "refresh_aliases")
+        self.assertEqual(
+            {alias["alias"]["id"] for alias in params["aliases"]},
+            {self.first_bot_alias_id, self.second_bot_alias_id},
+        )
+
+        # Not requested again while the update is pending
+        fetch_all_bots_by_user_id(self.first_user_id, limit=6)
+        request_stale_alias_refresh()
+        invoke_background_task.assert_called_once()
+
+        # Written by the background task
+        background_task_handler({"task": task, "params": params}, None)
+        alias = find_alias_by_id(self.first_user_id, self.first_bot_alias_id)
+        self.assertEqual(alias.title, "Test Public Bot")
+
 
 if __name__ == "__main__":
     unittest.main()
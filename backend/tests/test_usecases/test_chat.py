@@ -1,5 +1,8 @@
 import base64
 import sys
+import time
+from copy import deepcopy
+from unittest.mock import patch
 
 sys.path.insert(0, ".")
 import unittest
@@ -8,6 +11,7 @@ from pprint import pprint
 from app.bedrock import get_model_id
 from app.config import DEFAULT_GENERATION_CONFIG
 from app.repositories.conversation import (
+    RecordNotFoundError,
     delete_conversation_by_id,
     delete_conversation_by_user_id,
     find_conversation_by_id,
@@ -22,6 +26,7 @@ from app.repositories.custom_bot import (
 from app.repositories.models.conversation import (
     ContentModel,
     ConversationModel,
+    ConversationSummaryModel,
     MessageModel,
 )
 from app.routes.schemas.conversation import (
@@ -33,11 +38,15 @@ from app.routes.schemas.conversation import (
 )
 from app.usecases.chat import (
     chat,
+    compact_conversation,
     fetch_conversation,
     insert_knowledge,
+    prepare_conversation,
     propose_conversation_title,
+    request_conversation_compaction,
     trace_to_root,
 )
+from app.utils import StageTimer
 from app.vector_search import SearchResult
 from tests.test_stream.get_aws_logo import get_aws_logo
 from tests.test_stream.get_pdf import get_aws_overview
@@ -959,6 +968,329 @@ class TestInsertKnowledge(unittest.TestCase):
         )
         print(conversation_with_context.message_map["instruction"])
 
+    def _create_multimodal_conversation(
+        self, message_count: int
+    ) -> tuple[ConversationModel, list[SearchResult]]:
+        """Large multimodal conversation with an image in every user message."""
+        image_body = base64.b64encode(b"0" * 1024 * 1024).decode("utf-8")
+        message_map = {
+            "instruction": MessageModel(
+                role="bot",
+                content=[
+                    ContentModel(
+                        content_type="text",
+                        body="You are a helpful assistant.",
+                        media_type=None,
+                        file_name=None,
+                    )
+                ],
+                model=MODEL,
+                children=["0"],
+                parent=None,
+                create_time=1627984879.9,
+                feedback=None,
+                used_chunks=None,
+                thinking_log=None,
+            )
+        }
+        for i in range(message_count):
+            message_map[str(i)] = MessageModel(
+                role="user",
+                content=[
+                    ContentModel(
+                        content_type="image",
+                        body=image_body,
+                        media_type="image/png",
+                        file_name=None,
+                    ),
+                    ContentModel(
+                        content_type="text",
+                        body=f"Question {i}",
+                        media_type=None,
+                        file_name=None,
+                    ),
+                ],
+                model=MODEL,
+                children=[str(i + 1)] if i < message_count - 1 else [],
+                parent=str(i - 1) if i > 0 else "instruction",
+                create_time=1627984879.9,
+                feedback=None,
+                used_chunks=None,
+                thinking_log=None,
+            )
+        conversation = ConversationModel(
+            id="conversation1",
+            create_time=1627984879.9,
+            title="Test Conversation",
+            total_price=0,
+            message_map=message_map,
+            bot_id="bot1",
+            last_message_id=str(message_count - 1),
+            should_continue=False,
+        )
+        results = [
+            SearchResult(
+                bot_id="bot1",
+                content="Serverless is ...",
+                source="https://example.com",
+                rank=0,
+            )
+        ]
+
+        return conversation, results
+
+    def test_insert_knowledge_does_not_copy_messages(self):
+        conversation, results = self._create_multimodal_conversation(50)
+        conversation_with_context = insert_knowledge(conversation, results)
+
+        # Only the instruction is replaced
+        message_map_with_context = conversation_with_context.message_map
+        self.assertIn(
+            "Serverless is ...",
+            message_map_with_context["instruction"].content[0].body,  # type: ignore
+        )
+        self.assertEqual(
+            conversation.message_map["instruction"].content[0].body,
+            "You are a helpful assistant.",
+        )
+        # Other messages are shared with the original conversation
+        self.assertIsInstance(message_map_with_context, dict)
+        self.assertIsNot(message_map_with_context, conversation.message_map)
+        self.assertIs(message_map_with_context["0"], conversation.message_map["0"])
+        messages = trace_to_root(node_id="49", message_map=message_map_with_context)
+        self.assertEqual(len(messages), 51)
+        self.assertIs(messages[0], message_map_with_context["instruction"])
+
+    def test_insert_knowledge_benchmark(self):
+        conversation, results = self._create_multimodal_conversation(500)
+
+        def best_time(f) -> float:
+            timings = []
+            for _ in range(3):
+                start = time.perf_counter()
+                f()
+                timings.append(time.perf_counter() - start)
+            return min(timings)
+
+        # Previous implementation copied the whole conversation before inserting knowledge
+        deepcopy_time = best_time(lambda: deepcopy(conversation))
+        insert_time = best_time(lambda: insert_knowledge(conversation, results))
+        print(
+            f"deepcopy: {deepcopy_time * 1000:.2f}ms, insert_knowledge: {insert_time * 1000:.2f}ms"
+        )
+        self.assertLess(insert_time * 10, deepcopy_time)
+
+
+class TestCompactConversation(unittest.TestCase):
+    def setUp(self) -> None:
+        message_map = {}
+        parent = None
+        for i in range(6):
+            for role in ["user", "assistant"]:
+                message_id = f"{i}-{role}"
+                message_map[message_id] = MessageModel(
+                    role=role,
+                    content=[
+                        ContentModel(
+                            content_type="text",
+                            body=f"{role} message {i} " * 20,
+                            media_type=None,
+                            file_name=None,
+                        )
+                    ],
+                    model=MODEL,
+                    children=[],
+                    parent=parent,
+                    create_time=1627984879.9,
+                    feedback=None,
+                    used_chunks=None,
+                    thinking_log=None,
+                )
+                parent = message_id
+        self.conversation = ConversationModel(
+            id="conversation1",
+            create_time=1627984879.9,
+            title="Test Conversation",
+            total_price=0,
+            message_map=message_map,
+            last_message_id="5-assistant",
+            bot_id=None,
+            should_continue=False,
+        )
+        self.patchers = [
+            patch("app.usecases.chat.CONVERSATION_SUMMARY_THRESHOLD_TOKENS", 100),
+            patch(
+                "app.usecases.chat.call_converse_api",
+                return_value={
+                    "output": {"message": {"content": [{"text": "New summary"}]}},
+                    "usage": {"inputTokens": 100, "outputTokens": 10},
+                },
+            ),
+            patch("app.usecases.chat.update_conversation_summary"),
+        ]
+        mocks = [p.start() for p in self.patchers]
+        self.call_converse_api = mocks[1]
+        self.update_conversation_summary = mocks[2]
+
+    def tearDown(self) -> None:
+        for p in self.patchers:
+            p.stop()
+
+    def test_summarize_aged_out_turns(self):
+        summary = compact_conversation("user1", self.conversation)
+        # The most recent 6 messages are kept
+        self.assertEqual(summary.last_message_id, "2-assistant")  # type: ignore
+        self.assertEqual(summary.body, "New summary")  # type: ignore
+        self.update_conversation_summary.assert_called_once_with(
+            "user1", "conversation1", summary
+        )
+
+    def test_summarize_incrementally(self):
+        self.conversation.summary = ConversationSummaryModel(
+            body="Old summary", last_message_id="0-assistant"
+        )
+        summary = compact_conversation("user1", self.conversation)
+        self.assertEqual(summary.last_message_id, "2-assistant")  # type: ignore
+
+        prompt = self.call_converse_api.call_args.args[0]["messages"][0]["content"][0][
+            "text"
+        ]
+        self.assertIn("Old summary", prompt)
+        self.assertNotIn("message 0", prompt)
+        self.assertIn("message 1", prompt)
+        self.assertNotIn("message 3", prompt)
+
+    def test_below_threshold(self):
+        self.conversation.summary = ConversationSummaryModel(
+            body="Old summary", last_message_id="3-assistant"
+        )
+        self.assertIsNone(compact_conversation("user1", self.conversation))
+        self.call_converse_api.assert_not_called()
+
+    @patch("app.usecases.chat.invoke_background_task", return_value=True)
+    def test_request_compaction_in_background(self, invoke_background_task):
+        self.assertTrue(request_conversation_compaction("user1", self.conversation))
+        invoke_background_task.assert_called_once_with(
+            "compact_conversation",
+            {"user_id": "user1", "conversation_id": "conversation1"},
+        )
+        # Summarized by the background task, not in the request
+        self.call_converse_api.assert_not_called()
+
+    @patch("app.usecases.chat.invoke_background_task", return_value=True)
+    def test_request_compaction_below_threshold(self, invoke_background_task):
+        self.conversation.summary = ConversationSummaryModel(
+            body="Old summary", last_message_id="3-assistant"
+        )
+        self.assertFalse(request_conversation_compaction("user1", self.conversation))
+        invoke_background_task.assert_not_called()
+
+    @patch("app.usecases.chat.invoke_background_task", return_value=False)
+    def test_request_compaction_without_background_function(
+        self, invoke_background_task
+    ):
+        self.assertTrue(request_conversation_compaction("user1", self.conversation))
+        # Local development runs the compaction in the process
+        self.update_conversation_summary.assert_called_once()
+
+
+class TestPrepareConversation(unittest.TestCase):
+    def setUp(self) -> None:
+        self.bot = create_test_private_bot("bot1", False, "user1")
+
+        def find_conversation_by_id(user_id, conversation_id):
+            time.sleep(0.2)
+            raise RecordNotFoundError()
+
+        def fetch_bot(user_id, bot_id):
+            time.sleep(0.1)
+            return True, self.bot
+
+        def search_related_docs(bot, query):
+            time.sleep(0.1)
+            return [
+                SearchResult(
+                    bot_id="bot1",
+                    content="content",
+                    source="source",
+                    rank=0,
+                )
+            ]
+
+        self.patchers = [
+            patch(
+                "app.usecases.chat.find_conversation_by_id",
+                side_effect=find_conversation_by_id,
+            ),
+            patch("app.usecases.chat.fetch_bot", side_effect=fetch_bot),
+            patch(
+                "app.usecases.chat.search_related_docs",
+                side_effect=search_related_docs,
+            ),
+        ]
+        mocks = [p.start() for p in self.patchers]
+        self.search_related_docs = mocks[2]
+        self.chat_input = ChatInput(
+            conversation_id="conversation1",
+            message=MessageInput(
+                role="user",
+                content=[
+                    Content(
+                        content_type="text",
+                        body="Hello",
+                        media_type=None,
+                        file_name=None,
+                    )
+                ],
+                model=MODEL,
+                parent_message_id=None,
+                message_id=None,
+            ),
+            bot_id="bot1",
+            continue_generate=False,
+        )
+
+    def tearDown(self) -> None:
+        for p in self.patchers:
+            p.stop()
+
+    def test_fetch_bot_and_search_concurrently(self):
+        timer = StageTimer()
+        start = time.perf_counter()
+        _, conversation, bot, search_results = prepare_conversation(
+            "user1", self.chat_input, search_knowledge=True, timer=timer
+        )
+        elapsed = time.perf_counter() - start
+
+        self.assertEqual(bot, self.bot)
+        self.assertEqual(len(search_results), 1)
+        self.assertIn("instruction", conversation.message_map)
+        self.search_related_docs.assert_called_once_with(bot=self.bot, query="Hello")
+        self.assertEqual(
+            set(timer.timings), {"load_conversation", "fetch_bot", "search_knowledge"}
+        )
+        # Fetching bot and searching overlap with loading conversation (0.2 + 0.1 + 0.1 in serial)
+        self.assertLess(elapsed, 0.35)
+
+    def test_notify_before_search(self):
+        events = []
+        self.search_related_docs.side_effect = (
+            lambda bot, query: events.append("search") or []
+        )
+        prepare_conversation(
+            "user1",
+            self.chat_input,
+            search_knowledge=True,
+            on_fetching_knowledge=lambda: events.append("fetching_knowledge"),
+        )
+        self.assertEqual(events, ["fetching_knowledge", "search"])
+
+    def test_without_search(self):
+        _, _, bot, search_results = prepare_conversation("user1", self.chat_input)
+        self.assertEqual(bot, self.bot)
+        self.assertEqual(search_results, [])
+        self.search_related_docs.assert_not_called()
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -1,6 +1,8 @@
+import json
 import logging
 import sys
 import unittest
+from unittest.mock import MagicMock, patch
 
 LOGGER = logging.getLogger(__name__)
 LOGGER.setLevel(logging.DEBUG)
@@ -40,5 +42,78 @@ class TestUtils(unittest.TestCase):
         assert reg == "us-west-2"
 
 
+class TestPostgresConnectionPool(unittest.TestCase):
+    def setUp(self) -> None:
+        patcher_secret = patch(
+            "app.utils.parameters.get_secret",
+            return_value=json.dumps(
+                {
+                    "dbname": "db",
+                    "host": "localhost",
+                    "port": 5432,
+                    "username": "user",
+                    "password": "password",
+                }
+            ),
+        )
+        patcher_secret.start()
+        self.addCleanup(patcher_secret.stop)
+
+    def test_connection_is_reused(self):
+        from app.utils import PostgresConnectionPool
+
+        pool = PostgresConnectionPool(max_idle=1)
+        with patch("app.utils.pg8000.connect", return_value=MagicMock()) as connect:
+            for _ in range(3):
+                pool.run(lambda pooled: pooled.prepare("SELECT :x").run(x=1))
+            self.assertEqual(connect.call_count, 1)
+            # Statement is prepared only once per connection
+            conn = connect.return_value
+            self.assertEqual(conn.prepare.call_count, 1)
+
+    def test_reconnect_on_broken_connection(self):
+        import pg8000
+        from app.utils import PostgresConnectionPool
+
+        pool = PostgresConnectionPool(max_idle=1)
+        calls = []
+
+        def func(pooled):
+            calls.append(pooled)
+            if len(calls) == 1:
+                raise pg8000.exceptions.InterfaceError("connection is closed")
+            return "ok"
+
+        with patch(
+            "app.utils.pg8000.connect", side_effect=[MagicMock(), MagicMock()]
+        ) as connect:
+            self.assertEqual(pool.run(func), "ok")
+            self.assertEqual(connect.call_count, 2)
+            calls[0].conn.close.assert_called_once()
+
+
+class TestInvokeBackgroundTask(unittest.TestCase):
+    @patch("app.utils.boto3.client")
+    def test_invoke_asynchronously(self, client):
+        from app.utils import invoke_background_task
+
+        with patch("app.utils.BACKGROUND_TASK_FUNCTION_NAME", "background"):
+            self.assertTrue(invoke_background_task("task", {"key": "value"}))
+        kwargs = client.return_value.invoke.call_args.kwargs
+        self.assertEqual(kwargs["FunctionName"], "background")
+        self.assertEqual(kwargs["InvocationType"], "Event")
+        self.assertEqual(
+            json.loads(kwargs["Payload"]), {"task": "task", "params": {"key": "value"}}
+        )
+
+    @patch("app.utils.boto3.client")
+    def test_not_configured(self, client):
+        from app.utils import invoke_background_task
+
+        with patch("app.utils.BACKGROUND_TASK_FUNCTION_NAME", ""):
+            self.assertFalse(invoke_background_task("task", {}))
+        client.assert_not_called()
+
+
 if __name__ == "__main__":
     unittest.main()
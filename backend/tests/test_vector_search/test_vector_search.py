@@ -3,7 +3,13 @@ import unittest
 
 sys.path.append(".")
 
-from app.vector_search import SearchResult, filter_used_results
+from app.repositories.models.custom_bot_kb import (
+    BedrockKnowledgeBaseModel,
+    OpenSearchParamsModel,
+    SearchParamsModel,
+)
+from app.vector_search import RetrievalCache, SearchResult, filter_used_results
+from tests.test_usecases.utils.bot_factory import create_test_private_bot
 
 
 class TestVectorSearch(unittest.TestCase):
@@ -48,5 +54,59 @@ class TestVectorSearch(unittest.TestCase):
         self.assertEqual(len(used_results), 0)
 
 
+class TestRetrievalCache(unittest.TestCase):
+    def setUp(self) -> None:
+        self.bot = create_test_private_bot(
+            "bot1", False, "user1", sync_status="SUCCEEDED"
+        )
+        self.results = [
+            SearchResult(bot_id="bot1", content="content1", source="source1", rank=0)
+        ]
+
+    def test_hit(self):
+        cache = RetrievalCache(max_size=10)
+        self.assertIsNone(cache.get(self.bot, "question"))
+        cache.put(self.bot, "question", self.results)
+        self.assertEqual(cache.get(self.bot, "  question "), self.results)
+
+    def test_invalidated_by_sync(self):
+        cache = RetrievalCache(max_size=10)
+        cache.put(self.bot, "question", self.results)
+
+        synced = self.bot.model_copy(
+            update={"sync_last_exec_id": "new-exec-id", "version": self.bot.version + 2}
+        )
+        self.assertIsNone(cache.get(synced, "question"))
+
+    def test_invalidated_by_knowledge_base_sync(self):
+        bot = create_test_private_bot(
+            "bot1",
+            False,
+            "user1",
+            sync_status="SUCCEEDED",
+            bedrock_knowledge_base=BedrockKnowledgeBaseModel(
+                embeddings_model="titan_v2",
+                open_search=OpenSearchParamsModel(analyzer=None),
+                chunking_strategy="default",
+                search_params=SearchParamsModel(max_results=20, search_type="hybrid"),
+            ),
+        )
+        cache = RetrievalCache(max_size=10)
+        cache.put(bot, "question", self.results)
+
+        # Knowledge base sync does not update the last execution id (RUNNING -> SUCCEEDED)
+        synced = bot.model_copy(update={"version": bot.version + 2})
+        self.assertEqual(synced.sync_last_exec_id, bot.sync_last_exec_id)
+        self.assertIsNone(cache.get(synced, "question"))
+
+    def test_search_params_are_part_of_key(self):
+        cache = RetrievalCache(max_size=10)
+        cache.put(self.bot, "question", self.results)
+
+        changed = self.bot.model_copy(deep=True)
+        changed.search_params.max_results = 5
+        self.assertIsNone(cache.get(changed, "question"))
+
+
 if __name__ == "__main__":
     unittest.main()
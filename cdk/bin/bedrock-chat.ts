@@ -53,6 +53,15 @@ const EMBEDDING_CONTAINER_MEMORY: number = app.node.tryGetContext(
 // how many nat gateways
 const NATGATEWAY_COUNT: number = app.node.tryGetContext("natgatewayCount");
 
+// max time in milliseconds to buffer streamed tokens before sending them to the client
+const STREAMING_FLUSH_INTERVAL_MS: number | undefined = app.node.tryGetContext(
+  "streamingFlushIntervalMs"
+);
+
+// estimated tokens of a conversation to start summarizing older turns. 0 disables it
+const CONVERSATION_SUMMARY_THRESHOLD_TOKENS: number | undefined =
+  app.node.tryGetContext("conversationSummaryThresholdTokens");
+
 // WAF for frontend
 // 2023/9: Currently, the WAF for CloudFront needs to be created in the North America region (us-east-1), so the stacks are separated
 // https://docs.aws.amazon.com/AWSCloudFormation/latest/UserGuide/aws-resource-wafv2-webacl.html
@@ -89,5 +98,7 @@ const chat = new BedrockChatStack(app, `BedrockChatStack`, {
   embeddingContainerMemory: EMBEDDING_CONTAINER_MEMORY,
   selfSignUpEnabled: SELF_SIGN_UP_ENABLED,
   natgatewayCount: NATGATEWAY_COUNT,
+  streamingFlushIntervalMs: STREAMING_FLUSH_INTERVAL_MS,
+  conversationSummaryThresholdTokens: CONVERSATION_SUMMARY_THRESHOLD_TOKENS,
 });
 chat.addDependency(waf);
@@ -42,6 +42,8 @@ export interface BedrockChatStackProps extends StackProps {
   readonly selfSignUpEnabled: boolean;
   readonly enableIpV6: boolean;
   readonly natgatewayCount: number;
+  readonly streamingFlushIntervalMs?: number;
+  readonly conversationSummaryThresholdTokens?: number;
 }
 
 export class BedrockChatStack extends cdk.Stack {
@@ -191,7 +193,10 @@ export class BedrockChatStack extends cdk.Stack {
       bedrockKnowledgeBaseProject: bedrockKnowledgeBaseCodebuild.project,
       usageAnalysis,
       largeMessageBucket,
+      cacheTable: database.cacheTable,
       enableMistral: props.enableMistral,
+      conversationSummaryThresholdTokens:
+        props.conversationSummaryThresholdTokens,
     });
     documentBucket.grantReadWrite(backendApi.handler);
 
@@ -207,7 +212,12 @@ export class BedrockChatStack extends cdk.Stack {
       bedrockRegion: props.bedrockRegion,
       largeMessageBucket,
       documentBucket,
+      cacheTable: database.cacheTable,
       enableMistral: props.enableMistral,
+      streamingFlushIntervalMs: props.streamingFlushIntervalMs,
+      conversationSummaryThresholdTokens:
+        props.conversationSummaryThresholdTokens,
+      backgroundTaskHandler: backendApi.backgroundTaskHandler,
     });
     frontend.buildViteApp({
       backendApiEndpoint: backendApi.api.apiEndpoint,
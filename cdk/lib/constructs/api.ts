@@ -35,15 +35,18 @@ export interface ApiProps {
   readonly tableAccessRole: iam.IRole;
   readonly documentBucket: IBucket;
   readonly largeMessageBucket: IBucket;
+  readonly cacheTable: ITable;
   readonly apiPublishProject: codebuild.IProject;
   readonly bedrockKnowledgeBaseProject: codebuild.IProject;
   readonly usageAnalysis?: UsageAnalysis;
   readonly enableMistral: boolean;
+  readonly conversationSummaryThresholdTokens?: number;
 }
 
 export class Api extends Construct {
   readonly api: HttpApi;
   readonly handler: IFunction;
+  readonly backgroundTaskHandler: IFunction;
   constructor(scope: Construct, id: string, props: ApiProps) {
     super(scope, id);
 
@@ -173,6 +176,45 @@ export class Api extends Construct {
     props.usageAnalysis?.resultOutputBucket.grantReadWrite(handlerRole);
     props.usageAnalysis?.ddbBucket.grantRead(handlerRole);
     props.largeMessageBucket.grantReadWrite(handlerRole);
+    props.cacheTable.grantReadWriteData(handlerRole);
+
+    // Runs tasks out of the request path, e.g. conversation compaction.
+    // Invoked asynchronously by the API and WebSocket handlers.
+    const backgroundTaskHandler = new DockerImageFunction(
+      this,
+      "BackgroundTaskHandler",
+      {
+        code: DockerImageCode.fromImageAsset(
+          path.join(__dirname, "../../../backend"),
+          {
+            platform: Platform.LINUX_AMD64,
+            file: "lambda.Dockerfile",
+            cmd: ["app.background_task.handler"],
+            exclude: [...excludeDockerImage],
+          }
+        ),
+        vpc: props.vpc,
+        vpcSubnets: { subnetType: ec2.SubnetType.PRIVATE_WITH_EGRESS },
+        memorySize: 512,
+        timeout: Duration.minutes(5),
+        environment: {
+          TABLE_NAME: database.tableName,
+          ACCOUNT: Stack.of(this).account,
+          REGION: Stack.of(this).region,
+          BEDROCK_REGION: props.bedrockRegion,
+          TABLE_ACCESS_ROLE_ARN: tableAccessRole.roleArn,
+          LARGE_MESSAGE_BUCKET: props.largeMessageBucket.bucketName,
+          SHARED_CACHE_TABLE_NAME: props.cacheTable.tableName,
+          ENABLE_MISTRAL: props.enableMistral.toString(),
+          ...(props.conversationSummaryThresholdTokens !== undefined && {
+            CONVERSATION_SUMMARY_THRESHOLD_TOKENS:
+              props.conversationSummaryThresholdTokens.toString(),
+          }),
+        },
+        role: handlerRole,
+      }
+    );
+    backgroundTaskHandler.grantInvoke(handlerRole);
 
     const handler = new DockerImageFunction(this, "Handler", {
       code: DockerImageCode.fromImageAsset(
@@ -201,6 +243,7 @@ export class Api extends Construct {
         DB_SECRETS_ARN: props.dbSecrets.secretArn,
         DOCUMENT_BUCKET: props.documentBucket.bucketName,
         LARGE_MESSAGE_BUCKET: props.largeMessageBucket.bucketName,
+        SHARED_CACHE_TABLE_NAME: props.cacheTable.tableName,
         PUBLISH_API_CODEBUILD_PROJECT_NAME: props.apiPublishProject.projectName,
         KNOWLEDGE_BASE_CODEBUILD_PROJECT_NAME:
           props.bedrockKnowledgeBaseProject.projectName,
@@ -211,6 +254,11 @@ export class Api extends Construct {
         USAGE_ANALYSIS_WORKGROUP: props.usageAnalysis?.workgroupName || "",
         USAGE_ANALYSIS_OUTPUT_LOCATION: usageAnalysisOutputLocation,
         ENABLE_MISTRAL: props.enableMistral.toString(),
+        BACKGROUND_TASK_FUNCTION_NAME: backgroundTaskHandler.functionName,
+        ...(props.conversationSummaryThresholdTokens !== undefined && {
+          CONVERSATION_SUMMARY_THRESHOLD_TOKENS:
+            props.conversationSummaryThresholdTokens.toString(),
+        }),
       },
       role: handlerRole,
     });
@@ -258,6 +306,7 @@ export class Api extends Construct {
 
     this.api = api;
     this.handler = handler;
+    this.backgroundTaskHandler = backgroundTaskHandler;
 
     new CfnOutput(this, "BackendApiUrl", { value: api.apiEndpoint });
   }
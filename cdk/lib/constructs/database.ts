@@ -17,6 +17,7 @@ export class Database extends Construct {
   readonly table: Table;
   readonly tableAccessRole: Role;
   readonly websocketSessionTable: Table;
+  readonly cacheTable: Table;
 
   constructor(scope: Construct, id: string, props?: DatabaseProps) {
     super(scope, id);
@@ -67,9 +68,19 @@ export class Database extends Construct {
       timeToLiveAttribute: "expire",
     });
 
+    // Cache table shared by all backend functions.
+    // Used to cache query embeddings and search results.
+    const cacheTable = new Table(this, "CacheTable", {
+      partitionKey: { name: "CacheKey", type: AttributeType.STRING },
+      billingMode: BillingMode.PAY_PER_REQUEST,
+      removalPolicy: RemovalPolicy.DESTROY,
+      timeToLiveAttribute: "expire",
+    });
+
     this.table = table;
     this.tableAccessRole = tableAccessRole;
     this.websocketSessionTable = websocketSessionTable;
+    this.cacheTable = cacheTable;
 
     new CfnOutput(this, "ConversationTableName", {
       value: table.tableName,
@@ -85,10 +85,64 @@ export class UsageAnalysis extends Construct {
         name: "MessageMap",
         type: glue.Schema.struct([{ name: "S", type: glue.Schema.STRING }]),
       },
+      {
+        name: "MessageId",
+        type: glue.Schema.struct([{ name: "S", type: glue.Schema.STRING }]),
+      },
+      // Message item: JSON string when smaller than 1KB
+      {
+        name: "Message",
+        type: glue.Schema.struct([{ name: "S", type: glue.Schema.STRING }]),
+      },
+      // Message item: base64 encoded gzip compressed JSON when 1KB or larger
+      {
+        name: "MessageData",
+        type: glue.Schema.struct([{ name: "B", type: glue.Schema.STRING }]),
+      },
+      {
+        name: "MessageFormatVersion",
+        type: glue.Schema.struct([{ name: "N", type: glue.Schema.STRING }]),
+      },
+      {
+        name: "Feedback",
+        type: glue.Schema.struct([
+          {
+            name: "M",
+            type: glue.Schema.struct([
+              {
+                name: "thumbs_up",
+                type: glue.Schema.struct([
+                  { name: "BOOL", type: glue.Schema.BOOLEAN },
+                ]),
+              },
+              {
+                name: "category",
+                type: glue.Schema.struct([
+                  { name: "S", type: glue.Schema.STRING },
+                ]),
+              },
+              {
+                name: "comment",
+                type: glue.Schema.struct([
+                  { name: "S", type: glue.Schema.STRING },
+                ]),
+              },
+            ]),
+          },
+        ]),
+      },
       {
         name: "IsLargeMessage",
         type: glue.Schema.struct([{ name: "BOOL", type: glue.Schema.BOOLEAN }]),
       },
+      {
+        name: "LargeMessagePath",
+        type: glue.Schema.struct([{ name: "S", type: glue.Schema.STRING }]),
+      },
+      {
+        name: "Model",
+        type: glue.Schema.struct([{ name: "S", type: glue.Schema.STRING }]),
+      },
       {
         name: "PK",
         type: glue.Schema.struct([{ name: "S", type: glue.Schema.STRING }]),
@@ -31,8 +31,12 @@ export interface WebSocketProps {
   readonly documentBucket: s3.IBucket;
   readonly websocketSessionTable: ITable;
   readonly largeMessageBucket: s3.IBucket;
+  readonly cacheTable: ITable;
   readonly accessLogBucket?: s3.Bucket;
   readonly enableMistral: boolean;
+  readonly streamingFlushIntervalMs?: number;
+  readonly conversationSummaryThresholdTokens?: number;
+  readonly backgroundTaskHandler: IFunction;
 }
 
 export class WebSocket extends Construct {
@@ -86,7 +90,9 @@ export class WebSocket extends Construct {
     largePayloadSupportBucket.grantRead(handlerRole);
     props.websocketSessionTable.grantReadWriteData(handlerRole);
     props.largeMessageBucket.grantReadWrite(handlerRole);
+    props.cacheTable.grantReadWriteData(handlerRole);
     props.documentBucket.grantRead(handlerRole);
+    props.backgroundTaskHandler.grantInvoke(handlerRole);
 
     const handler = new DockerImageFunction(this, "Handler", {
       code: DockerImageCode.fromImageAsset(
@@ -115,7 +121,16 @@ export class WebSocket extends Construct {
         DB_SECRETS_ARN: props.dbSecrets.secretArn,
         LARGE_PAYLOAD_SUPPORT_BUCKET: largePayloadSupportBucket.bucketName,
         WEBSOCKET_SESSION_TABLE_NAME: props.websocketSessionTable.tableName,
+        SHARED_CACHE_TABLE_NAME: props.cacheTable.tableName,
         ENABLE_MISTRAL: props.enableMistral.toString(),
+        BACKGROUND_TASK_FUNCTION_NAME: props.backgroundTaskHandler.functionName,
+        ...(props.streamingFlushIntervalMs !== undefined && {
+          STREAMING_FLUSH_INTERVAL_MS: props.streamingFlushIntervalMs.toString(),
+        }),
+        ...(props.conversationSummaryThresholdTokens !== undefined && {
+          CONVERSATION_SUMMARY_THRESHOLD_TOKENS:
+            props.conversationSummaryThresholdTokens.toString(),
+        }),
       },
       role: handlerRole,
     });
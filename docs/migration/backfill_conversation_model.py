@@ -0,0 +1,54 @@
+import json
+
+import boto3
+
+# Set `Model` of conversations stored in the single blob layout (`MessageMap`), which is read by
+# the conversation listing. Until a conversation is written again, it is listed with an empty model.
+# Run this script once right after deploying the per-message layout. It can be run again safely.
+# See: ./DATABASE_MIGRATION.md#conversation-model-backfill
+
+# Open the CloudFormation stack in the AWS Management Console and copy the values from the Outputs tab.
+# Key: ConversationTableName
+TABLE_NAME = "BedrockChatStack-DatabaseConversationTableXXXXX"
+# Key: LargeMessageBucketName
+LARGE_MESSAGE_BUCKET = "bedrockchatstack-largemessagebucketxxxxx"
+
+dynamodb = boto3.resource("dynamodb")
+table = dynamodb.Table(TABLE_NAME)
+s3 = boto3.client("s3")
+
+scan_kwargs = {
+    "FilterExpression": "contains(SK, :substring) AND attribute_exists(MessageMap) AND attribute_not_exists(Model)",
+    "ExpressionAttributeValues": {":substring": "#CONV#"},
+}
+
+count = 0
+while True:
+    response = table.scan(**scan_kwargs)
+
+    for item in response["Items"]:
+        if item.get("IsLargeMessage", False):
+            message_map = json.loads(
+                s3.get_object(
+                    Bucket=LARGE_MESSAGE_BUCKET, Key=item["LargeMessagePath"]
+                )["Body"].read()
+            )
+        else:
+            message_map = json.loads(item["MessageMap"])
+
+        # NOTE: all message has the same model
+        model = message_map.get("system", {}).get("model", "")
+        table.update_item(
+            Key={"PK": item["PK"], "SK": item["SK"]},
+            UpdateExpression="set Model = :m",
+            ExpressionAttributeValues={":m": model},
+            ConditionExpression="attribute_exists(PK) AND attribute_exists(SK)",
+        )
+        count += 1
+        print(f"  - {item['SK']}: {model}")
+
+    if "LastEvaluatedKey" not in response:
+        break
+    scan_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+print(f"Updated {count} conversations.")
@@ -62,6 +62,10 @@ export type SearchParams = {
   maxResults: number;
 };
 
+export type HistoryParams = {
+  maxInputTokens: number;
+};
+
 export type BotDetails = BotMeta & {
   instruction: string;
   embeddingParams: EmdeddingParams;
@@ -73,6 +77,7 @@ export type BotDetails = BotMeta & {
   displayRetrievedChunks: boolean;
   conversationQuickStarters: ConversationQuickStarter[];
   bedrockKnowledgeBase: BedrockKnowledgeBase | null;
+  historyParams?: HistoryParams | null;
 };
 
 export type BotSummary = BotMeta & {
@@ -102,6 +107,7 @@ export type RegisterBotRequest = {
   displayRetrievedChunks: boolean;
   conversationQuickStarters: ConversationQuickStarter[];
   bedrockKnowledgeBase?: BedrockKnowledgeBase;
+  historyParams?: HistoryParams | null;
 };
 
 export type RegisterBotResponse = BotDetails;
@@ -118,6 +124,7 @@ export type UpdateBotRequest = {
   displayRetrievedChunks: boolean;
   conversationQuickStarters: ConversationQuickStarter[];
   bedrockKnowledgeBase?: BedrockKnowledgeBase;
+  historyParams?: HistoryParams | null;
 };
 
 export type UpdateBotResponse = {
@@ -132,6 +139,7 @@ export type UpdateBotResponse = {
   displayRetrievedChunks: boolean;
   conversationQuickStarters: ConversationQuickStarter[];
   bedrockKnowledgeBase: BedrockKnowledgeBase;
+  historyParams?: HistoryParams | null;
 };
 
 export type UpdateBotPinnedRequest = {
@@ -109,6 +109,7 @@ export type Direction =
   (typeof TooltipDirection)[keyof typeof TooltipDirection];
 
 export const PostStreamingStatus = {
+  SINGLE: 'SINGLE',
   START: 'START',
   BODY: 'BODY',
   FETCHING_KNOWLEDGE: 'FETCHING_KNOWLEDGE',
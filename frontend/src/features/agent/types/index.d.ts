@@ -1,5 +1,6 @@
 export type AgentInput = {
   tools: string[];
+  knowledgeRetrievalOnly?: boolean;
 };
 
 export type AgentTool = {
@@ -9,4 +10,5 @@ export type AgentTool = {
 
 export type Agent = {
   tools: AgentTool[];
+  knowledgeRetrievalOnly?: boolean;
 };
@@ -13,7 +13,11 @@ import Alert from '../../../components/Alert';
 import KnowledgeFileUploader from '../../../components/KnowledgeFileUploader';
 import GenerationConfig from '../../../components/GenerationConfig';
 import Select from '../../../components/Select';
-import { BotFile, ConversationQuickStarter } from '../../../@types/bot';
+import {
+  BotFile,
+  ConversationQuickStarter,
+  HistoryParams,
+} from '../../../@types/bot';
 
 import { ulid } from 'ulid';
 import {
@@ -78,6 +82,10 @@ const BotKbEditPage: React.FC = () => {
   const [unchangedFilenames, setUnchangedFilenames] = useState<string[]>([]);
   const [deletedFilenames, setDeletedFilenames] = useState<string[]>([]);
   const [displayRetrievedChunks, setDisplayRetrievedChunks] = useState(true);
+  // Not editable on this page, but kept not to be cleared on update
+  const [historyParams, setHistoryParams] = useState<HistoryParams | null>(
+    null
+  );
   const [maxTokens, setMaxTokens] = useState<number>(
     defaultGenerationConfig.maxTokens
   );
@@ -90,6 +98,7 @@ const BotKbEditPage: React.FC = () => {
     defaultGenerationConfig.stopSequences?.join(',') || ''
   );
   const [tools, setTools] = useState<AgentTool[]>([]);
+  const [knowledgeRetrievalOnly, setKnowledgeRetrievalOnly] = useState(false);
   const [conversationQuickStarters, setConversationQuickStarters] = useState<
     ConversationQuickStarter[]
   >([
@@ -236,6 +245,7 @@ const BotKbEditPage: React.FC = () => {
           }
 
           setTools(bot.agent.tools);
+          setKnowledgeRetrievalOnly(bot.agent.knowledgeRetrievalOnly ?? false);
           setTitle(bot.title);
           setDescription(bot.description);
           setInstruction(bot.instruction);
@@ -260,6 +270,7 @@ const BotKbEditPage: React.FC = () => {
           setStopSequences(bot.generationParams.stopSequences.join(','));
           setUnchangedFilenames([...bot.knowledge.filenames]);
           setDisplayRetrievedChunks(bot.displayRetrievedChunks);
+          setHistoryParams(bot.historyParams ?? null);
           if (bot.syncStatus === 'FAILED') {
             setErrorMessages(
               isSyncChunkError(bot.syncStatusReason)
@@ -717,6 +728,7 @@ const BotKbEditPage: React.FC = () => {
       updateBot(botId, {
         agent: {
           tools: tools.map(({ name }) => name),
+          knowledgeRetrievalOnly,
         },
         title,
         description,
@@ -746,6 +758,7 @@ const BotKbEditPage: React.FC = () => {
         conversationQuickStarters: conversationQuickStarters.filter(
           (qs) => qs.title !== '' && qs.example !== ''
         ),
+        historyParams,
         bedrockKnowledgeBase: {
           knowledgeBaseId,
           embeddingsModel,
@@ -787,6 +800,8 @@ const BotKbEditPage: React.FC = () => {
     unchangedFilenames,
     displayRetrievedChunks,
     conversationQuickStarters,
+    historyParams,
+    knowledgeRetrievalOnly,
     navigate,
     knowledgeBaseId,
     embeddingsModel,
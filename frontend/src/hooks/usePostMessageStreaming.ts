@@ -7,6 +7,8 @@ import { PostStreamingStatus } from '../constants';
 
 const WS_ENDPOINT: string = import.meta.env.VITE_APP_WS_ENDPOINT;
 const CHUNK_SIZE = 32 * 1024; //32KB
+// Max size of the message sent as a single frame. Leave some margin to the 32KB frame limit.
+const SINGLE_FRAME_MAX_BYTES = 31 * 1024;
 
 const usePostMessageStreaming = create<{
   post: (params: {
@@ -29,6 +31,15 @@ const usePostMessageStreaming = create<{
         token,
       });
 
+      // Small payload is sent as a single frame without chunking
+      const singleFrame = JSON.stringify({
+        step: PostStreamingStatus.SINGLE,
+        token,
+        payload: input,
+      });
+      const isSingleFrame =
+        new TextEncoder().encode(singleFrame).length <= SINGLE_FRAME_MAX_BYTES;
+
       // chunking
       const chunkedPayloads: string[] = [];
       const chunkCount = Math.ceil(payloadString.length / CHUNK_SIZE);
@@ -44,6 +55,10 @@ const usePostMessageStreaming = create<{
         const ws = new WebSocket(WS_ENDPOINT);
 
         ws.onopen = () => {
+          if (isSingleFrame) {
+            ws.send(singleFrame);
+            return;
+          }
           ws.send(
             JSON.stringify({
               step: PostStreamingStatus.START,
@@ -94,6 +109,11 @@ const usePostMessageStreaming = create<{
                   dispatch(i18next.t('bot.label.retrievingKnowledge'));
                   break;
                 case PostStreamingStatus.AGENT_THINKING:
+                  // Text streamed before using tools is not a part of the answer
+                  if (completion !== '') {
+                    completion = '';
+                    dispatch(i18next.t('app.chatWaitingSymbol'));
+                  }
                   Object.entries(data.log).forEach(([toolUseId, toolInfo]) => {
                     const typedToolInfo = toolInfo as {
                       name: string;
@@ -16,6 +16,7 @@ import {
   BotFile,
   ConversationQuickStarter,
   EmdeddingParams,
+  HistoryParams,
   SearchParams,
 } from '../@types/bot';
 
@@ -73,6 +74,10 @@ const BotEditPage: React.FC = () => {
   const [unchangedFilenames, setUnchangedFilenames] = useState<string[]>([]);
   const [deletedFilenames, setDeletedFilenames] = useState<string[]>([]);
   const [displayRetrievedChunks, setDisplayRetrievedChunks] = useState(true);
+  // Not editable on this page, but kept not to be cleared on update
+  const [historyParams, setHistoryParams] = useState<HistoryParams | null>(
+    null
+  );
   const [maxTokens, setMaxTokens] = useState<number>(
     defaultGenerationConfig.maxTokens
   );
@@ -88,6 +93,7 @@ const BotEditPage: React.FC = () => {
     DEFAULT_SEARCH_CONFIG
   );
   const [tools, setTools] = useState<AgentTool[]>([]);
+  const [knowledgeRetrievalOnly, setKnowledgeRetrievalOnly] = useState(false);
   const [conversationQuickStarters, setConversationQuickStarters] = useState<
     ConversationQuickStarter[]
   >([
@@ -123,6 +129,7 @@ const BotEditPage: React.FC = () => {
           }
 
           setTools(bot.agent.tools);
+          setKnowledgeRetrievalOnly(bot.agent.knowledgeRetrievalOnly ?? false);
           setTitle(bot.title);
           setDescription(bot.description);
           setInstruction(bot.instruction);
@@ -146,6 +153,7 @@ const BotEditPage: React.FC = () => {
           setStopSequences(bot.generationParams.stopSequences.join(','));
           setUnchangedFilenames([...bot.knowledge.filenames]);
           setDisplayRetrievedChunks(bot.displayRetrievedChunks);
+          setHistoryParams(bot.historyParams ?? null);
           if (bot.syncStatus === 'FAILED') {
             setErrorMessages(
               isSyncChunkError(bot.syncStatusReason)
@@ -534,6 +542,7 @@ const BotEditPage: React.FC = () => {
       updateBot(botId, {
         agent: {
           tools: tools.map(({ name }) => name),
+          knowledgeRetrievalOnly,
         },
         title,
         description,
@@ -564,6 +573,7 @@ const BotEditPage: React.FC = () => {
         conversationQuickStarters: conversationQuickStarters.filter(
           (qs) => qs.title !== '' && qs.example !== ''
         ),
+        historyParams,
       })
         .then(() => {
           navigate('/bot/explore');
@@ -596,6 +606,8 @@ const BotEditPage: React.FC = () => {
     unchangedFilenames,
     displayRetrievedChunks,
     conversationQuickStarters,
+    historyParams,
+    knowledgeRetrievalOnly,
     navigate,
   ]);
 